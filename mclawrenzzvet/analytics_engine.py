@@ -0,0 +1,291 @@
+"""Columnar analytics for the Reports module.
+
+``sales`` and ``appointments_enhanced`` are copied into NumPy arrays once:
+dates become int64 day numbers and text columns become integer category
+codes. Later report clicks only fetch rows with a higher rowid than the last
+one loaded, and group-bys, percentiles and moving averages run as vectorized
+operations on the cached arrays. NumPy is optional: without it
+``analytics_engine.available`` is False and reports use the SQL in
+AnalyticsManager instead.
+"""
+import threading
+from datetime import date, timedelta
+from migrations import day_range
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+EPOCH = date(1970, 1, 1)
+NO_DAY = -(2 ** 62)         # day number of rows without a usable date
+
+
+def day_string(number):
+    """Convert a day number back to 'YYYY-MM-DD'"""
+    return (EPOCH + timedelta(days=int(number))).isoformat()
+
+
+def moving_average(values, window=3):
+    """Trailing moving average; the first points average what is available"""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return []
+    sums = np.cumsum(values)
+    averages = sums / np.arange(1, len(values) + 1)
+    if len(values) > window:
+        averages[window:] = (sums[window:] - sums[:-window]) / window
+    return averages.tolist()
+
+
+class ColumnStore:
+    """Append-only columnar copy of one table, refreshed by rowid.
+
+    ``columns`` is a tuple of (name, SQL expression, kind) where kind is
+    'day', 'category' or 'float'. Category columns keep a label list and
+    store codes indexing into it.
+    """
+
+    DTYPES = {"day": "int64", "category": "int32", "float": "float64"}
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+        self.reset()
+
+    def __len__(self):
+        return len(self.data[self.columns[0][0]])
+
+    def reset(self):
+        """Drop the loaded rows so the next refresh reloads the table"""
+        self.last_rowid = 0
+        self.data = {name: np.empty(0, dtype=self.DTYPES[kind]) for name, _, kind in self.columns}
+        self.labels = {name: [] for name, _, kind in self.columns if kind == "category"}
+        self._codes = {name: {} for name in self.labels}
+
+    def _encode(self, name, kind, values):
+        """Convert one fetched column to an array"""
+        if kind == "day":
+            return np.fromiter((NO_DAY if v is None else v for v in values),
+                               dtype=np.int64, count=len(values))
+        if kind == "float":
+            return np.fromiter((v or 0.0 for v in values), dtype=np.float64, count=len(values))
+        codes = self._codes[name]
+        labels = self.labels[name]
+        encoded = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(labels)
+                labels.append(value)
+            encoded[i] = code
+        return encoded
+
+    def code(self, name, label):
+        """Get the code of a category label (-1 if never seen)"""
+        return self._codes[name].get(label, -1)
+
+    def refresh(self, conn):
+        """Load rows added since the last refresh; returns how many were added"""
+        max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {self.table}").fetchone()[0] or 0
+        if max_rowid < self.last_rowid:
+            # The table was emptied or replaced (e.g. a restore)
+            self.reset()
+        if max_rowid == self.last_rowid:
+            return 0
+        expressions = ", ".join(expression for _, expression, _ in self.columns)
+        rows = conn.execute(f"SELECT rowid, {expressions} FROM {self.table} WHERE rowid > ? ORDER BY rowid",
+                            (self.last_rowid,)).fetchall()
+        if rows:
+            fetched = list(zip(*rows))
+            for (name, _, kind), values in zip(self.columns, fetched[1:]):
+                self.data[name] = np.concatenate([self.data[name], self._encode(name, kind, values)])
+            self.last_rowid = fetched[0][-1]
+        return len(rows)
+
+    def day_mask(self, column, start_date=None, end_date=None):
+        """Boolean mask of rows whose day column lies within the optional bounds.
+
+        Bounds may be a year, a month or a date, as in the SQL reports; a
+        year or month includes the whole period. A bound that is not a date
+        matches no rows.
+        """
+        days = self.data[column]
+        mask = days != NO_DAY
+        for value, is_start in ((start_date, True), (end_date, False)):
+            if not value:
+                continue
+            bound = day_range(value)
+            if bound is None:
+                return np.zeros(len(days), dtype=bool)
+            if is_start:
+                mask &= days >= bound[0]
+            else:
+                mask &= days <= bound[1]
+        return mask
+
+
+class AnalyticsEngine:
+    """Report computations over cached columnar copies of the tables"""
+
+    SALES_COLUMNS = (
+        ("transaction", "transaction_id", "category"),
+        ("day", "sale_day", "day"),
+        ("total_amount", "total_amount", "float"),
+    )
+    APPOINTMENT_COLUMNS = (
+        ("day", "appointment_day", "day"),
+        ("service", "service", "category"),
+        ("veterinarian", "veterinarian", "category"),
+        ("animal_type", "animal_type", "category"),
+        ("owner_name", "owner_name", "category"),
+        ("status", "status", "category"),
+        ("total_amount", "total_amount", "float"),
+    )
+
+    def __init__(self):
+        self.available = HAS_NUMPY
+        self._lock = threading.RLock()
+        self._stores = {}
+        if self.available:
+            self._stores = {
+                "sales": ColumnStore("sales", self.SALES_COLUMNS),
+                "appointments_enhanced": ColumnStore("appointments_enhanced", self.APPOINTMENT_COLUMNS),
+            }
+
+    def invalidate(self, table=None):
+        """Reload a table (or all of them) on next use; call after updates and deletes"""
+        with self._lock:
+            for name, store in self._stores.items():
+                if table is None or name == table:
+                    store.reset()
+
+    def _store(self, conn, table):
+        """Get a table's column store with any new rows loaded (lock must be held)"""
+        store = self._stores[table]
+        store.refresh(conn)
+        return store
+
+    def _transactions(self, conn, start_date, end_date):
+        """Get (day, total) arrays with one entry per sales transaction in range"""
+        store = self._store(conn, "sales")
+        mask = store.day_mask("day", start_date, end_date)
+        transactions = store.data["transaction"][mask]
+        # total_amount is repeated on every line, so keep one line per transaction
+        _, first = np.unique(transactions, return_index=True)
+        return store.data["day"][mask][first], store.data["total_amount"][mask][first]
+
+    @staticmethod
+    def _period_keys(days, period):
+        """Group keys and labels for day numbers, matching the SQL report periods"""
+        dates = days.astype("datetime64[D]")
+        if period == "daily":
+            keys = days
+            label = day_string
+        elif period == "weekly":
+            # Same numbering as strftime('%W'): weeks start on Monday and the
+            # days before the year's first Monday are week 00
+            years = dates.astype("datetime64[Y]")
+            day_of_year = (dates - years.astype("datetime64[D]")).astype(np.int64)
+            weekday = (days + 3) % 7
+            weeks = (day_of_year + 7 - weekday) // 7
+            keys = (years.astype(np.int64) + 1970) * 100 + weeks
+            label = lambda key: f"{key // 100}-W{key % 100:02d}"
+        else:  # monthly
+            keys = dates.astype("datetime64[M]").astype(np.int64)
+            label = lambda key: f"{1970 + key // 12}-{key % 12 + 1:02d}"
+        return keys, label
+
+    def revenue_trends(self, conn, period="monthly", start_date=None, end_date=None):
+        """Get (period, revenue, transactions, avg_transaction) rows ordered by period"""
+        with self._lock:
+            days, totals = self._transactions(conn, start_date, end_date)
+        if not len(days):
+            return []
+        keys, label = self._period_keys(days, period)
+        periods, inverse = np.unique(keys, return_inverse=True)
+        revenue = np.bincount(inverse, weights=totals)
+        counts = np.bincount(inverse)
+        return [(label(int(key)), float(rev), int(count), float(rev / count))
+                for key, rev, count in zip(periods, revenue, counts)]
+
+    def transaction_percentiles(self, conn, start_date=None, end_date=None, percentiles=(50, 90)):
+        """Get {percentile: transaction value} over the transactions in range"""
+        with self._lock:
+            _, totals = self._transactions(conn, start_date, end_date)
+        if not len(totals):
+            return {}
+        return dict(zip(percentiles, np.percentile(totals, percentiles).tolist()))
+
+    def popular_services(self, conn, limit=10, start_date=None, end_date=None):
+        """Get (service, count, total_revenue, avg_revenue) rows, most booked first"""
+        with self._lock:
+            store = self._store(conn, "appointments_enhanced")
+            mask = store.day_mask("day", start_date, end_date)
+            services = store.data["service"][mask]
+            amounts = store.data["total_amount"][mask]
+            labels = list(store.labels["service"])
+        size = len(labels)
+        counts = np.bincount(services, minlength=size)
+        revenue = np.bincount(services, weights=amounts, minlength=size)
+        order = [code for code in np.argsort(-counts, kind="stable") if counts[code]][:limit]
+        return [(labels[code], int(counts[code]), float(revenue[code]), float(revenue[code] / counts[code]))
+                for code in order]
+
+    def customer_demographics(self, conn):
+        """Get animal type distribution and the 20 most frequent customers"""
+        with self._lock:
+            store = self._store(conn, "appointments_enhanced")
+            animals = store.data["animal_type"]
+            owners = store.data["owner_name"]
+            amounts = store.data["total_amount"]
+            animal_labels = list(store.labels["animal_type"])
+            owner_labels = list(store.labels["owner_name"])
+        total = len(animals)
+        if not total:
+            return {'animal_distribution': [], 'customer_frequency': []}
+
+        animal_counts = np.bincount(animals, minlength=len(animal_labels))
+        animal_order = [code for code in np.argsort(-animal_counts, kind="stable") if animal_counts[code]]
+        animal_distribution = [(animal_labels[code], int(animal_counts[code]),
+                                round(float(animal_counts[code]) * 100.0 / total, 2))
+                               for code in animal_order]
+
+        visits = np.bincount(owners, minlength=len(owner_labels))
+        spent = np.bincount(owners, weights=amounts, minlength=len(owner_labels))
+        owner_order = [code for code in np.argsort(-visits, kind="stable") if visits[code]][:20]
+        customer_frequency = [(owner_labels[code], int(visits[code]), float(spent[code]),
+                               float(spent[code] / visits[code]))
+                              for code in owner_order]
+        return {
+            'animal_distribution': animal_distribution,
+            'customer_frequency': customer_frequency
+        }
+
+    def veterinarian_performance(self, conn, start_date=None, end_date=None):
+        """Get (veterinarian, appointments, revenue, avg, completed, cancelled, completion_rate) rows"""
+        with self._lock:
+            store = self._store(conn, "appointments_enhanced")
+            mask = store.day_mask("day", start_date, end_date)
+            for missing in (None, ""):
+                mask &= store.data["veterinarian"] != store.code("veterinarian", missing)
+            vets = store.data["veterinarian"][mask]
+            statuses = store.data["status"][mask]
+            amounts = store.data["total_amount"][mask]
+            completed_code = store.code("status", "COMPLETED")
+            cancelled_code = store.code("status", "CANCELLED")
+            labels = list(store.labels["veterinarian"])
+        size = len(labels)
+        counts = np.bincount(vets, minlength=size)
+        revenue = np.bincount(vets, weights=amounts, minlength=size)
+        completed = np.bincount(vets[statuses == completed_code], minlength=size)
+        cancelled = np.bincount(vets[statuses == cancelled_code], minlength=size)
+        order = [code for code in np.argsort(-revenue, kind="stable") if counts[code]]
+        return [(labels[code], int(counts[code]), float(revenue[code]), float(revenue[code] / counts[code]),
+                 int(completed[code]), int(cancelled[code]), round(float(completed[code]) * 100.0 / counts[code], 2))
+                for code in order]
+
+
+analytics_engine = AnalyticsEngine()
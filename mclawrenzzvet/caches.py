@@ -0,0 +1,265 @@
+"""In-process caches shared by the managers."""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from config import INVENTORY_CATALOG_TTL, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+from models import Medicine
+from migrations import day_number
+
+
+class InventoryCatalog:
+    """Shared, versioned in-memory copy of the inventory table.
+
+    Items are keyed by id with secondary maps by category, brand and animal
+    type. The managers update it write-through after each successful commit,
+    so reads never have to go back to the database. Each item's expiration
+    date is also kept as a day number, so expiry badges for a whole list
+    are integer comparisons instead of date parsing. Cached Medicine objects
+    are never mutated in place: every change stores a new object and bumps
+    ``version``, so lists handed out earlier stay consistent snapshots.
+    Writers wrap the write, its commit and the write-through in
+    ``writing()`` so a concurrent ``load()`` cannot count a change twice.
+    Writes made by other processes are picked up when the catalog is
+    reloaded after ``INVENTORY_CATALOG_TTL`` seconds.
+    """
+
+    INDEXED_FIELDS = ("category", "brand", "animal_type")
+
+    def __init__(self, ttl=INVENTORY_CATALOG_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.RLock()
+        self._items = {}
+        self._indexes = {field: defaultdict(set) for field in self.INDEXED_FIELDS}
+        self._expiry_days = {}
+        self._sorted = None
+        self._loaded_at = None
+        self._writers = 0
+
+    @property
+    def is_loaded(self):
+        """Whether the catalog holds a fresh copy of the inventory"""
+        loaded_at = self._loaded_at
+        return loaded_at is not None and (self.ttl is None or time.monotonic() - loaded_at < self.ttl)
+
+    def load(self, items, version=None):
+        """Replace the catalog contents with a full list of items.
+
+        ``version`` is the value of ``self.version`` read before the items
+        were queried. If a write-through landed since then the items may
+        predate it, and while a write is in flight they may already include
+        a change its write-through is about to apply. In both cases nothing
+        is stored and False is returned; the caller should query again.
+        """
+        with self._lock:
+            if self._writers or (version is not None and version != self.version):
+                return False
+            self._items = {}
+            self._indexes = {field: defaultdict(set) for field in self.INDEXED_FIELDS}
+            self._expiry_days = {}
+            for item in items:
+                self._store(item)
+            self._loaded_at = time.monotonic()
+            self._changed()
+            return True
+
+    @contextmanager
+    def writing(self):
+        """Mark an inventory write as in flight until its write-through is applied"""
+        with self._lock:
+            self._writers += 1
+            self._changed()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers -= 1
+                self._changed()
+
+    def invalidate(self):
+        """Drop the cached contents so the next read reloads them"""
+        with self._lock:
+            self._loaded_at = None
+            self._changed()
+
+    def _changed(self):
+        """Bump the version after any change (lock must be held)"""
+        self.version += 1
+        self._sorted = None
+
+    def _store(self, item):
+        """Add an item to the primary and secondary maps (lock must be held)"""
+        self._items[item.id] = item
+        for field in self.INDEXED_FIELDS:
+            self._indexes[field][getattr(item, field) or ""].add(item.id)
+        self._expiry_days[item.id] = day_number(item.expiration_date) if item.expiration_date else None
+
+    def _unstore(self, item_id):
+        """Remove an item from the primary and secondary maps (lock must be held)"""
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return None
+        self._expiry_days.pop(item_id, None)
+        for field in self.INDEXED_FIELDS:
+            ids = self._indexes[field].get(getattr(item, field) or "")
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._indexes[field][getattr(item, field) or ""]
+        return item
+
+    def all_items(self):
+        """Get every item ordered by category and name"""
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._items.values(),
+                                      key=lambda item: (item.category or "", item.name or ""))
+            return list(self._sorted)
+
+    def get(self, item_id):
+        """Get one item by id"""
+        return self._items.get(item_id)
+
+    def expiry_days(self, items):
+        """Get the expiration day number of each item (None when it has no valid date)"""
+        with self._lock:
+            cached = self._expiry_days
+            return [cached[item.id] if item.id in cached
+                    else day_number(item.expiration_date) if item.expiration_date else None
+                    for item in items]
+
+    def _lookup(self, field, value):
+        """Get the items whose indexed field equals value"""
+        with self._lock:
+            ids = self._indexes[field].get(value or "", ())
+            return sorted((self._items[i] for i in ids), key=lambda item: item.name or "")
+
+    def by_category(self, category):
+        """Get the items in a category"""
+        return self._lookup("category", category)
+
+    def by_brand(self, brand):
+        """Get the items of a brand"""
+        return self._lookup("brand", brand)
+
+    def by_animal_type(self, animal_type):
+        """Get the items for an animal type"""
+        return self._lookup("animal_type", animal_type)
+
+    def upsert(self, item):
+        """Insert or replace an item after it was written to the database"""
+        with self._lock:
+            if self._loaded_at is not None:
+                self._unstore(item.id)
+                self._store(Medicine.from_dict(item.to_dict()))
+            # Bumped even when nothing is cached, so a concurrent load() retries
+            self._changed()
+
+    def remove(self, item_id):
+        """Remove an item after it was deleted from the database"""
+        with self._lock:
+            self._unstore(item_id)
+            self._changed()
+
+    def adjust_stock(self, item_id, delta):
+        """Apply a committed stock change to a cached item"""
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is not None:
+                data = item.to_dict()
+                data['stock'] = (data['stock'] or 0) + delta
+                self._items[item_id] = Medicine.from_dict(data)
+            self._changed()
+
+
+class QueryCache:
+    """LRU cache of query results invalidated by per-table write counters.
+
+    Each entry remembers the write counters of the tables it was computed
+    from and the time bucket (``ttl`` seconds wide) it was computed in. A
+    lookup is a hit only if neither changed, so any write through the
+    managers, or the passing of time for "now"-relative queries and writes
+    from other processes, forces a recompute.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)
+        self._epoch = 0         # bumped by clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bump(self, *tables):
+        """Record a committed write to tables"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] += 1
+
+    def _stamp(self, tables):
+        """Validity stamp of a result computed now from tables (lock must be held)"""
+        bucket = int(time.time() // self.ttl) if self.ttl else 0
+        return self._epoch, bucket, tuple(self._versions[table] for table in tables)
+
+    def get_or_compute(self, key, tables, compute):
+        """Get the cached result for key, computing and storing it on a miss"""
+        with self._lock:
+            stamp = self._stamp(tables)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            # Only store if no write happened while computing
+            if self._stamp(tables) == stamp:
+                self._entries[key] = (stamp, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        """Drop every cached result.
+
+        Also invalidates results still being computed, so a compute that
+        started before e.g. a restore cannot store its stale value.
+        """
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Get hit/miss counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_rate': round(self.hits * 100.0 / lookups, 1) if lookups else 0.0,
+            }
+
+
+def cached_query(*tables):
+    """Cache a manager method's result in query_cache, keyed by name and arguments"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (method.__qualname__, args, tuple(sorted(kwargs.items())))
+            return query_cache.get_or_compute(key, tables, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+inventory_catalog = InventoryCatalog()
+query_cache = QueryCache()
@@ -19,8 +19,62 @@ COLORS = {
 # Application constants
 APP_TITLE = "🐾 Veterinary Clinic Management System v2.0"
 DB_FILE = "vetclinic.db"
+DB_POOL_SIZE = 8           # Maximum open connections held by the pool
+DB_POOL_TIMEOUT = 5.0      # Seconds to wait for a free connection
 THEME_MODE = "dark"
 
+# SQLite PRAGMA profiles applied to every new database connection
+DB_PERFORMANCE_PROFILES = {
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,        # KiB (negative) -> ~2 MB page cache
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,       # milliseconds
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,       # ~16 MB
+        "mmap_size": 67108864,      # 64 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,       # ~64 MB
+        "mmap_size": 268435456,     # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+DB_PERFORMANCE_PROFILE = "balanced"
+DB_VERIFY_QUERY_PLANS = False   # Check hot queries for full table scans at startup
+INVENTORY_CATALOG_TTL = 300     # Seconds before the in-memory inventory is reloaded
+TERMINAL_NODE_ID = None         # 0-999, unique per terminal; derived from host and process when None
+QUERY_CACHE_SIZE = 256          # Cached report query results kept (LRU)
+QUERY_CACHE_TTL = 60            # Seconds per time bucket; cached results expire at bucket end
+CLINIC_OPEN = "09:00"           # First bookable minute of the day
+CLINIC_CLOSE = "17:00"          # Appointments must end by this time
+SCHEDULE_SLOT_MINUTES = 15      # Granularity of availability search
+APPOINTMENT_BUFFER_MINUTES = 10 # Free time kept after each appointment
+SCHEDULE_CACHE_TTL = 30         # Seconds before a cached veterinarian schedule day is reloaded
+AVAILABILITY_SEARCH_DAYS = 7    # Default date range for suggested times
+EXPORT_CHUNK_SIZE = 2000        # Rows fetched and written per step when exporting
+BACKUP_DIR = "backups"          # Default folder for database backups
+BACKUP_PAGES_PER_STEP = 256     # Pages copied per backup step; writers can run between steps
+BACKUP_STEP_SLEEP = 0.005       # Seconds between backup steps (rollback journal only)
+BACKUP_MAX_RESTARTS = 3         # Copies restarted by concurrent writes before copying in one step
+BACKUP_COMPRESSION = "gzip"     # None, "gzip" or "zstd" (needs the zstandard package)
+BACKUP_RETENTION = 10           # Backups kept in BACKUP_DIR; older ones are deleted (0 keeps all)
+BACKUP_SNAPSHOT_DIR = "backups/snapshots" # Content-addressed store of differential backups
+BACKUP_CHUNK_SIZE = 262144      # Bytes per differential backup chunk (a multiple of the page size)
+RESTORE_VERIFY_PRAGMA = "integrity_check" # Check run on a backup before restoring it ("quick_check" is faster)
+TASK_WORKERS = 3                # Threads running database work for the UI (keep below DB_POOL_SIZE)
+TASK_POLL_MS = 50               # How often the Tk loop collects finished background work
+
 # Service prices for appointments
 SERVICE_PRICES = {
     "Consultation": 500.00,
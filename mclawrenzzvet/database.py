@@ -1,194 +1,318 @@
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
 import tkinter.messagebox as messagebox
-from config import DB_FILE
+import config
+from config import DB_FILE, DB_POOL_SIZE, DB_POOL_TIMEOUT
+from migrations import run_migrations, find_full_scans
 
-def get_db():
-    """Get database connection"""
-    return sqlite3.connect(DB_FILE)
+# Order matters: journal_mode must be switched before other settings
+PROFILE_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
 
-def init_db():
-    """Initialize database with all required tables"""
+
+def get_performance_profile(name=None):
+    """Get the PRAGMA settings of a performance profile (defaults to the configured one)"""
+    name = name or config.DB_PERFORMANCE_PROFILE
+    profiles = config.DB_PERFORMANCE_PROFILES
+    return profiles.get(name, profiles["balanced"])
+
+
+def apply_performance_profile(conn, name=None):
+    """Apply a performance profile's PRAGMAs to an open connection"""
+    profile = get_performance_profile(name)
+    for pragma in PROFILE_PRAGMAS:
+        if pragma in profile:
+            conn.execute(f"PRAGMA {pragma} = {profile[pragma]}")
+    return conn
+
+
+def get_connection_pragmas(conn):
+    """Read back the effective PRAGMA values of a connection"""
+    values = {}
+    for pragma in PROFILE_PRAGMAS:
+        try:
+            row = conn.execute(f"PRAGMA {pragma}").fetchone()
+            values[pragma] = row[0] if row else None
+        except sqlite3.Error:
+            values[pragma] = None
+    return values
+
+
+def connect(database=DB_FILE, **kwargs):
+    """Open a connection with the configured performance profile applied"""
+    conn = sqlite3.connect(database, **kwargs)
     try:
-        conn = get_db()
-        cur = conn.cursor()
-
-        # Users table - Enhanced with more roles
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                password TEXT,
-                role TEXT DEFAULT 'staff'
-            )
-            """
-        )
-
-        # Check if role column exists, if not add it
+        apply_performance_profile(conn)
+    except sqlite3.Error as e:
+        print(f"Could not apply performance profile: {e}")
+    return conn
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within the timeout"""
+
+
+class ConnectionPool:
+    """Thread-aware pool of SQLite connections.
+
+    Every thread gets its own connection (SQLite handles must not be shared
+    between threads that write concurrently). A thread can either hold a
+    connection for its whole lifetime through ``get_connection()`` or borrow
+    one for a block of work with ``with pool.connection() as conn``.
+    Connections are health checked before being handed out and the pool never
+    opens more than ``max_size`` handles at once.
+    """
+
+    def __init__(self, database=DB_FILE, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Condition()
+        self._idle = []          # connections ready to be checked out
+        self._bound = {}         # thread -> connection held by get_connection()
+        self._checked_out = {}   # id(connection) -> thread borrowing it
+        self._size = 0
+        self._generation = 0     # bumped by reset()
+        self._generations = {}   # id(connection) -> generation it was opened in
+        self._closed = False
+
+    def _create_connection(self):
+        """Open a new connection to the pooled database"""
+        conn = connect(self.database, check_same_thread=False)
+        self._generations[id(conn)] = self._generation
+        return conn
+
+    def _is_current(self, conn):
+        """Check that a connection was opened after the last reset()"""
+        return self._generations.get(id(conn)) == self._generation
+
+    @staticmethod
+    def _is_healthy(conn):
+        """Check that a connection is still usable"""
         try:
-            cur.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'staff'")
+            conn.execute("SELECT 1").fetchone()
+            return True
         except sqlite3.Error:
-            pass  # Column already exists
-
-        # Inventory table
-        cur.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='inventory'"
-        )
-        inv_exists = cur.fetchone()
-
-        if not inv_exists:
-            cur.execute(
-                """
-                CREATE TABLE inventory(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT,
-                    price REAL,
-                    stock INTEGER,
-                    category TEXT,
-                    image TEXT,
-                    brand TEXT,
-                    animal_type TEXT,
-                    dosage TEXT,
-                    expiration_date TEXT
-                )
-                """
-            )
-        else:
-            cur.execute("PRAGMA table_info(inventory)")
-            cols = {row[1] for row in cur.fetchall()}
-            extra_cols = {
-                "brand": "ALTER TABLE inventory ADD COLUMN brand TEXT",
-                "animal_type": "ALTER TABLE inventory ADD COLUMN animal_type TEXT",
-                "dosage": "ALTER TABLE inventory ADD COLUMN dosage TEXT",
-                "expiration_date": "ALTER TABLE inventory ADD COLUMN expiration_date TEXT",
+            return False
+
+    def _discard(self, conn):
+        """Close a connection and free its slot (lock must be held)"""
+        self._generations.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._size -= 1
+        self._lock.notify()
+
+    def _reclaim_dead_threads(self):
+        """Return connections bound to threads that have exited (lock must be held)"""
+        for thread in [t for t in self._bound if not t.is_alive()]:
+            conn = self._bound.pop(thread)
+            self._checked_out.pop(id(conn), None)
+            if not self._is_current(conn):
+                self._discard(conn)
+                continue
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.append(conn)
+
+    def acquire(self):
+        """Check out a connection for the current thread"""
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                self._reclaim_dead_threads()
+
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._is_healthy(conn):
+                        self._checked_out[id(conn)] = threading.current_thread()
+                        return conn
+                    self._discard(conn)
+
+                if self._size < self.max_size:
+                    conn = self._create_connection()
+                    self._size += 1
+                    self._checked_out[id(conn)] = threading.current_thread()
+                    return conn
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"({self.max_size} in use)")
+                self._lock.wait(remaining)
+
+    def release(self, conn):
+        """Return a checked out connection to the pool"""
+        with self._lock:
+            self._checked_out.pop(id(conn), None)
+            if self._closed or not self._is_current(conn):
+                self._discard(conn)
+                return
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+            self._idle.append(conn)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block.
+
+        Reuses the connection already bound to the current thread when there
+        is one, so nested use never needs a second handle.
+        """
+        if threading.current_thread() in self._bound:
+            yield self.get_connection()
+            return
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def get_connection(self):
+        """Get the connection bound to the current thread, checking one out if needed.
+
+        A bound connection opened before the last ``reset()`` is closed and
+        replaced here, by its own thread, once it is outside a transaction.
+        """
+        thread = threading.current_thread()
+        conn = self._bound.get(thread)
+        if conn is not None and not conn.in_transaction and not self._is_current(conn):
+            with self._lock:
+                self._bound.pop(thread, None)
+                self._checked_out.pop(id(conn), None)
+                self._discard(conn)
+            conn = None
+        if conn is None:
+            conn = self.acquire()
+            with self._lock:
+                self._bound[thread] = conn
+        return conn
+
+    def release_thread(self):
+        """Give the current thread's bound connection back to the pool"""
+        with self._lock:
+            conn = self._bound.pop(threading.current_thread(), None)
+        if conn is not None:
+            self.release(conn)
+
+    def stats(self):
+        """Get a snapshot of pool usage"""
+        with self._lock:
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': len(self._checked_out),
+                'bound_threads': len(self._bound),
             }
-            for col, sql in extra_cols.items():
-                if col not in cols:
-                    try:
-                        cur.execute(sql)
-                    except sqlite3.Error:
-                        pass  # Column might already exist
-
-        # Drop and recreate appointments table to ensure correct structure
-        cur.execute("DROP TABLE IF EXISTS appointments")
-        cur.execute(
-            """
-            CREATE TABLE appointments(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id TEXT,
-                patient_name TEXT,
-                owner_name TEXT,
-                animal_type TEXT,
-                service TEXT,
-                qty INTEGER,
-                price REAL,
-                subtotal REAL,
-                date TEXT,
-                notes TEXT,
-                status TEXT,
-                total_amount REAL
-            )
-            """
-        )
-
-        # Enhanced appointments table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS appointments_enhanced(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id TEXT,
-                patient_name TEXT,
-                owner_name TEXT,
-                animal_type TEXT,
-                service TEXT,
-                veterinarian TEXT,
-                duration INTEGER,
-                appointment_date TEXT,
-                appointment_time TEXT,
-                date_created TEXT,
-                notes TEXT,
-                status TEXT,
-                total_amount REAL,
-                reminder_sent BOOLEAN DEFAULT 0,
-                follow_up_needed BOOLEAN DEFAULT 0
-            )
-        """)
-
-        # Appointment services table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS appointment_services(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id TEXT,
-                service_name TEXT,
-                quantity INTEGER,
-                price REAL,
-                subtotal REAL
-            )
-        """)
-
-        # Communication log table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS communication_log(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id TEXT,
-                communication_type TEXT,
-                sent_to TEXT,
-                message TEXT,
-                sent_date TEXT,
-                status TEXT
-            )
-        """)
-
-        # Sales table
-        cur.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='sales'"
-        )
-        sales_exists = cur.fetchone()
-
-        if not sales_exists:
-            cur.execute(
-                """
-                CREATE TABLE sales(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    transaction_id TEXT,
-                    item_id INTEGER,
-                    item_name TEXT,
-                    quantity INTEGER,
-                    price REAL,
-                    subtotal REAL,
-                    total_amount REAL,
-                    payment_method TEXT,
-                    customer_name TEXT,
-                    sale_date TEXT
-                )
-                """
-            )
-
-        # Insert default users with different roles
-        default_users = [
-            ("admin", "admin123", "admin"),
-            ("staff", "staff123", "staff"),
-            ("vet_smith", "vet123", "veterinarian"),
-            ("reception", "recep123", "receptionist")
-        ]
-        
-        for username, password, role in default_users:
-            cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-            if not cur.fetchone():
-                cur.execute(
-                    """
-                    INSERT INTO users (username, password, role)
-                    VALUES (?, ?, ?)
-                    """,
-                    (username, password, role),
-                )
-
-        conn.commit()
+
+    def reset(self):
+        """Retire every pooled connection so later checkouts reopen the database file.
+
+        Only idle connections are closed right away. Connections in use by
+        other threads may be in the middle of a query, so they are closed
+        when they are returned, or for bound ones when their own thread next
+        calls ``get_connection()``.
+        """
+        with self._lock:
+            self._generation += 1
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def close_all(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            for conn in list(self._bound.values()):
+                self._checked_out.pop(id(conn), None)
+                self._discard(conn)
+            self._bound.clear()
+            self._lock.notify_all()
+
+
+class SchemaCatalog:
+    """Process-wide cache of the tables present in the database.
+
+    Loaded from sqlite_master on first use so existence checks do not cost a
+    query each time. Must be invalidated whenever the schema can change
+    (migrations, restores).
+    """
+
+    def __init__(self):
+        self._tables = None
+        self._lock = threading.Lock()
+
+    def _load(self, conn):
+        """Read the table names from sqlite_master"""
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+        return frozenset(row[0] for row in rows)
+
+    def tables(self, conn):
+        """Get the set of table names, loading it on first use"""
+        tables = self._tables
+        if tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self._tables = self._load(conn)
+                tables = self._tables
+        return tables
+
+    def has_table(self, name, conn):
+        """Check whether a table exists"""
+        return name in self.tables(conn)
+
+    def invalidate(self):
+        """Forget the cached schema so it is reloaded on next use"""
+        with self._lock:
+            self._tables = None
+
+
+schema_catalog = SchemaCatalog()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the process-wide connection pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def get_db():
+    """Get a standalone database connection (caller closes it)"""
+    return connect(DB_FILE)
+
+def init_db():
+    """Initialize database by applying any pending schema migrations"""
+    try:
+        conn = get_db()
+        applied = run_migrations(conn)
+        if applied:
+            schema_catalog.invalidate()
+        if config.DB_VERIFY_QUERY_PLANS:
+            for name, detail in find_full_scans(conn):
+                print(f"Warning: hot query '{name}' is not using an index ({detail})")
         conn.close()
         
-        # Clear any existing test data
-        clear_test_data()
-        
+        if applied:
+            print(f"Database schema upgraded ({applied} migration(s) applied)")
         print("Database initialized successfully!")
         return True
 
@@ -197,22 +321,3 @@ def init_db():
         messagebox.showerror(
             "Database Error", f"Database initialization failed: {str(e)}")
         return False
-
-def clear_test_data():
-    """Clear any test appointment data that might exist"""
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        # Check if there are any appointments and delete them
-        cur.execute("SELECT COUNT(*) FROM appointments")
-        count = cur.fetchone()[0]
-        
-        if count > 0:
-            cur.execute("DELETE FROM appointments")
-            conn.commit()
-            print(f"Cleared {count} test appointments from database")
-        
-        conn.close()
-    except sqlite3.Error as e:
-        print(f"Error clearing test data: {e}")
\ No newline at end of file
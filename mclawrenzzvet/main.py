@@ -4,11 +4,12 @@ from datetime import datetime, timedelta
 
 # Import modules
 from config import APP_TITLE, COLORS, THEME_MODE
-from database import get_db, init_db
+from database import get_pool, init_db
 from managers import EnhancedInventoryManager, EnhancedAppointmentManager, SalesManager, AnalyticsManager, CommunicationManager
 from models import EnhancedUser, ShoppingCart
 from ui_components import ModernFrame
 from utils.helpers import apply_theme
+from utils.task_executor import TaskExecutor
 from modules import (
     AuthenticationModule,
     AppointmentsModule,
@@ -41,16 +42,20 @@ class VeterinaryClinicApp:
         except ImportError:
             print("No data_catalogs module found — skipping initial inventory population")
         
-        # Initialize managers
-        self.db = get_db()
-        self.inventory_manager = EnhancedInventoryManager(self.db)
-        self.appointment_manager = EnhancedAppointmentManager(self.db)
-        self.sales_manager = SalesManager(self.db)
-        self.analytics_manager = AnalyticsManager(self.db)
-        self.communication_manager = CommunicationManager(self.db)
+        # Initialize managers on the shared connection pool
+        self.db_pool = get_pool()
+        self.inventory_manager = EnhancedInventoryManager(self.db_pool)
+        self.appointment_manager = EnhancedAppointmentManager(self.db_pool)
+        self.sales_manager = SalesManager(self.db_pool)
+        self.analytics_manager = AnalyticsManager(self.db_pool)
+        self.communication_manager = CommunicationManager(self.db_pool)
         self.cart = ShoppingCart()
         self.current_user = None
         
+        # Database work triggered from the UI runs on background workers
+        self.tasks = TaskExecutor(self.root)
+        self.tasks.add_busy_listener(self.show_busy)
+        
         # Initialize modules
         self.modules = {
             'auth': AuthenticationModule(self),
@@ -71,6 +76,11 @@ class VeterinaryClinicApp:
         # Start reminder scheduler
         self.schedule_reminders()
         
+    @property
+    def db(self):
+        """Database connection bound to the calling thread"""
+        return self.db_pool.get_connection()
+    
     def schedule_reminders(self):
         """Schedule daily reminder checks"""
         self.check_and_send_reminders()
@@ -117,8 +127,17 @@ class VeterinaryClinicApp:
                                  text_color=COLORS["accent"])
         title_label.grid(row=0, column=0, padx=20, pady=20)
         
+        # Busy indicator shown while background work is running
+        self.busy_label = ModernLabel(self.sidebar, text="", text_color=COLORS["accent"])
+        self.busy_label.grid(row=20, column=0, padx=10, pady=10)
+        
         # Navigation buttons (will be populated after login)
         self.nav_buttons = {}
+    
+    def show_busy(self, busy):
+        """Show or hide the busy indicator"""
+        self.busy_label.configure(text="⏳ Working..." if busy else "")
+        self.root.configure(cursor="watch" if busy else "")
         
     def setup_navigation(self):
         """Setup navigation buttons after login"""
@@ -203,43 +222,46 @@ class VeterinaryClinicApp:
         stats_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
         stats_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
         
-        # Get actual statistics
-        total_items = len(self.inventory_manager.get_all_items())
-        appointments = self.appointment_manager.get_all_appointments()
-        unique_appointments = set()
-        today_unique_appointments = set()
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        
-        for apt in appointments:
-            if len(apt) > 0 and apt[0]:
-                unique_appointments.add(apt[0])
-                if len(apt) > 4 and apt[4] and apt[4].startswith(today_str):
-                    today_unique_appointments.add(apt[0])
-        
-        total_appointments_count = len(unique_appointments)
-        today_appointments_count = len(today_unique_appointments)
-        
-        # Get expiring items
-        expiring_items = len(self.inventory_manager.get_expiring_items(30))
-        low_stock = len(self.inventory_manager.get_low_stock_items(10))
-        
-        # Get upcoming appointments
-        upcoming_appointments = len(self.appointment_manager.get_upcoming_appointments(7))
-        
-        stats_data = [
-            ("Total Inventory", f"{total_items} items", COLORS["primary"]),
-            ("Today's Appointments", f"{today_appointments_count}", COLORS["success"]),
-            ("Upcoming (7 days)", f"{upcoming_appointments}", COLORS["secondary"]),
-            ("Low Stock Items", f"{low_stock}", COLORS["warning"]),
-            ("Expiring Soon", f"{expiring_items}", COLORS["danger"]),
-            ("All Appointments", f"{total_appointments_count}", COLORS["accent"])
-        ]
-        
-        for i, (title, value, color) in enumerate(stats_data):
-            row = i // 3
-            col = i % 3
-            card = ColorfulCard(stats_frame, title, value, color)
-            card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
+        def load_stats():
+            total_items = len(self.inventory_manager.get_all_items())
+            appointments = self.appointment_manager.get_all_appointments()
+            unique_appointments = set()
+            today_unique_appointments = set()
+            today_str = datetime.now().strftime('%Y-%m-%d')
+            
+            for apt in appointments:
+                if len(apt) > 0 and apt[0]:
+                    unique_appointments.add(apt[0])
+                    if len(apt) > 4 and apt[4] and apt[4].startswith(today_str):
+                        today_unique_appointments.add(apt[0])
+            
+            total_appointments_count = len(unique_appointments)
+            today_appointments_count = len(today_unique_appointments)
+            
+            # Get expiring items
+            expiring_items = len(self.inventory_manager.get_expiring_items(30))
+            low_stock = len(self.inventory_manager.get_low_stock_items(10))
+            
+            # Get upcoming appointments
+            upcoming_appointments = len(self.appointment_manager.get_upcoming_appointments(7))
+            
+            return [
+                ("Total Inventory", f"{total_items} items", COLORS["primary"]),
+                ("Today's Appointments", f"{today_appointments_count}", COLORS["success"]),
+                ("Upcoming (7 days)", f"{upcoming_appointments}", COLORS["secondary"]),
+                ("Low Stock Items", f"{low_stock}", COLORS["warning"]),
+                ("Expiring Soon", f"{expiring_items}", COLORS["danger"]),
+                ("All Appointments", f"{total_appointments_count}", COLORS["accent"])
+            ]
+        
+        def show_stats(stats_data):
+            for i, (title, value, color) in enumerate(stats_data):
+                row = i // 3
+                col = i % 3
+                card = ColorfulCard(stats_frame, title, value, color)
+                card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
+        
+        self.tasks.submit(load_stats, key="dashboard-stats", owner=stats_frame, on_success=show_stats)
         
         # Quick actions
         actions_frame = ModernFrame(dashboard_frame)
@@ -276,7 +298,11 @@ class VeterinaryClinicApp:
     
     def run(self):
         """Run the application"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.tasks.shutdown()
+            self.db_pool.close_all()
 
 def main():
     """Main entry point for the application"""
@@ -1,83 +1,294 @@
 import sqlite3
 from datetime import datetime, timedelta
 from models import Medicine, CartItem, ShoppingCart
-from database import get_db
+from database import get_db, ConnectionPool, schema_catalog
+from caches import inventory_catalog, query_cache, cached_query
+from analytics_engine import analytics_engine, day_string
+from migrations import (rebuild_sales_rollup, rebuild_appointment_rollups,
+                        day_number, day_range, epoch_seconds, sale_day, UNDATED_DAY)
+from scheduling import (ScheduleIndex, AvailabilityEngine, DaySchedule, ACTIVE_STATUSES,
+                        time_to_minutes, minutes_to_time)
+from config import AVAILABILITY_SEARCH_DAYS
 
-class EnhancedInventoryManager:
-    """Manages enhanced inventory operations with expiration tracking"""
+
+def _row_to_medicine(row):
+    """Build a Medicine from an inventory row"""
+    return Medicine(
+        id=row[0],
+        name=row[1],
+        price=row[2],
+        stock=row[3],
+        category=row[4],
+        brand=row[6] if len(row) > 6 else "",
+        animal_type=row[7] if len(row) > 7 else "",
+        dosage=row[8] if len(row) > 8 else "",
+        expiration_date=row[9] if len(row) > 9 else ""
+    )
+
+
+def _date_bounds(start_date=None, end_date=None):
+    """First and last 'YYYY-MM-DD' covered by optional year, month or date bounds.
+
+    A year or month bound includes the whole period. Returns None if a
+    bound is given but is not a date.
+    """
+    bounds = []
+    for value, end in ((start_date, 0), (end_date, 1)):
+        if not value:
+            bounds.append(None)
+            continue
+        days = day_range(value)
+        if days is None:
+            return None
+        bounds.append(day_string(days[end]))
+    return tuple(bounds)
+
+
+def _epoch_range(value):
+    """Epoch-second range of a 'YYYY', 'YYYY-MM', 'YYYY-MM-DD' or full timestamp (None if not a date)"""
+    value = str(value).strip()
+    days = day_range(value) if len(value) <= 10 else None
+    if days is not None:
+        return days[0] * 86400, days[1] * 86400 + 86399
+    seconds = epoch_seconds(value)
+    if seconds is None:
+        return None
+    return seconds, seconds
+
+
+def _sale_timestamp(value):
+    """Normalize a sale_date to 'YYYY-MM-DD HH:MM:SS' (None if it is not a date or timestamp)"""
+    try:
+        return datetime.fromisoformat(str(value).strip()).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def _fts_query(search_term):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    words = [w.replace('"', '""') for w in search_term.split()]
+    return " ".join(f'"{w}"*' for w in words if w)
+
+
+def _stock_quantities(lines):
+    """Sum the requested quantity per item id for cart lines"""
+    quantities = {}
+    for line in lines:
+        quantities[line['id']] = quantities.get(line['id'], 0) + line['qty']
+    return quantities
+
+
+class InsufficientStockError(Exception):
+    """A sale was rejected because some lines are short of stock.
+
+    ``shortfalls`` lists a dict with id, name, requested and available for
+    each short item.
+    """
+
+    def __init__(self, shortfalls):
+        super().__init__(", ".join(f"{s['name'] or s['id']}: requested {s['requested']}, "
+                                   f"available {s['available']}" for s in shortfalls))
+        self.shortfalls = shortfalls
+
+
+class SchedulingConflictError(Exception):
+    """A booking was rejected because the veterinarian is already booked.
+
+    ``conflicts`` lists (appointment_id, 'HH:MM', duration) of the clashing
+    appointments.
+    """
+
+    def __init__(self, conflicts):
+        super().__init__(", ".join(f"{appointment_id} at {time} ({duration} min)"
+                                   for appointment_id, time, duration in conflicts))
+        self.conflicts = conflicts
+
+
+def _take_available_stock(cur, quantities):
+    """Decrement stock by at most what is left and return (taken, shortfalls).
+
+    For sales that already happened: instead of rejecting them, stock is
+    taken down to zero and the missing quantity reported. Runs inside the
+    caller's transaction.
+    """
+    taken = {}
+    shortfalls = []
+    for item_id, qty in quantities.items():
+        cur.execute("SELECT name, stock FROM inventory WHERE id = ?", (item_id,))
+        row = cur.fetchone()
+        available = max(row[1] or 0, 0) if row else 0
+        taken[item_id] = min(qty, available)
+        if taken[item_id]:
+            cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ?", (taken[item_id], item_id))
+        if qty > available:
+            shortfalls.append({
+                'id': item_id,
+                'name': row[0] if row else "",
+                'requested': qty,
+                'available': available
+            })
+    return taken, shortfalls
+
+
+def _take_stock(cur, quantities):
+    """Decrement stock only where enough is left and return the shortfalls.
+
+    Runs inside the caller's transaction; the caller rolls back when the
+    returned list is not empty.
+    """
+    shortfalls = []
+    for item_id, qty in quantities.items():
+        cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                    (qty, item_id, qty))
+        if cur.rowcount == 0:
+            cur.execute("SELECT name, stock FROM inventory WHERE id = ?", (item_id,))
+            row = cur.fetchone()
+            shortfalls.append({
+                'id': item_id,
+                'name': row[0] if row else "",
+                'requested': qty,
+                'available': row[1] if row else 0
+            })
+    return shortfalls
+
+
+class BaseManager:
+    """Common connection handling shared by all managers.
+
+    A manager can be given either a ConnectionPool or a plain sqlite3
+    connection. With a pool, ``self.db`` resolves to the connection bound to
+    the calling thread, so report queries and background jobs each work on
+    their own handle instead of serializing on one.
+    """
     
     def __init__(self, db_connection):
-        self.db = db_connection
+        if isinstance(db_connection, ConnectionPool):
+            self.pool = db_connection
+            self._db = None
+        else:
+            self.pool = None
+            self._db = db_connection
+    
+    @property
+    def db(self):
+        """Connection for the calling thread"""
+        if self.pool is not None:
+            return self.pool.get_connection()
+        return self._db
+
+
+class EnhancedInventoryManager(BaseManager):
+    """Manages enhanced inventory operations with expiration tracking"""
+
+    CATALOG_LOAD_ATTEMPTS = 3
 
     def get_all_items(self):
         """Get all items from inventory (medicines and foods)"""
-        try:
-            cur = self.db.cursor()
-            cur.execute("SELECT * FROM inventory ORDER BY category, name")
-            rows = cur.fetchall()
-            items = []
-            for row in rows:
-                item = Medicine(
-                    id=row[0],
-                    name=row[1],
-                    price=row[2],
-                    stock=row[3],
-                    category=row[4],
-                    brand=row[6] if len(row) > 6 else "",
-                    animal_type=row[7] if len(row) > 7 else "",
-                    dosage=row[8] if len(row) > 8 else "",
-                    expiration_date=row[9] if len(row) > 9 else ""
-                )
-                items.append(item)
-            return items
-        except sqlite3.Error as e:
-            print(f"Error getting items: {e}")
-            return []
+        if not inventory_catalog.is_loaded:
+            try:
+                cur = self.db.cursor()
+                for _ in range(self.CATALOG_LOAD_ATTEMPTS):
+                    # A write-through during the query makes load() refuse the rows
+                    version = inventory_catalog.version
+                    cur.execute("SELECT * FROM inventory ORDER BY category, name")
+                    items = [_row_to_medicine(row) for row in cur.fetchall()]
+                    if inventory_catalog.load(items, version):
+                        break
+                else:
+                    # Writes kept racing the load; serve this read uncached
+                    return items
+            except sqlite3.Error as e:
+                print(f"Error getting items: {e}")
+                return []
+        return inventory_catalog.all_items()
 
-    def search_items(self, search_term):
-        """Search items by name"""
+    def get_item(self, item_id):
+        """Get a single inventory item by id"""
+        if not inventory_catalog.is_loaded:
+            self.get_all_items()
+        return inventory_catalog.get(item_id)
+
+    def get_items_by_category(self, category):
+        """Get inventory items in a category"""
+        if not inventory_catalog.is_loaded:
+            self.get_all_items()
+        return inventory_catalog.by_category(category)
+
+    def get_items_by_brand(self, brand):
+        """Get inventory items of a brand"""
+        if not inventory_catalog.is_loaded:
+            self.get_all_items()
+        return inventory_catalog.by_brand(brand)
+
+    def get_items_by_animal_type(self, animal_type):
+        """Get inventory items for an animal type"""
+        if not inventory_catalog.is_loaded:
+            self.get_all_items()
+        return inventory_catalog.by_animal_type(animal_type)
+
+    def search_items(self, search_term, limit=500):
+        """Search items by name, category, brand, animal type or dosage.
+
+        Uses the FTS5 index with prefix matching and bm25 ranking (name
+        matches rank highest); falls back to LIKE matching when full-text
+        search is not available.
+        """
         try:
             cur = self.db.cursor()
-            cur.execute("SELECT * FROM inventory WHERE name LIKE ? OR category LIKE ? ORDER BY category, name",
-                        (f"%{search_term}%", f"%{search_term}%"))
-            rows = cur.fetchall()
-            items = []
-            for row in rows:
-                item = Medicine(
-                    id=row[0],
-                    name=row[1],
-                    price=row[2],
-                    stock=row[3],
-                    category=row[4],
-                    brand=row[6] if len(row) > 6 else "",
-                    animal_type=row[7] if len(row) > 7 else "",
-                    dosage=row[8] if len(row) > 8 else "",
-                    expiration_date=row[9] if len(row) > 9 else ""
-                )
-                items.append(item)
-            return items
+            query = _fts_query(search_term)
+            if query and schema_catalog.has_table('inventory_fts', self.db):
+                cur.execute("""
+                    SELECT inventory.* FROM inventory_fts
+                    JOIN inventory ON inventory.id = inventory_fts.rowid
+                    WHERE inventory_fts MATCH ?
+                    ORDER BY bm25(inventory_fts, 10.0, 4.0, 3.0, 2.0, 1.0)
+                    LIMIT ?
+                """, (query, limit))
+            else:
+                cur.execute("SELECT * FROM inventory WHERE name LIKE ? OR category LIKE ? ORDER BY category, name LIMIT ?",
+                            (f"%{search_term}%", f"%{search_term}%", limit))
+            return [_row_to_medicine(row) for row in cur.fetchall()]
         except sqlite3.Error as e:
             print(f"Error searching items: {e}")
             return []
 
+    EXPIRY_SELECT = """SELECT id, name, price, stock, category, image, brand, animal_type, dosage,
+                              expiration_date, expiration_day - ? as days_until_expiry
+                       FROM inventory"""
+
     def get_expiring_items(self, days_threshold=30):
         """Get items expiring within specified days"""
         try:
             cur = self.db.cursor()
-            cur.execute("""
-                SELECT *, 
-                julianday(expiration_date) - julianday('now') as days_until_expiry
-                FROM inventory 
-                WHERE expiration_date IS NOT NULL 
-                AND expiration_date != ''
-                AND julianday(expiration_date) - julianday('now') BETWEEN 0 AND ?
-                ORDER BY expiration_date
-            """, (days_threshold,))
+            today = day_number(datetime.now().date())
+            cur.execute(f"""{self.EXPIRY_SELECT}
+                WHERE expiration_day BETWEEN ? AND ?
+                ORDER BY expiration_day
+            """, (today, today, today + days_threshold))
             return cur.fetchall()
         except sqlite3.Error as e:
             print(f"Error getting expiring items: {e}")
             return []
 
+    def get_expired_items(self):
+        """Get items already past their expiration date, longest expired first"""
+        try:
+            cur = self.db.cursor()
+            today = day_number(datetime.now().date())
+            cur.execute(f"""{self.EXPIRY_SELECT}
+                WHERE expiration_day < ?
+                ORDER BY expiration_day
+            """, (today, today))
+            return cur.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error getting expired items: {e}")
+            return []
+
+    def get_days_until_expiry(self, items):
+        """Get days until each item expires (negative once expired, None without a date)"""
+        today = day_number(datetime.now().date())
+        return [None if day is None else day - today for day in inventory_catalog.expiry_days(items)]
+
     def get_low_stock_items(self, threshold=10):
         """Get items with stock below threshold"""
         try:
@@ -92,6 +303,7 @@ class EnhancedInventoryManager:
             print(f"Error getting low stock items: {e}")
             return []
 
+    @cached_query('inventory')
     def get_inventory_valuation(self):
         """Calculate total inventory valuation"""
         try:
@@ -100,9 +312,9 @@ class EnhancedInventoryManager:
                 SELECT SUM(price * stock) as total_value,
                 COUNT(*) as item_count,
                 COUNT(CASE WHEN stock <= 10 THEN 1 END) as low_stock_count,
-                COUNT(CASE WHEN julianday(expiration_date) - julianday('now') <= 30 THEN 1 END) as expiring_soon_count
+                COUNT(CASE WHEN expiration_day <= ? THEN 1 END) as expiring_soon_count
                 FROM inventory
-            """)
+            """, (day_number(datetime.now().date()) + 30,))
             return cur.fetchone()
         except sqlite3.Error as e:
             print(f"Error calculating inventory valuation: {e}")
@@ -111,92 +323,171 @@ class EnhancedInventoryManager:
     def update_item_stock(self, item_id, quantity_used):
         """Update item stock after use"""
         try:
-            cur = self.db.cursor()
-            cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ?",
-                        (quantity_used, item_id))
-            self.db.commit()
+            with inventory_catalog.writing():
+                cur = self.db.cursor()
+                cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ?",
+                            (quantity_used, item_id))
+                self.db.commit()
+                query_cache.bump('inventory')
+                inventory_catalog.adjust_stock(item_id, -quantity_used)
             return True
         except sqlite3.Error as e:
             print(f"Error updating stock: {e}")
+            self.db.rollback()
             return False
 
     def add_item(self, medicine):
         """Add new item to inventory"""
         try:
-            cur = self.db.cursor()
-            cur.execute("""INSERT INTO inventory 
-                        (name, price, stock, category, brand, animal_type, dosage, expiration_date) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                        (medicine.name, medicine.price, medicine.stock, medicine.category,
-                         medicine.brand, medicine.animal_type, medicine.dosage, medicine.expiration_date))
-            self.db.commit()
+            with inventory_catalog.writing():
+                cur = self.db.cursor()
+                cur.execute("""INSERT INTO inventory 
+                            (name, price, stock, category, brand, animal_type, dosage, expiration_date) 
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                            (medicine.name, medicine.price, medicine.stock, medicine.category,
+                             medicine.brand, medicine.animal_type, medicine.dosage, medicine.expiration_date))
+                self.db.commit()
+                query_cache.bump('inventory')
+                stored = Medicine.from_dict(medicine.to_dict())
+                stored.id = cur.lastrowid
+                inventory_catalog.upsert(stored)
             return True
         except sqlite3.Error as e:
             print(f"Error adding item: {e}")
+            self.db.rollback()
             return False
 
     def update_item(self, medicine):
         """Update existing item in inventory"""
         try:
-            cur = self.db.cursor()
-            cur.execute("""UPDATE inventory SET 
-                        name=?, price=?, stock=?, category=?, brand=?, animal_type=?, dosage=?, expiration_date=?
-                        WHERE id=?""",
-                        (medicine.name, medicine.price, medicine.stock, medicine.category,
-                         medicine.brand, medicine.animal_type, medicine.dosage, medicine.expiration_date, medicine.id))
-            self.db.commit()
+            with inventory_catalog.writing():
+                cur = self.db.cursor()
+                cur.execute("""UPDATE inventory SET 
+                            name=?, price=?, stock=?, category=?, brand=?, animal_type=?, dosage=?, expiration_date=?
+                            WHERE id=?""",
+                            (medicine.name, medicine.price, medicine.stock, medicine.category,
+                             medicine.brand, medicine.animal_type, medicine.dosage, medicine.expiration_date, medicine.id))
+                self.db.commit()
+                query_cache.bump('inventory')
+                inventory_catalog.upsert(medicine)
             return True
         except sqlite3.Error as e:
             print(f"Error updating item: {e}")
+            self.db.rollback()
             return False
 
     def delete_item(self, item_id):
         """Delete item from inventory"""
         try:
-            cur = self.db.cursor()
-            cur.execute("DELETE FROM inventory WHERE id=?", (item_id,))
-            self.db.commit()
+            with inventory_catalog.writing():
+                cur = self.db.cursor()
+                cur.execute("DELETE FROM inventory WHERE id=?", (item_id,))
+                self.db.commit()
+                query_cache.bump('inventory')
+                inventory_catalog.remove(item_id)
             return True
         except sqlite3.Error as e:
             print(f"Error deleting item: {e}")
+            self.db.rollback()
             return False
 
 
-class EnhancedAppointmentManager:
+class EnhancedAppointmentManager(BaseManager):
     """Manages enhanced appointment operations"""
-    
+
     def __init__(self, db_connection):
-        self.db = db_connection
+        super().__init__(db_connection)
+        self.schedule = ScheduleIndex(self._load_schedule_day)
+        self.availability = AvailabilityEngine(self._load_occupancy)
+
+    def _load_schedule_day(self, veterinarian, date):
+        """Load the active appointments of a veterinarian on a date for the schedule index"""
+        try:
+            if not schema_catalog.has_table('appointments_enhanced', self.db):
+                return []
+            cur = self.db.cursor()
+            cur.execute(f"""
+                SELECT appointment_id, appointment_minute, duration FROM appointments_enhanced
+                WHERE veterinarian = ? AND appointment_day = ?
+                AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+            """, (veterinarian, day_number(date), *ACTIVE_STATUSES))
+            return cur.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error loading veterinarian schedule: {e}")
+            return []
+
+    def _load_occupancy(self, start_date, end_date):
+        """Load the active appointments of all veterinarians in a date range"""
+        try:
+            if not schema_catalog.has_table('appointments_enhanced', self.db):
+                return []
+            cur = self.db.cursor()
+            cur.execute(f"""
+                SELECT veterinarian, appointment_date, appointment_minute, duration
+                FROM appointments_enhanced
+                WHERE appointment_day BETWEEN ? AND ?
+                AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+            """, (day_number(start_date), day_number(end_date), *ACTIVE_STATUSES))
+            return cur.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error loading appointment occupancy: {e}")
+            return []
+
+    def suggest_appointment_slots(self, duration, start_date=None, days=AVAILABILITY_SEARCH_DAYS,
+                                  veterinarians=None, preferred_time=None, limit=10):
+        """Get ranked free slots for a service duration across veterinarians"""
+        now = datetime.now()
+        start_date = max(start_date or now.date(), now.date())
+        end_date = start_date + timedelta(days=days - 1)
+        return self.availability.suggest(duration, start_date, end_date, veterinarians,
+                                         preferred_time, earliest=now, limit=limit)
+
+    def find_conflicts(self, veterinarian, start, end):
+        """Get (appointment_id, time, duration) of active appointments overlapping start-end"""
+        date = start.strftime('%Y-%m-%d')
+        start_minute = start.hour * 60 + start.minute
+        end_minute = start_minute + int((end - start).total_seconds() // 60)
+        return self.schedule.find_conflicts(veterinarian, date, start_minute, end_minute)
+
+    def next_free_slot(self, veterinarian, duration, after=None, days=30):
+        """Get the start of the first free slot of duration minutes (None if none within days)"""
+        after = after or datetime.now()
+        for offset in range(days):
+            day = after.date() + timedelta(days=offset)
+            earliest = after.hour * 60 + after.minute if offset == 0 else None
+            minute = self.schedule.next_free_slot(veterinarian, day.strftime('%Y-%m-%d'), duration, earliest)
+            if minute is not None:
+                return datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+        return None
 
     def record_appointment(self, appointment):
         """Record an appointment in the database - FIXED VERSION"""
+        return self.record_appointments([appointment])
+
+    def record_appointments(self, appointments):
+        """Record a batch of appointments in the legacy table in one transaction"""
         try:
-            cur = self.db.cursor()
+            rows = []
+            for appointment in appointments:
+                # Use date_created from appointment object
+                appointment_date = appointment.date_created
+                notes = appointment.notes if hasattr(appointment, 'notes') else ""
+                for service in appointment.services:
+                    rows.append((appointment.appointment_id, appointment.patient_name,
+                                 appointment.owner_name, appointment.animal_type,
+                                 service['service'], service['qty'], service['price'],
+                                 service['subtotal'], appointment_date, notes,
+                                 appointment.status, appointment.total_amount))
             
-            # Use date_created from appointment object
-            appointment_date = appointment.date_created
-            
-            # Record the appointment with services
-            for service in appointment.services:
-                cur.execute("""INSERT INTO appointments 
+            cur = self.db.cursor()
+            cur.execute("BEGIN")
+            cur.executemany("""INSERT INTO appointments 
                             (appointment_id, patient_name, owner_name, animal_type, service, 
                              qty, price, subtotal, date, notes, status, total_amount) 
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (appointment.appointment_id, 
-                             appointment.patient_name, 
-                             appointment.owner_name,
-                             appointment.animal_type, 
-                             service['service'], 
-                             service['qty'], 
-                             service['price'],
-                             service['subtotal'], 
-                             appointment_date,
-                             appointment.notes if hasattr(appointment, 'notes') else "", 
-                             appointment.status, 
-                             appointment.total_amount))
-            
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
             self.db.commit()
-            print(f"Appointment {appointment.appointment_id} recorded successfully to legacy table!")
+            query_cache.bump('appointments')
+            print(f"{len(appointments)} appointment(s) recorded successfully to legacy table!")
             return True
         except sqlite3.Error as e:
             print(f"Error recording appointment to legacy table: {e}")
@@ -208,96 +499,120 @@ class EnhancedAppointmentManager:
             print(f"General error recording appointment: {e}")
             import traceback
             traceback.print_exc()
+            self.db.rollback()
             return False
 
     def record_enhanced_appointment(self, appointment):
         """Record an enhanced appointment with more details"""
+        return self.record_enhanced_appointments([appointment])
+
+    def _booking_conflicts(self, cur, appointments):
+        """Get the booked appointments clashing with a batch of new ones.
+
+        Runs inside the caller's write transaction so bookings made on other
+        terminals are seen. New appointments are also checked against each
+        other.
+        """
+        conflicts = []
+        batch = {}
+        for appointment in appointments:
+            start = time_to_minutes(appointment.appointment_time)
+            day = day_number(appointment.appointment_date)
+            if (appointment.status not in ACTIVE_STATUSES or not appointment.veterinarian
+                    or start is None or day is None or not appointment.duration):
+                continue
+            end = start + int(appointment.duration)
+            cur.execute(f"""
+                SELECT appointment_id, appointment_minute, duration FROM appointments_enhanced
+                WHERE veterinarian = ? AND appointment_day = ?
+                AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+                AND appointment_minute < ? AND appointment_minute + duration > ?
+            """, (appointment.veterinarian, day, *ACTIVE_STATUSES, end, start))
+            conflicts.extend((appointment_id, minutes_to_time(minute), duration)
+                             for appointment_id, minute, duration in cur.fetchall())
+            schedule = batch.setdefault((appointment.veterinarian, day), DaySchedule())
+            conflicts.extend((appointment_id, minutes_to_time(iv_start), iv_end - iv_start)
+                             for iv_start, iv_end, appointment_id
+                             in schedule.conflicts(start, end))
+            schedule.add(start, end, appointment.appointment_id)
+        return conflicts
+
+    def record_enhanced_appointments(self, appointments):
+        """Record a batch of enhanced appointments and their services in one transaction.
+
+        Active appointments are re-checked against the database under the
+        write lock; on a clash nothing is recorded and SchedulingConflictError
+        is raised. Returns False on a database error.
+        """
+        appointment_rows = []
+        service_rows = []
+        for appointment in appointments:
+            appointment_rows.append((
+                appointment.appointment_id, appointment.patient_name, appointment.owner_name,
+                appointment.animal_type, appointment.service, appointment.veterinarian,
+                appointment.duration, appointment.appointment_date, appointment.appointment_time,
+                appointment.date_created, appointment.notes, appointment.status,
+                appointment.total_amount, appointment.reminder_sent, appointment.follow_up_needed))
+            for service in appointment.services:
+                service_rows.append((appointment.appointment_id, service['service'], service['qty'],
+                                     service['price'], service['subtotal']))
         try:
             cur = self.db.cursor()
-            
-            # Create enhanced appointments table if not exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS appointments_enhanced(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    appointment_id TEXT,
-                    patient_name TEXT,
-                    owner_name TEXT,
-                    animal_type TEXT,
-                    service TEXT,
-                    veterinarian TEXT,
-                    duration INTEGER,
-                    appointment_date TEXT,
-                    appointment_time TEXT,
-                    date_created TEXT,
-                    notes TEXT,
-                    status TEXT,
-                    total_amount REAL,
-                    reminder_sent BOOLEAN DEFAULT 0,
-                    follow_up_needed BOOLEAN DEFAULT 0
-                )
-            """)
-            
-            # Insert appointment
-            cur.execute("""INSERT INTO appointments_enhanced 
+            cur.execute("BEGIN IMMEDIATE")
+            conflicts = self._booking_conflicts(cur, appointments)
+            if conflicts:
+                self.db.rollback()
+                for appointment in appointments:
+                    self.schedule.invalidate_day(appointment.veterinarian, appointment.appointment_date)
+                    self.availability.invalidate_day(appointment.appointment_date)
+                raise SchedulingConflictError(conflicts)
+            cur.executemany("""INSERT INTO appointments_enhanced 
                         (appointment_id, patient_name, owner_name, animal_type, service,
                          veterinarian, duration, appointment_date, appointment_time,
                          date_created, notes, status, total_amount, reminder_sent, follow_up_needed)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                       (appointment.appointment_id, appointment.patient_name, appointment.owner_name,
-                        appointment.animal_type, appointment.service, appointment.veterinarian,
-                        appointment.duration, appointment.appointment_date, appointment.appointment_time,
-                        appointment.date_created, appointment.notes, appointment.status,
-                        appointment.total_amount, appointment.reminder_sent, appointment.follow_up_needed))
-            
-            # Create appointment services table if not exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS appointment_services(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    appointment_id TEXT,
-                    service_name TEXT,
-                    quantity INTEGER,
-                    price REAL,
-                    subtotal REAL
-                )
-            """)
-            
-            # Insert services
-            for service in appointment.services:
-                cur.execute("""INSERT INTO appointment_services 
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", appointment_rows)
+            cur.executemany("""INSERT INTO appointment_services 
                             (appointment_id, service_name, quantity, price, subtotal)
-                            VALUES (?, ?, ?, ?, ?)""",
-                           (appointment.appointment_id, service['service'], service['qty'],
-                            service['price'], service['subtotal']))
-            
+                            VALUES (?, ?, ?, ?, ?)""", service_rows)
             self.db.commit()
+            query_cache.bump('appointments_enhanced')
+            for appointment in appointments:
+                if appointment.status in ACTIVE_STATUSES:
+                    self.schedule.add(appointment.veterinarian, appointment.appointment_date,
+                                      appointment.appointment_time, appointment.duration,
+                                      appointment.appointment_id)
+                    self.availability.add(appointment.veterinarian, appointment.appointment_date,
+                                          appointment.appointment_time, appointment.duration)
             return True
         except sqlite3.Error as e:
             print(f"Error recording enhanced appointment: {e}")
+            self.db.rollback()
             return False
+        except Exception:
+            self.db.rollback()
+            raise
 
     def get_upcoming_appointments(self, days=7):
         """Get upcoming appointments within specified days"""
         try:
             cur = self.db.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
-            future_date = (datetime.now() + timedelta(days=days)).strftime('%Y-%m-%d')
+            today = day_number(datetime.now().date())
+            future_day = today + days
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 cur.execute("""
                     SELECT * FROM appointments_enhanced 
-                    WHERE appointment_date BETWEEN ? AND ?
+                    WHERE appointment_day BETWEEN ? AND ?
                     AND status IN ('SCHEDULED', 'IN_PROGRESS')
-                    ORDER BY appointment_date, appointment_time
-                """, (today, future_date))
+                    ORDER BY appointment_day, appointment_minute
+                """, (today, future_day))
             else:
                 cur.execute("""
                     SELECT * FROM appointments 
-                    WHERE date LIKE ? || '%'
+                    WHERE appointment_day = ?
                     AND status IN ('SCHEDULED', 'IN_PROGRESS')
                     ORDER BY date
-                """, (future_date,))
+                """, (future_day,))
             return cur.fetchall()
         except sqlite3.Error as e:
             print(f"Error getting upcoming appointments: {e}")
@@ -308,25 +623,23 @@ class EnhancedAppointmentManager:
         try:
             cur = self.db.cursor()
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 query = "SELECT * FROM appointments_enhanced WHERE veterinarian = ?"
                 params = [veterinarian]
                 
                 if date:
-                    query += " AND appointment_date = ?"
-                    params.append(date)
+                    query += " AND appointment_day = ?"
+                    params.append(day_number(date))
                 
-                query += " ORDER BY appointment_time"
+                query += " ORDER BY appointment_minute"
                 cur.execute(query, params)
             else:
                 # Fallback to regular appointments
                 query = "SELECT * FROM appointments WHERE 1=1"
                 params = []
                 if date:
-                    query += " AND date LIKE ?"
-                    params.append(f"{date}%")
+                    query += " AND appointment_day = ?"
+                    params.append(day_number(date))
                 query += " ORDER BY date"
                 cur.execute(query, params)
             
@@ -343,8 +656,13 @@ class EnhancedAppointmentManager:
             params = []
 
             if date_filter:
-                query += " AND date LIKE ?"
-                params.append(f"{date_filter}%")
+                days = day_range(date_filter)
+                if days:
+                    query += " AND appointment_day BETWEEN ? AND ?"
+                    params.extend(days)
+                else:
+                    query += " AND date LIKE ?"
+                    params.append(f"{date_filter}%")
 
             if appointment_filter:
                 query += " AND appointment_id LIKE ?"
@@ -373,12 +691,75 @@ class EnhancedAppointmentManager:
             print(f"Error getting appointments: {e}")
             return []
 
+    def count_enhanced_appointments(self):
+        """Get the number of enhanced appointments"""
+        try:
+            if not schema_catalog.has_table('appointments_enhanced', self.db):
+                return 0
+            return self.db.execute("SELECT COUNT(*) FROM appointments_enhanced").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error counting enhanced appointments: {e}")
+            return 0
+
+    LIST_DATED = "appointment_day IS NOT NULL AND appointment_minute IS NOT NULL"
+    LIST_UNDATED = "(appointment_day IS NULL OR appointment_minute IS NULL)"
+
+    @staticmethod
+    def appointment_list_key(row):
+        """Keyset position of a row returned by get_enhanced_appointments_page()"""
+        return row[-2], row[-1], row[0]
+
+    def get_enhanced_appointments_page(self, limit, after=None, skip=0):
+        """Get the enhanced appointments that follow ``after`` in the list, newest first.
+
+        The list is paged by keyset instead of OFFSET, so reading a page is a
+        short index range however deep it is: ``after`` is the
+        appointment_list_key() of the last row already read (None for the
+        top) and ``skip`` further rows are passed over, which only costs when
+        jumping ahead. Appointments without a valid date or time come last.
+        Rows carry appointment_day and appointment_minute as two extra
+        trailing columns.
+        """
+        select = "SELECT *, appointment_day, appointment_minute FROM appointments_enhanced WHERE"
+        try:
+            cur = self.db.cursor()
+            rows = []
+            if after is None or (after[0] is not None and after[1] is not None):
+                where, params = self.LIST_DATED, []
+                if after is not None:
+                    where += " AND (appointment_day, appointment_minute, id) < (?, ?, ?)"
+                    params = list(after)
+                dated = None
+                if skip:
+                    dated = cur.execute(f"SELECT COUNT(*) FROM appointments_enhanced WHERE {where}",
+                                        params).fetchone()[0]
+                if dated is not None and skip >= dated:
+                    skip -= dated
+                else:
+                    cur.execute(f"""{select} {where}
+                        ORDER BY appointment_day DESC, appointment_minute DESC, id DESC
+                        LIMIT ? OFFSET ?""", params + [limit, skip])
+                    rows = cur.fetchall()
+                    skip = 0
+                after = None
+            if len(rows) < limit:
+                where, params = self.LIST_UNDATED, []
+                if after is not None:
+                    where += " AND id < ?"
+                    params = [after[2]]
+                cur.execute(f"{select} {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                            params + [limit - len(rows), skip])
+                rows += cur.fetchall()
+            return rows
+        except sqlite3.Error as e:
+            print(f"Error getting enhanced appointments: {e}")
+            return []
+
     def get_all_enhanced_appointments(self):
         """Get all enhanced appointments"""
         try:
             cur = self.db.cursor()
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 cur.execute("""
                     SELECT * FROM appointments_enhanced 
                     ORDER BY appointment_date DESC, appointment_time DESC
@@ -395,19 +776,30 @@ class EnhancedAppointmentManager:
             cur = self.db.cursor()
             
             # Try enhanced table first
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            slot = None
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 cur.execute("UPDATE appointments_enhanced SET status = ? WHERE appointment_id = ?", 
                            (new_status, appointment_id))
+                cur.execute("""SELECT veterinarian, appointment_date, appointment_time, duration
+                               FROM appointments_enhanced WHERE appointment_id = ?""", (appointment_id,))
+                slot = cur.fetchone()
             
             # Also update regular table
             cur.execute("UPDATE appointments SET status = ? WHERE appointment_id = ?", 
                        (new_status, appointment_id))
             
             self.db.commit()
+            query_cache.bump('appointments_enhanced', 'appointments')
+            analytics_engine.invalidate('appointments_enhanced')
+            self.schedule.remove(appointment_id)
+            if slot:
+                self.availability.invalidate_day(slot[1])
+                if new_status in ACTIVE_STATUSES:
+                    self.schedule.add(slot[0], slot[1], slot[2], slot[3], appointment_id)
             return True
         except sqlite3.Error as e:
             print(f"Error updating appointment status: {e}")
+            self.db.rollback()
             return False
 
     def delete_appointment(self, appointment_id):
@@ -416,8 +808,12 @@ class EnhancedAppointmentManager:
             cur = self.db.cursor()
             
             # Try enhanced table first
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            appointment_date = None
+            if schema_catalog.has_table('appointments_enhanced', self.db):
+                cur.execute("SELECT appointment_date FROM appointments_enhanced WHERE appointment_id = ?",
+                           (appointment_id,))
+                row = cur.fetchone()
+                appointment_date = row[0] if row else None
                 cur.execute("DELETE FROM appointments_enhanced WHERE appointment_id = ?", (appointment_id,))
                 cur.execute("DELETE FROM appointment_services WHERE appointment_id = ?", (appointment_id,))
             
@@ -425,17 +821,22 @@ class EnhancedAppointmentManager:
             cur.execute("DELETE FROM appointments WHERE appointment_id = ?", (appointment_id,))
             
             self.db.commit()
+            query_cache.bump('appointments_enhanced', 'appointments')
+            analytics_engine.invalidate('appointments_enhanced')
+            self.schedule.remove(appointment_id)
+            if appointment_date:
+                self.availability.invalidate_day(appointment_date)
             return True
         except sqlite3.Error as e:
             print(f"Error deleting appointment: {e}")
+            self.db.rollback()
             return False
 
     def send_appointment_reminder(self, appointment_id):
         """Send appointment reminder"""
         try:
             cur = self.db.cursor()
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 cur.execute("""
                     UPDATE appointments_enhanced 
                     SET reminder_sent = 1 
@@ -446,43 +847,52 @@ class EnhancedAppointmentManager:
             return False
         except sqlite3.Error as e:
             print(f"Error sending reminder: {e}")
+            self.db.rollback()
             return False
 
 
-class AnalyticsManager:
+class AnalyticsManager(BaseManager):
     """Manages reporting and analytics"""
     
-    def __init__(self, db_connection):
-        self.db = db_connection
-    
+    @cached_query('sales')
     def get_revenue_trends(self, period='monthly', start_date=None, end_date=None):
-        """Get revenue trends over time"""
+        """Get revenue trends over time.
+
+        Bounds may be a year, a month or a date; a year or month includes
+        the whole period. Returns [] if a bound is not a date.
+        """
+        bounds = _date_bounds(start_date, end_date)
+        if bounds is None:
+            return []
+        start_date, end_date = bounds
         try:
             cur = self.db.cursor()
             
+            # sales_daily_rollup holds one row per day and payment method,
+            # so each period only sums a handful of pre-aggregated rows
             if period == 'daily':
-                group_by = "strftime('%Y-%m-%d', sale_date)"
+                group_by = "day"
             elif period == 'weekly':
-                group_by = "strftime('%Y-W%W', sale_date)"
+                group_by = "strftime('%Y-W%W', day)"
             else:  # monthly
-                group_by = "strftime('%Y-%m', sale_date)"
+                group_by = "substr(day, 1, 7)"
             
             query = f"""
                 SELECT 
                     {group_by} as period,
-                    SUM(total_amount) as revenue,
-                    COUNT(DISTINCT transaction_id) as transactions,
-                    AVG(total_amount) as avg_transaction
-                FROM sales 
-                WHERE 1=1
+                    SUM(revenue) as revenue,
+                    SUM(transactions) as transactions,
+                    SUM(revenue) / SUM(transactions) as avg_transaction
+                FROM sales_daily_rollup 
+                WHERE day <> ?
             """
-            params = []
+            params = [UNDATED_DAY]
             
             if start_date:
-                query += " AND sale_date >= ?"
+                query += " AND day >= ?"
                 params.append(start_date)
             if end_date:
-                query += " AND sale_date <= ?"
+                query += " AND day <= ?"
                 params.append(end_date)
             
             query += f" GROUP BY {group_by} ORDER BY period"
@@ -492,29 +902,67 @@ class AnalyticsManager:
             print(f"Error getting revenue trends: {e}")
             return []
     
+    def rebuild_appointment_rollups(self):
+        """Recompute the service and veterinarian rollups from appointments_enhanced"""
+        try:
+            cur = self.db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            rebuild_appointment_rollups(cur)
+            self.db.commit()
+            query_cache.bump('appointments_enhanced')
+            return True
+        except sqlite3.Error as e:
+            print(f"Error rebuilding appointment rollups: {e}")
+            self.db.rollback()
+            return False
+    
+    def rebuild_sales_rollup(self):
+        """Recompute the daily revenue rollup from the sales table"""
+        try:
+            cur = self.db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            rebuild_sales_rollup(cur)
+            self.db.commit()
+            query_cache.bump('sales')
+            return True
+        except sqlite3.Error as e:
+            print(f"Error rebuilding sales rollup: {e}")
+            self.db.rollback()
+            return False
+    
+    @cached_query('appointments_enhanced', 'appointments')
     def get_popular_services(self, limit=10, start_date=None, end_date=None):
-        """Get most popular services"""
+        """Get most popular services (bounds as in get_revenue_trends)"""
+        bounds = _date_bounds(start_date, end_date)
+        if bounds is None:
+            return []
+        start_date, end_date = bounds
         try:
             cur = self.db.cursor()
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
-                table_name = "appointments_enhanced"
-                date_field = "appointment_date"
+            if schema_catalog.has_table('appointment_service_daily', self.db):
+                # Per-day counts maintained by triggers on appointments_enhanced
+                query = """
+                    SELECT 
+                        service,
+                        SUM(appointments) as service_count,
+                        SUM(revenue) as total_revenue,
+                        SUM(revenue) / SUM(appointments) as avg_revenue
+                    FROM appointment_service_daily 
+                    WHERE 1=1
+                """
+                date_field = "day"
             else:
-                table_name = "appointments"
-                date_field = "date"
-            
-            query = f"""
-                SELECT 
-                    service,
-                    COUNT(*) as service_count,
-                    SUM(total_amount) as total_revenue,
-                    AVG(total_amount) as avg_revenue
-                FROM {table_name} 
-                WHERE 1=1
-            """
+                query = """
+                    SELECT 
+                        service,
+                        COUNT(*) as service_count,
+                        SUM(total_amount) as total_revenue,
+                        AVG(total_amount) as avg_revenue
+                    FROM appointments 
+                    WHERE 1=1
+                """
+                date_field = "substr(date, 1, 10)"
             params = []
             
             if start_date:
@@ -533,20 +981,21 @@ class AnalyticsManager:
             print(f"Error getting popular services: {e}")
             return []
     
+    @cached_query('appointments_enhanced')
     def get_customer_demographics(self):
-        """Get customer/patient demographics"""
+        """Get customer/patient demographics from appointments_enhanced (as the columnar engine does)"""
         try:
             cur = self.db.cursor()
             
-            # Animal type distribution
+            # Animal type distribution; ties keep first-seen order like the engine
             cur.execute("""
                 SELECT 
                     animal_type,
                     COUNT(*) as count,
-                    ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM appointments), 2) as percentage
-                FROM appointments 
+                    ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM appointments_enhanced), 2) as percentage
+                FROM appointments_enhanced 
                 GROUP BY animal_type 
-                ORDER BY count DESC
+                ORDER BY count DESC, MIN(id)
             """)
             animal_distribution = cur.fetchall()
             
@@ -555,11 +1004,11 @@ class AnalyticsManager:
                 SELECT 
                     owner_name,
                     COUNT(*) as appointment_count,
-                    SUM(total_amount) as total_spent,
-                    AVG(total_amount) as avg_spent
-                FROM appointments 
+                    SUM(COALESCE(total_amount, 0)) as total_spent,
+                    AVG(COALESCE(total_amount, 0)) as avg_spent
+                FROM appointments_enhanced 
                 GROUP BY owner_name 
-                ORDER BY appointment_count DESC
+                ORDER BY appointment_count DESC, MIN(id)
                 LIMIT 20
             """)
             customer_frequency = cur.fetchall()
@@ -572,33 +1021,37 @@ class AnalyticsManager:
             print(f"Error getting demographics: {e}")
             return {}
     
+    @cached_query('appointments_enhanced')
     def get_veterinarian_performance(self, start_date=None, end_date=None):
-        """Get veterinarian performance metrics"""
+        """Get veterinarian performance metrics (bounds as in get_revenue_trends)"""
+        bounds = _date_bounds(start_date, end_date)
+        if bounds is None:
+            return []
+        start_date, end_date = bounds
         try:
             cur = self.db.cursor()
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('vet_status_daily', self.db):
+                # Per-day, per-status counts maintained by triggers on appointments_enhanced
                 query = """
                     SELECT 
                         veterinarian,
-                        COUNT(*) as appointments,
-                        SUM(total_amount) as revenue,
-                        AVG(total_amount) as avg_revenue_per_appointment,
-                        COUNT(CASE WHEN status = 'COMPLETED' THEN 1 END) as completed,
-                        COUNT(CASE WHEN status = 'CANCELLED' THEN 1 END) as cancelled,
-                        ROUND(COUNT(CASE WHEN status = 'COMPLETED' THEN 1 END) * 100.0 / COUNT(*), 2) as completion_rate
-                    FROM appointments_enhanced 
-                    WHERE veterinarian IS NOT NULL AND veterinarian != ''
+                        SUM(appointments) as appointments,
+                        SUM(revenue) as revenue,
+                        SUM(revenue) / SUM(appointments) as avg_revenue_per_appointment,
+                        SUM(CASE WHEN status = 'COMPLETED' THEN appointments ELSE 0 END) as completed,
+                        SUM(CASE WHEN status = 'CANCELLED' THEN appointments ELSE 0 END) as cancelled,
+                        ROUND(SUM(CASE WHEN status = 'COMPLETED' THEN appointments ELSE 0 END) * 100.0 / SUM(appointments), 2) as completion_rate
+                    FROM vet_status_daily 
+                    WHERE veterinarian != ''
                 """
                 params = []
                 
                 if start_date:
-                    query += " AND appointment_date >= ?"
+                    query += " AND day >= ?"
                     params.append(start_date)
                 if end_date:
-                    query += " AND appointment_date <= ?"
+                    query += " AND day <= ?"
                     params.append(end_date)
                 
                 query += " GROUP BY veterinarian ORDER BY revenue DESC"
@@ -611,20 +1064,15 @@ class AnalyticsManager:
             return []
 
 
-class CommunicationManager:
+class CommunicationManager(BaseManager):
     """Manages client communication including reminders"""
     
-    def __init__(self, db_connection):
-        self.db = db_connection
-    
     def send_appointment_reminder(self, appointment_id):
         """Send appointment reminder to client"""
         try:
             cur = self.db.cursor()
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 cur.execute("""
                     SELECT * FROM appointments_enhanced 
                     WHERE appointment_id = ? AND reminder_sent = 0
@@ -639,19 +1087,6 @@ class CommunicationManager:
                     """, (appointment_id,))
                     self.db.commit()
                     
-                    # Create communication log table if not exists
-                    cur.execute("""
-                        CREATE TABLE IF NOT EXISTS communication_log(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            appointment_id TEXT,
-                            communication_type TEXT,
-                            sent_to TEXT,
-                            message TEXT,
-                            sent_date TEXT,
-                            status TEXT
-                        )
-                    """)
-                    
                     # Log the reminder
                     cur.execute("""
                         INSERT INTO communication_log 
@@ -664,6 +1099,7 @@ class CommunicationManager:
                     return True
         except sqlite3.Error as e:
             print(f"Error sending reminder: {e}")
+            self.db.rollback()
         return False
     
     def send_follow_up(self, appointment_id, message=""):
@@ -671,27 +1107,12 @@ class CommunicationManager:
         try:
             cur = self.db.cursor()
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.db):
                 cur.execute("SELECT * FROM appointments_enhanced WHERE appointment_id = ?", 
                            (appointment_id,))
                 appointment = cur.fetchone()
                 
                 if appointment:
-                    # Create communication log table if not exists
-                    cur.execute("""
-                        CREATE TABLE IF NOT EXISTS communication_log(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            appointment_id TEXT,
-                            communication_type TEXT,
-                            sent_to TEXT,
-                            message TEXT,
-                            sent_date TEXT,
-                            status TEXT
-                        )
-                    """)
-                    
                     # Log the follow-up
                     cur.execute("""
                         INSERT INTO communication_log 
@@ -712,6 +1133,7 @@ class CommunicationManager:
                     return True
         except sqlite3.Error as e:
             print(f"Error sending follow-up: {e}")
+            self.db.rollback()
         return False
     
     def get_communication_log(self, appointment_id=None, customer_name=None):
@@ -719,9 +1141,7 @@ class CommunicationManager:
         try:
             cur = self.db.cursor()
             
-            # Check if communication log table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='communication_log'")
-            if not cur.fetchone():
+            if not schema_catalog.has_table('communication_log', self.db):
                 return []
             
             query = "SELECT * FROM communication_log WHERE 1=1"
@@ -746,16 +1166,14 @@ class CommunicationManager:
         try:
             cur = self.db.cursor()
             
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if not cur.fetchone():
+            if not schema_catalog.has_table('appointments_enhanced', self.db):
                 return 0
             
-            tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+            tomorrow = day_number(datetime.now().date()) + 1
             
             cur.execute("""
                 SELECT appointment_id FROM appointments_enhanced 
-                WHERE appointment_date = ? 
+                WHERE appointment_day = ? 
                 AND status = 'SCHEDULED'
                 AND reminder_sent = 0
             """, (tomorrow,))
@@ -773,51 +1191,154 @@ class CommunicationManager:
             return 0
 
 
-class SalesManager:
+class SalesManager(BaseManager):
     """Manages sales and transactions"""
     
-    def __init__(self, db_connection):
-        self.db = db_connection
-    
+    INSERT_SALE_SQL = """INSERT INTO sales 
+                        (transaction_id, item_id, item_name, quantity, price, subtotal, 
+                         total_amount, payment_method, customer_name, sale_date) 
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+    UPSERT_ROLLUP_SQL = """INSERT INTO sales_daily_rollup 
+                           (day, payment_method, revenue, transactions, items_sold)
+                           VALUES (?, ?, ?, ?, ?)
+                           ON CONFLICT(day, payment_method) DO UPDATE SET
+                               revenue = revenue + excluded.revenue,
+                               transactions = transactions + excluded.transactions,
+                               items_sold = items_sold + excluded.items_sold"""
+
+    @staticmethod
+    def _rollup_rows(rows):
+        """Aggregate sales rows into sales_daily_rollup increments, one transaction counted once"""
+        totals = {}
+        transactions = {}
+        for transaction_id, _, _, qty, _, _, total_amount, payment_method, _, sale_date in rows:
+            key = (sale_day(sale_date), payment_method or "")
+            transactions.setdefault(transaction_id, (key, total_amount))
+            entry = totals.setdefault(key, [0.0, 0, 0])
+            entry[2] += qty or 0
+        for key, total_amount in transactions.values():
+            totals[key][0] += total_amount or 0
+            totals[key][1] += 1
+        return [(day, method, revenue, count, items)
+                for (day, method), (revenue, count, items) in totals.items()]
+
+    @staticmethod
+    def _sale_rows(transaction_id, items, total_amount, payment_method, customer_name, sale_date=None):
+        """Build the sales table rows for one transaction"""
+        sale_date = sale_date or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return [(transaction_id, item['id'], item['name'], item['qty'], item['price'],
+                 item['subtotal'], total_amount, payment_method, customer_name, sale_date)
+                for item in items]
+
     def record_sale(self, transaction_id, items, total_amount, payment_method, customer_name=""):
-        """Record a sale transaction"""
+        """Record a sale transaction.
+
+        Stock is taken with a conditional update, and the sale rows and the
+        daily rollup are written, all in one transaction. Raises
+        InsufficientStockError (and records nothing) if any line is short;
+        returns False on a database error.
+        """
+        quantities = _stock_quantities(items)
         try:
-            cur = self.db.cursor()
-            for item in items:
-                cur.execute("""INSERT INTO sales 
-                            (transaction_id, item_id, item_name, quantity, price, subtotal, 
-                             total_amount, payment_method, customer_name, sale_date) 
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (transaction_id, item['id'], item['name'], item['qty'], 
-                             item['price'], item['subtotal'], total_amount, payment_method,
-                             customer_name, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            
-            # Update inventory stock
-            for item in items:
-                cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ?",
-                           (item['qty'], item['id']))
+            with inventory_catalog.writing():
+                cur = self.db.cursor()
+                cur.execute("BEGIN IMMEDIATE")
+                shortfalls = _take_stock(cur, quantities)
+                if shortfalls:
+                    self.db.rollback()
+                    raise InsufficientStockError(shortfalls)
             
-            self.db.commit()
+                rows = self._sale_rows(transaction_id, items, total_amount, payment_method, customer_name)
+                cur.executemany(self.INSERT_SALE_SQL, rows)
+                cur.executemany(self.UPSERT_ROLLUP_SQL, self._rollup_rows(rows))
+            
+                self.db.commit()
+                query_cache.bump('sales', 'inventory')
+                for item_id, qty in quantities.items():
+                    inventory_catalog.adjust_stock(item_id, -qty)
             return True
         except sqlite3.Error as e:
             print(f"Error recording sale: {e}")
+            self.db.rollback()
             return False
+        except Exception:
+            self.db.rollback()
+            raise
+    
+    def record_sales_batch(self, transactions):
+        """Record many completed transactions at once (e.g. an offline terminal queue).
+
+        Each transaction is a dict with transaction_id, items, total_amount,
+        payment_method and optionally customer_name and sale_date. A sale_date
+        is stored as 'YYYY-MM-DD HH:MM:SS'; if one is not a date or timestamp
+        the whole batch is rejected. The sales already happened, so they are
+        recorded even when stock is short: stock is taken down to zero, never
+        below, and the shortfalls are printed. Everything is written in one
+        transaction. Returns the number of transactions recorded (0 on error).
+        """
+        rows = []
+        quantities = {}
+        for txn in transactions:
+            sale_date = txn.get('sale_date')
+            if sale_date:
+                sale_date = _sale_timestamp(sale_date)
+                if sale_date is None:
+                    print(f"Invalid sale_date for transaction {txn['transaction_id']}: {txn['sale_date']!r}")
+                    return 0
+            rows.extend(self._sale_rows(txn['transaction_id'], txn['items'], txn['total_amount'],
+                                        txn['payment_method'], txn.get('customer_name', ""),
+                                        sale_date))
+            for item_id, qty in _stock_quantities(txn['items']).items():
+                quantities[item_id] = quantities.get(item_id, 0) + qty
+        try:
+            with inventory_catalog.writing():
+                cur = self.db.cursor()
+                cur.execute("BEGIN IMMEDIATE")
+                cur.executemany(self.INSERT_SALE_SQL, rows)
+                cur.executemany(self.UPSERT_ROLLUP_SQL, self._rollup_rows(rows))
+                taken, shortfalls = _take_available_stock(cur, quantities)
+                self.db.commit()
+                query_cache.bump('sales', 'inventory')
+                for item_id, qty in taken.items():
+                    inventory_catalog.adjust_stock(item_id, -qty)
+        except sqlite3.Error as e:
+            print(f"Error recording sales batch: {e}")
+            self.db.rollback()
+            return 0
+        except Exception:
+            self.db.rollback()
+            raise
+        if shortfalls:
+            print("Recorded sales exceed stock: " + ", ".join(
+                f"{s['name'] or s['id']}: sold {s['requested']}, had {s['available']}" for s in shortfalls))
+        return len(transactions)
     
     def get_sales_report(self, start_date=None, end_date=None):
-        """Get sales report for a date range"""
+        """Get sales report for a date range.
+
+        Bounds may be a year, a month, a date or a full timestamp; a year,
+        month or date includes the whole period. Returns [] if a bound
+        cannot be parsed.
+        """
+        start_range = _epoch_range(start_date) if start_date else None
+        end_range = _epoch_range(end_date) if end_date else None
+        if (start_date and start_range is None) or (end_date and end_range is None):
+            print(f"Invalid sales report range: {start_date!r} to {end_date!r}")
+            return []
         try:
             cur = self.db.cursor()
             query = "SELECT * FROM sales WHERE 1=1"
             params = []
             
-            if start_date:
-                query += " AND sale_date >= ?"
-                params.append(start_date)
-            if end_date:
-                query += " AND sale_date <= ?"
-                params.append(end_date)
+            if start_range is not None:
+                query += " AND sale_epoch >= ?"
+                params.append(start_range[0])
+            if end_range is not None:
+                query += " AND sale_epoch <= ?"
+                params.append(end_range[1])
             
-            query += " ORDER BY sale_date DESC"
+            query += " ORDER BY sale_epoch DESC"
             cur.execute(query, params)
             return cur.fetchall()
         except sqlite3.Error as e:
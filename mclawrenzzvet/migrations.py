@@ -0,0 +1,709 @@
+"""Versioned schema migrations.
+
+Each migration is a ``(version, description, function)`` entry in
+``MIGRATIONS``. Migrations run in order inside their own transaction and are
+recorded in the ``schema_version`` table, so startup only has to read one row
+when the schema is already current. Every step must be idempotent: it may be
+run against databases created by older releases that already contain part of
+the schema.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+# Integer encodings of the TEXT date/time columns. The SQL expressions fill
+# the integer columns and the Python helpers encode query parameters the
+# same way: day numbers count days since 1970-01-01 and epochs are seconds
+# since 1970-01-01 00:00, both reading the stored local time as-is.
+DAY_SQL = "CAST(julianday(substr({column}, 1, 10)) - 2440587.5 AS INTEGER)"
+EPOCH_SQL = "CAST(strftime('%s', {column}) AS INTEGER)"
+MINUTE_SQL = ("CASE WHEN {column} GLOB '*[0-9]:[0-9][0-9]*' THEN "
+              "CAST(substr({column}, 1, instr({column}, ':') - 1) AS INTEGER) * 60 + "
+              "CAST(substr({column}, instr({column}, ':') + 1, 2) AS INTEGER) END")
+# Rollup day of a sale: its 'YYYY-MM-DD' prefix, or UNDATED_DAY when the
+# prefix is not a valid date. sale_day() is the Python twin used by the
+# incremental path, so a rebuild always reproduces the incremental rows.
+SALE_DAY_SQL = ("CASE WHEN date(julianday(substr({column}, 1, 10))) = substr({column}, 1, 10) "
+                "THEN substr({column}, 1, 10) ELSE '' END")
+UNDATED_DAY = ""
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+def day_number(value):
+    """Encode a 'YYYY-MM-DD...' value as a day number (None if invalid)"""
+    try:
+        return (date.fromisoformat(str(value)[:10]) - _EPOCH_DATE).days
+    except ValueError:
+        return None
+
+
+def day_range(value):
+    """Day-number range of a 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD...' value (None if not a date)"""
+    value = str(value).strip()
+    try:
+        if len(value) == 4:
+            first, last = f"{value}-01-01", f"{value}-12-31"
+        elif len(value) == 7:
+            year, month = int(value[:4]), int(value[5:7])
+            next_month = datetime(year + month // 12, month % 12 + 1, 1)
+            first, last = f"{value}-01", (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
+        else:
+            first = last = value
+    except ValueError:
+        return None
+    first, last = day_number(first), day_number(last)
+    if first is None or last is None:
+        return None
+    return first, last
+
+
+def sale_day(value):
+    """Rollup day of a sale_date: its 'YYYY-MM-DD' prefix, or UNDATED_DAY if invalid"""
+    day = str(value or "")[:10]
+    try:
+        valid = date.fromisoformat(day).isoformat() == day
+    except ValueError:
+        valid = False
+    return day if valid else UNDATED_DAY
+
+
+def epoch_seconds(value):
+    """Encode a 'YYYY-MM-DD[ HH:MM[:SS]]' value as epoch seconds (None if invalid)"""
+    try:
+        return int(datetime.fromisoformat(str(value)).replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+def _table_columns(cur, table):
+    """Get the column names of a table"""
+    cur.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cur.fetchall()}
+
+
+def _add_missing_columns(cur, table, columns):
+    """Add columns that older databases are missing"""
+    existing = _table_columns(cur, table)
+    for column, definition in columns.items():
+        if column not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _migration_001_baseline(cur):
+    """Create the base schema and seed the default users"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT DEFAULT 'staff'
+        )
+    """)
+    _add_missing_columns(cur, "users", {"role": "TEXT DEFAULT 'staff'"})
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS inventory(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            price REAL,
+            stock INTEGER,
+            category TEXT,
+            image TEXT,
+            brand TEXT,
+            animal_type TEXT,
+            dosage TEXT,
+            expiration_date TEXT
+        )
+    """)
+    _add_missing_columns(cur, "inventory", {
+        "brand": "TEXT",
+        "animal_type": "TEXT",
+        "dosage": "TEXT",
+        "expiration_date": "TEXT",
+    })
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointments(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT,
+            patient_name TEXT,
+            owner_name TEXT,
+            animal_type TEXT,
+            service TEXT,
+            qty INTEGER,
+            price REAL,
+            subtotal REAL,
+            date TEXT,
+            notes TEXT,
+            status TEXT,
+            total_amount REAL
+        )
+    """)
+    _add_missing_columns(cur, "appointments", {
+        "appointment_id": "TEXT",
+        "patient_name": "TEXT",
+        "owner_name": "TEXT",
+        "animal_type": "TEXT",
+        "service": "TEXT",
+        "qty": "INTEGER",
+        "price": "REAL",
+        "subtotal": "REAL",
+        "date": "TEXT",
+        "notes": "TEXT",
+        "status": "TEXT",
+        "total_amount": "REAL",
+    })
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointments_enhanced(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT,
+            patient_name TEXT,
+            owner_name TEXT,
+            animal_type TEXT,
+            service TEXT,
+            veterinarian TEXT,
+            duration INTEGER,
+            appointment_date TEXT,
+            appointment_time TEXT,
+            date_created TEXT,
+            notes TEXT,
+            status TEXT,
+            total_amount REAL,
+            reminder_sent BOOLEAN DEFAULT 0,
+            follow_up_needed BOOLEAN DEFAULT 0
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointment_services(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT,
+            service_name TEXT,
+            quantity INTEGER,
+            price REAL,
+            subtotal REAL
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS communication_log(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT,
+            communication_type TEXT,
+            sent_to TEXT,
+            message TEXT,
+            sent_date TEXT,
+            status TEXT
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sales(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT,
+            item_id INTEGER,
+            item_name TEXT,
+            quantity INTEGER,
+            price REAL,
+            subtotal REAL,
+            total_amount REAL,
+            payment_method TEXT,
+            customer_name TEXT,
+            sale_date TEXT
+        )
+    """)
+
+    # Default users with different roles
+    default_users = [
+        ("admin", "admin123", "admin"),
+        ("staff", "staff123", "staff"),
+        ("vet_smith", "vet123", "veterinarian"),
+        ("reception", "recep123", "receptionist")
+    ]
+    cur.executemany(
+        "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)",
+        default_users,
+    )
+
+
+# Secondary indexes for the predicates used by the managers' hot queries
+INDEXES = {
+    "idx_appt_enh_vet_date_time":
+        "appointments_enhanced(veterinarian, appointment_date, appointment_time)",
+    "idx_appt_enh_date_status_reminder":
+        "appointments_enhanced(appointment_date, status, reminder_sent)",
+    "idx_appt_enh_appointment_id": "appointments_enhanced(appointment_id)",
+    "idx_appt_services_appointment_id": "appointment_services(appointment_id)",
+    "idx_appointments_appointment_id": "appointments(appointment_id)",
+    "idx_appointments_date": "appointments(date)",
+    "idx_comm_log_appointment_id": "communication_log(appointment_id, sent_date)",
+    "idx_comm_log_sent_to": "communication_log(sent_to, sent_date)",
+    "idx_comm_log_type": "communication_log(communication_type)",
+    "idx_sales_sale_date": "sales(sale_date)",
+    "idx_sales_transaction_id": "sales(transaction_id)",
+    "idx_inventory_name": "inventory(name)",
+    "idx_inventory_category_name": "inventory(category, name)",
+    "idx_inventory_stock": "inventory(stock)",
+}
+
+
+def create_indexes(cur, indexes=INDEXES):
+    """Create every registered secondary index that does not exist yet"""
+    for name, target in indexes.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def _migration_002_hot_query_indexes(cur):
+    """Index the columns filtered by the hot manager queries"""
+    create_indexes(cur)
+
+
+# Inventory columns indexed for full-text search, in bm25 weight order
+INVENTORY_FTS_COLUMNS = ("name", "category", "brand", "animal_type", "dosage")
+
+
+def _migration_003_inventory_fts(cur):
+    """Create the FTS5 inventory search index kept in sync by triggers"""
+    columns = ", ".join(INVENTORY_FTS_COLUMNS)
+    new_values = ", ".join(f"new.{col}" for col in INVENTORY_FTS_COLUMNS)
+    old_values = ", ".join(f"old.{col}" for col in INVENTORY_FTS_COLUMNS)
+
+    cur.execute("SAVEPOINT inventory_fts")
+    try:
+        cur.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+                {columns},
+                content='inventory',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search falls back to LIKE matching
+        cur.execute("ROLLBACK TO inventory_fts")
+        cur.execute("RELEASE inventory_fts")
+        print(f"Full-text search unavailable: {e}")
+        return
+    cur.execute("RELEASE inventory_fts")
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_insert AFTER INSERT ON inventory BEGIN
+            INSERT INTO inventory_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_delete AFTER DELETE ON inventory BEGIN
+            INSERT INTO inventory_fts(inventory_fts, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_update AFTER UPDATE OF {columns} ON inventory BEGIN
+            INSERT INTO inventory_fts(inventory_fts, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+            INSERT INTO inventory_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    # Index the rows that already exist
+    cur.execute("INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')")
+
+
+def rebuild_sales_rollup(cur):
+    """Recompute sales_daily_rollup from the sales table.
+
+    Each transaction is counted once: its total_amount is repeated on every
+    line, so lines are collapsed per transaction before summing. Sales whose
+    sale_date does not start with a valid date are counted under UNDATED_DAY.
+    """
+    day = SALE_DAY_SQL.format(column="MIN(sale_date)")
+    cur.execute("DELETE FROM sales_daily_rollup")
+    cur.execute(f"""
+        INSERT INTO sales_daily_rollup (day, payment_method, revenue, transactions, items_sold)
+        SELECT day, payment_method, SUM(total), COUNT(*), SUM(items)
+        FROM (
+            SELECT {day} AS day,
+                   COALESCE(MIN(payment_method), '') AS payment_method,
+                   COALESCE(MAX(total_amount), 0) AS total,
+                   COALESCE(SUM(quantity), 0) AS items
+            FROM sales
+            GROUP BY transaction_id
+        )
+        GROUP BY day, payment_method
+    """)
+
+
+def _migration_004_sales_daily_rollup(cur):
+    """Create the per-day, per-payment-method revenue rollup and backfill it"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_rollup(
+            day TEXT NOT NULL,
+            payment_method TEXT NOT NULL DEFAULT '',
+            revenue REAL NOT NULL DEFAULT 0,
+            transactions INTEGER NOT NULL DEFAULT 0,
+            items_sold INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, payment_method)
+        ) WITHOUT ROWID
+    """)
+    rebuild_sales_rollup(cur)
+
+
+# Appointment rollups: table -> grouping columns as (rollup column, appointments_enhanced
+# expression over the row alias). Day comes first in each key so date ranges are index scans.
+APPOINTMENT_ROLLUPS = {
+    "appointment_service_daily": (
+        ("day", "{row}.appointment_date"),
+        ("service", "COALESCE({row}.service, '')"),
+    ),
+    "vet_status_daily": (
+        ("day", "{row}.appointment_date"),
+        ("veterinarian", "COALESCE({row}.veterinarian, '')"),
+        ("status", "COALESCE({row}.status, '')"),
+    ),
+}
+
+
+def rebuild_appointment_rollups(cur):
+    """Recompute the appointment rollup tables from appointments_enhanced"""
+    for table, keys in APPOINTMENT_ROLLUPS.items():
+        columns = ", ".join(column for column, _ in keys)
+        expressions = ", ".join(expression.format(row="a") for _, expression in keys)
+        cur.execute(f"DELETE FROM {table}")
+        cur.execute(f"""
+            INSERT INTO {table} ({columns}, appointments, revenue)
+            SELECT {expressions}, COUNT(*), SUM(COALESCE(a.total_amount, 0))
+            FROM appointments_enhanced a
+            WHERE a.appointment_date IS NOT NULL
+            GROUP BY {expressions}
+        """)
+
+
+def _migration_005_appointment_rollups(cur):
+    """Create per-day service and veterinarian/status rollups kept current by triggers"""
+    for table, keys in APPOINTMENT_ROLLUPS.items():
+        columns = ", ".join(column for column, _ in keys)
+        column_defs = ",\n".join(f"            {column} TEXT NOT NULL" for column, _ in keys)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table}(
+{column_defs},
+            appointments INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ({columns})
+            ) WITHOUT ROWID
+        """)
+
+        def apply(row, op):
+            # Count one appointment row into (op "+") or out of (op "-") the rollup
+            values = ", ".join(expression.format(row=row) for _, expression in keys)
+            match = " AND ".join(f"{column} = {expression.format(row=row)}" for column, expression in keys)
+            statements = f"""
+                INSERT OR IGNORE INTO {table} ({columns}) VALUES ({values});
+                UPDATE {table}
+                SET appointments = appointments {op} 1,
+                    revenue = revenue {op} COALESCE({row}.total_amount, 0)
+                WHERE {match};"""
+            if op == "-":
+                statements += f"""
+                DELETE FROM {table} WHERE {match} AND appointments <= 0;"""
+            return statements
+
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON appointments_enhanced
+            WHEN new.appointment_date IS NOT NULL BEGIN{apply("new", "+")}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON appointments_enhanced
+            WHEN old.appointment_date IS NOT NULL BEGIN{apply("old", "-")}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_update_old AFTER UPDATE OF
+                appointment_date, service, veterinarian, status, total_amount ON appointments_enhanced
+            WHEN old.appointment_date IS NOT NULL BEGIN{apply("old", "-")}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_update_new AFTER UPDATE OF
+                appointment_date, service, veterinarian, status, total_amount ON appointments_enhanced
+            WHEN new.appointment_date IS NOT NULL BEGIN{apply("new", "+")}
+            END
+        """)
+    rebuild_appointment_rollups(cur)
+
+
+# Integer columns derived from TEXT date/time columns:
+# table -> {integer column: (source column, SQL expression template)}
+INTEGER_DATE_COLUMNS = {
+    "sales": {
+        "sale_day": ("sale_date", DAY_SQL),
+        "sale_epoch": ("sale_date", EPOCH_SQL),
+    },
+    "appointments": {
+        "appointment_day": ("date", DAY_SQL),
+    },
+    "appointments_enhanced": {
+        "appointment_day": ("appointment_date", DAY_SQL),
+        "appointment_minute": ("appointment_time", MINUTE_SQL),
+    },
+    "inventory": {
+        "expiration_day": ("expiration_date", DAY_SQL),
+    },
+}
+
+# Range-scan indexes on the integer columns. They replace the TEXT date
+# indexes from migration 2, which are dropped.
+INTEGER_DATE_INDEXES = {
+    "idx_appt_enh_vet_day_minute":
+        "appointments_enhanced(veterinarian, appointment_day, appointment_minute)",
+    "idx_appt_enh_day_status_reminder":
+        "appointments_enhanced(appointment_day, status, reminder_sent)",
+    "idx_appointments_day": "appointments(appointment_day)",
+    "idx_sales_sale_epoch": "sales(sale_epoch)",
+    "idx_sales_sale_day": "sales(sale_day)",
+    "idx_inventory_expiration_day": "inventory(expiration_day)",
+}
+SUPERSEDED_DATE_INDEXES = (
+    "idx_appt_enh_vet_date_time",
+    "idx_appt_enh_date_status_reminder",
+    "idx_appointments_date",
+    "idx_sales_sale_date",
+)
+
+
+def _migration_006_integer_dates(cur):
+    """Add integer day/epoch/minute columns kept in sync by triggers, and index them"""
+    for table, columns in INTEGER_DATE_COLUMNS.items():
+        _add_missing_columns(cur, table, {column: "INTEGER" for column in columns})
+        sources = sorted({source for source, _ in columns.values()})
+        assignments = ", ".join(f"{column} = {template.format(column=f'new.{source}')}"
+                                for column, (source, template) in columns.items())
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_dates_insert AFTER INSERT ON {table} BEGIN
+                UPDATE {table} SET {assignments} WHERE rowid = new.rowid;
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_dates_update AFTER UPDATE OF {", ".join(sources)} ON {table} BEGIN
+                UPDATE {table} SET {assignments} WHERE rowid = new.rowid;
+            END
+        """)
+        # Backfill existing rows
+        backfill = ", ".join(f"{column} = {template.format(column=source)}"
+                             for column, (source, template) in columns.items())
+        cur.execute(f"UPDATE {table} SET {backfill}")
+
+    for name in SUPERSEDED_DATE_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    create_indexes(cur, INTEGER_DATE_INDEXES)
+
+
+# Serves the newest-first appointment list one page at a time without a sort
+APPOINTMENT_LIST_INDEXES = {
+    "idx_appt_enh_day_minute": "appointments_enhanced(appointment_day, appointment_minute)",
+}
+
+
+def _migration_007_appointment_list_index(cur):
+    """Index the appointment list order so its pages are read straight from the index"""
+    create_indexes(cur, APPOINTMENT_LIST_INDEXES)
+
+
+# Appointments without a valid date or time are listed after the dated ones;
+# the partial index keeps that tail of the list keyset-pageable as well
+UNDATED_APPOINTMENT_INDEXES = {
+    "idx_appt_enh_undated": ("appointments_enhanced(id) "
+                             "WHERE appointment_day IS NULL OR appointment_minute IS NULL"),
+}
+
+
+def _migration_008_undated_appointment_index(cur):
+    """Index the appointments that have no day or minute, newest id first"""
+    create_indexes(cur, UNDATED_APPOINTMENT_INDEXES)
+
+
+# Ordered list of (version, description, function). Append new steps at the end.
+MIGRATIONS = [
+    (1, "baseline schema", _migration_001_baseline),
+    (2, "hot query indexes", _migration_002_hot_query_indexes),
+    (3, "inventory full-text search", _migration_003_inventory_fts),
+    (4, "daily sales rollup", _migration_004_sales_daily_rollup),
+    (5, "appointment rollups", _migration_005_appointment_rollups),
+    (6, "integer date columns", _migration_006_integer_dates),
+    (7, "appointment list index", _migration_007_appointment_list_index),
+    (8, "undated appointment index", _migration_008_undated_appointment_index),
+]
+
+# Queries that must be answered through an index: (name, sql, params)
+HOT_QUERIES = [
+    ("get_enhanced_appointments_page",
+     "SELECT * FROM appointments_enhanced "
+     "WHERE appointment_day IS NOT NULL AND appointment_minute IS NOT NULL "
+     "AND (appointment_day, appointment_minute, id) < (?, ?, ?) "
+     "ORDER BY appointment_day DESC, appointment_minute DESC, id DESC LIMIT ?",
+     (20000, 600, 1, 100)),
+    ("get_enhanced_appointments_page (undated)",
+     "SELECT * FROM appointments_enhanced "
+     "WHERE (appointment_day IS NULL OR appointment_minute IS NULL) AND id < ? "
+     "ORDER BY id DESC LIMIT ?",
+     (1, 100)),
+    ("get_appointments_by_veterinarian",
+     "SELECT * FROM appointments_enhanced WHERE veterinarian = ? AND appointment_day = ? "
+     "ORDER BY appointment_minute",
+     ("Dr. Smith", 19723)),
+    ("get_upcoming_appointments",
+     "SELECT * FROM appointments_enhanced WHERE appointment_day BETWEEN ? AND ? "
+     "AND status IN ('SCHEDULED', 'IN_PROGRESS') ORDER BY appointment_day, appointment_minute",
+     (19723, 19730)),
+    ("load_appointment_occupancy",
+     "SELECT veterinarian, appointment_date, appointment_minute, duration FROM appointments_enhanced "
+     "WHERE appointment_day BETWEEN ? AND ? AND status IN ('SCHEDULED', 'IN_PROGRESS')",
+     (19723, 19729)),
+    ("check_and_send_reminders",
+     "SELECT appointment_id FROM appointments_enhanced WHERE appointment_day = ? "
+     "AND status = 'SCHEDULED' AND reminder_sent = 0",
+     (19724,)),
+    ("get_appointments_history",
+     "SELECT * FROM appointments WHERE appointment_day BETWEEN ? AND ? ORDER BY date DESC",
+     (19723, 19753)),
+    ("update_appointment_status",
+     "UPDATE appointments_enhanced SET status = ? WHERE appointment_id = ?",
+     ("COMPLETED", "APT1")),
+    ("delete_appointment_services",
+     "DELETE FROM appointment_services WHERE appointment_id = ?",
+     ("APT1",)),
+    ("get_communication_log",
+     "SELECT * FROM communication_log WHERE appointment_id = ? ORDER BY sent_date DESC",
+     ("APT1",)),
+    ("get_communication_log_by_customer",
+     "SELECT * FROM communication_log WHERE sent_to = ? ORDER BY sent_date DESC",
+     ("Owner",)),
+    ("get_sales_report",
+     "SELECT * FROM sales WHERE sale_epoch >= ? AND sale_epoch <= ? ORDER BY sale_epoch DESC",
+     (1704067200, 1706745599)),
+    ("get_expiring_items",
+     "SELECT * FROM inventory WHERE expiration_day BETWEEN ? AND ? ORDER BY expiration_day",
+     (19723, 19753)),
+    ("get_expired_items",
+     "SELECT * FROM inventory WHERE expiration_day < ? ORDER BY expiration_day",
+     (19723,)),
+    ("get_transaction_lines",
+     "SELECT * FROM sales WHERE transaction_id = ?",
+     ("TXN1",)),
+    ("find_item_by_name",
+     "SELECT id FROM inventory WHERE name = ?",
+     ("Amoxicillin 250mg",)),
+    ("get_revenue_trends",
+     "SELECT day, SUM(revenue) FROM sales_daily_rollup WHERE day >= ? AND day <= ? GROUP BY day",
+     ("2024-01-01", "2024-12-31")),
+    ("get_popular_services",
+     "SELECT service, SUM(appointments) FROM appointment_service_daily "
+     "WHERE day >= ? AND day <= ? GROUP BY service",
+     ("2024-01-01", "2024-12-31")),
+    ("get_veterinarian_performance",
+     "SELECT veterinarian, SUM(appointments) FROM vet_status_daily "
+     "WHERE day >= ? AND day <= ? GROUP BY veterinarian",
+     ("2024-01-01", "2024-12-31")),
+    ("get_low_stock_items",
+     "SELECT * FROM inventory WHERE stock <= ? ORDER BY stock ASC",
+     (10,)),
+]
+
+
+class QueryPlanError(sqlite3.DatabaseError):
+    """Raised when a registered hot query is planned as a full table scan"""
+
+
+def find_full_scans(conn, queries=None):
+    """Run EXPLAIN QUERY PLAN on the hot queries and return those scanning a whole table.
+
+    Returns a list of ``(name, plan_detail)`` tuples; an empty list means
+    every query is served by an index.
+    """
+    offenders = []
+    for name, sql, params in queries or HOT_QUERIES:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall():
+            detail = row[-1]
+            # "SCAN table" without "USING ... INDEX" is a full table scan
+            if detail.startswith("SCAN ") and "INDEX" not in detail:
+                offenders.append((name, detail))
+    return offenders
+
+
+def verify_query_plans(conn, queries=None):
+    """Raise QueryPlanError if any registered hot query falls back to a full scan"""
+    offenders = find_full_scans(conn, queries)
+    if offenders:
+        details = "; ".join(f"{name}: {detail}" for name, detail in offenders)
+        raise QueryPlanError(f"Hot queries without index: {details}")
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Get the schema version recorded in the database (0 when never migrated)"""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def run_migrations(conn):
+    """Apply all pending migrations and return how many were applied"""
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return 0
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version(
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+
+    applied = 0
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+            migrate(cur)
+            cur.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"Applied schema migration {version}: {description}")
+        applied += 1
+    return applied
+
+
+if __name__ == "__main__":
+    # Self-check: bring the configured database up to date and verify the query plans.
+    # Pass --rebuild-rollups to recompute the report rollup tables (e.g. after a backfill).
+    import sys
+    from config import DB_FILE
+
+    connection = sqlite3.connect(DB_FILE)
+    try:
+        run_migrations(connection)
+        if "--rebuild-rollups" in sys.argv:
+            cur = connection.cursor()
+            cur.execute("BEGIN")
+            rebuild_sales_rollup(cur)
+            rebuild_appointment_rollups(cur)
+            connection.commit()
+            print("Report rollups rebuilt")
+        verify_query_plans(connection)
+        print(f"Schema version {get_schema_version(connection)}: all hot queries use indexes")
+    except QueryPlanError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        connection.close()
@@ -2,10 +2,12 @@ import customtkinter as ctk
 from datetime import datetime, timedelta
 from tkinter import ttk, messagebox
 import tkinter as tk
-from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry, ResponsiveFrame, ColorfulCard
+from ui_components import (ModernFrame, ModernLabel, ModernButton, ModernEntry, ResponsiveFrame, ColorfulCard,
+                           VirtualTreeview, ListRowSource, PagedRowSource)
 from config import COLORS, SERVICE_PRICES, VETERINARIANS
 from utils.helpers import generate_appointment_id
 from models import EnhancedAppointment
+from managers import SchedulingConflictError
 
 class AppointmentsModule:
     def __init__(self, app):
@@ -72,7 +74,8 @@ class AppointmentsModule:
         
         # Create treeview for appointments
         columns = ("ID", "Patient", "Owner", "Animal", "Date", "Time", "Vet", "Status", "Amount")
-        self.appointments_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        self.appointments_tree = VirtualTreeview(list_frame, columns=columns, height=15,
+                                                 submit=self.app.tasks.submit)
         
         # Style the treeview
         style = ttk.Style()
@@ -98,12 +101,7 @@ class AppointmentsModule:
             self.appointments_tree.heading(col, text=col)
             self.appointments_tree.column(col, width=column_widths.get(col, 100))
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.appointments_tree.yview)
-        self.appointments_tree.configure(yscrollcommand=scrollbar.set)
-        
         self.appointments_tree.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-        scrollbar.grid(row=0, column=1, sticky="ns")
         
         # Load appointments data
         self.load_enhanced_appointments_data()
@@ -112,43 +110,53 @@ class AppointmentsModule:
         """Load enhanced appointments data into the treeview"""
         if not self.appointments_tree:
             return
-            
-        # Clear existing data
-        for item in self.appointments_tree.get_children():
-            self.appointments_tree.delete(item)
         
-        # Get enhanced appointments
-        appointments = self.app.appointment_manager.get_all_enhanced_appointments()
-        
-        if appointments:
+        self.app.tasks.submit(self.get_appointment_source, key="appointments-list",
+                              owner=self.appointments_tree, on_success=self.appointments_tree.set_source)
+    
+    @staticmethod
+    def format_enhanced_appointment(apt):
+        """Format an appointments_enhanced row for the treeview"""
+        return (
+            apt[1] if len(apt) > 1 else "",  # appointment_id
+            apt[2] if len(apt) > 2 else "",  # patient_name
+            apt[3] if len(apt) > 3 else "",  # owner_name
+            apt[4] if len(apt) > 4 else "",  # animal_type
+            apt[8] if len(apt) > 8 else "",  # appointment_date
+            apt[9] if len(apt) > 9 else "",  # appointment_time
+            apt[6] if len(apt) > 6 else "",  # veterinarian
+            apt[12] if len(apt) > 12 else "", # status
+            f"₱{apt[13]:.2f}" if len(apt) > 13 and apt[13] else "₱0.00"  # total_amount
+        )
+    
+    def get_appointment_source(self):
+        """Build the treeview row source (runs on a worker thread).
+        
+        Enhanced appointments are paged in from the database as the list
+        scrolls; only the count and the first page are read here.
+        """
+        manager = self.app.appointment_manager
+        source = PagedRowSource(manager.count_enhanced_appointments,
+                                manager.get_enhanced_appointments_page,
+                                manager.appointment_list_key,
+                                formatter=self.format_enhanced_appointment)
+        if len(source):
             # Use enhanced appointments
-            for apt in appointments:
-                self.appointments_tree.insert("", "end", values=(
-                    apt[1] if len(apt) > 1 else "",  # appointment_id
-                    apt[2] if len(apt) > 2 else "",  # patient_name
-                    apt[3] if len(apt) > 3 else "",  # owner_name
-                    apt[4] if len(apt) > 4 else "",  # animal_type
-                    apt[8] if len(apt) > 8 else "",  # appointment_date
-                    apt[9] if len(apt) > 9 else "",  # appointment_time
-                    apt[6] if len(apt) > 6 else "",  # veterinarian
-                    apt[12] if len(apt) > 12 else "", # status
-                    f"₱{apt[13]:.2f}" if len(apt) > 13 and apt[13] else "₱0.00"  # total_amount
-                ))
-        else:
-            # Fallback to regular appointments
-            appointments = self.app.appointment_manager.get_all_appointments()
-            for apt in appointments:
-                self.appointments_tree.insert("", "end", values=(
-                    apt[0] if len(apt) > 0 else "",  # appointment_id
-                    apt[1] if len(apt) > 1 else "",  # patient_name
-                    apt[2] if len(apt) > 2 else "",  # owner_name
-                    apt[3] if len(apt) > 3 else "",  # animal_type
-                    apt[4] if len(apt) > 4 else "",  # date
-                    "",  # time (not available)
-                    "",  # vet (not available)
-                    apt[6] if len(apt) > 6 else "", # status
-                    f"₱{apt[7]:.2f}" if len(apt) > 7 and apt[7] else "₱0.00"  # total_amount
-                ))
+            return source.prefetch()
+        
+        # Fallback to regular appointments
+        appointments = manager.get_all_appointments()
+        return ListRowSource([(
+            apt[0] if len(apt) > 0 else "",  # appointment_id
+            apt[1] if len(apt) > 1 else "",  # patient_name
+            apt[2] if len(apt) > 2 else "",  # owner_name
+            apt[3] if len(apt) > 3 else "",  # animal_type
+            apt[4] if len(apt) > 4 else "",  # date
+            "",  # time (not available)
+            "",  # vet (not available)
+            apt[6] if len(apt) > 6 else "", # status
+            f"₱{apt[7]:.2f}" if len(apt) > 7 and apt[7] else "₱0.00"  # total_amount
+        ) for apt in appointments])
     
     def create_enhanced_appointment(self):
         """Create a new enhanced appointment dialog - FIXED VERSION"""
@@ -262,37 +270,20 @@ class AppointmentsModule:
                 # Get service price
                 price = SERVICE_PRICES.get(service_type, 0.0)
                 # Check for veterinarian scheduling conflicts
-                def _time_to_minutes(tstr):
-                    try:
-                        parts = tstr.split(":")
-                        return int(parts[0]) * 60 + int(parts[1])
-                    except Exception:
-                        return None
-
                 if veterinarian and appointment_date and appointment_time:
                     try:
-                        existing = self.app.appointment_manager.get_appointments_by_veterinarian(veterinarian, appointment_date)
-                        new_start = _time_to_minutes(appointment_time)
-                        new_end = new_start + duration if new_start is not None else None
-
-                        for ap in existing:
-                            # ap format from appointments_enhanced: index 9=appointment_time, 7=duration, 12=status
-                            existing_time = ap[9] if len(ap) > 9 else None
-                            existing_duration = int(ap[7]) if len(ap) > 7 and ap[7] else None
-                            existing_status = ap[12] if len(ap) > 12 else None
-
-                            # Only consider scheduled or in-progress appointments
-                            if existing_status and existing_status not in ("SCHEDULED", "IN_PROGRESS"):
-                                continue
-
-                            if existing_time and new_start is not None and existing_duration:
-                                ex_start = _time_to_minutes(existing_time)
-                                ex_end = ex_start + existing_duration
-                                # Overlap check
-                                if (new_start < ex_end) and (ex_start < new_end):
-                                    messagebox.showerror("Scheduling Conflict",
-                                                         f"Dr. {veterinarian} already has an appointment at {existing_time}. Please choose a different time or doctor.")
-                                    return
+                        new_start = datetime.strptime(f"{appointment_date} {appointment_time}", '%Y-%m-%d %H:%M')
+                        new_end = new_start + timedelta(minutes=duration)
+                        conflicts = self.app.appointment_manager.find_conflicts(veterinarian, new_start, new_end)
+                        if conflicts:
+                            existing_time = conflicts[0][1]
+                            message = f"{veterinarian} already has an appointment at {existing_time}."
+                            free_slot = self.app.appointment_manager.next_free_slot(veterinarian, duration, after=new_start)
+                            if free_slot:
+                                message += f"\nNext free slot: {free_slot.strftime('%Y-%m-%d %H:%M')}."
+                            messagebox.showerror("Scheduling Conflict",
+                                                 f"{message}\nPlease choose a different time or doctor.")
+                            return
                     except Exception as e:
                         print(f"Error checking vet schedule: {e}")
 
@@ -341,6 +332,11 @@ class AppointmentsModule:
                     else:
                         messagebox.showerror("Error", "Failed to create appointment in main database")
                         
+                except SchedulingConflictError as conflict:
+                    # Booked from another terminal since the check above
+                    messagebox.showerror("Scheduling Conflict",
+                                         f"{veterinarian} already has an appointment at {conflict.conflicts[0][1]}."
+                                         f"\nPlease choose a different time or doctor.")
                 except Exception as db_error:
                     print(f"Database error: {db_error}")
                     import traceback
@@ -353,6 +349,51 @@ class AppointmentsModule:
                 traceback.print_exc()
                 messagebox.showerror("Error", f"Failed to create appointment: {str(e)}")
         
+        def suggest_times():
+            try:
+                duration = int(entries["Duration (minutes):"].get())
+                start_date = datetime.strptime(entries["Appointment Date:"].get(), '%Y-%m-%d').date()
+            except ValueError:
+                messagebox.showerror("Error", "Enter a valid date (YYYY-MM-DD) and duration first")
+                return
+            
+            self.app.tasks.submit(self.app.appointment_manager.suggest_appointment_slots,
+                                  duration, start_date=start_date,
+                                  preferred_time=entries["Appointment Time:"].get(),
+                                  key="appointment-suggestions", owner=dialog,
+                                  on_success=show_suggestions)
+        
+        def show_suggestions(suggestions):
+            if not suggestions:
+                messagebox.showinfo("Suggest Times", "No free slots found in the coming days")
+                return
+            
+            picker = ctk.CTkToplevel(dialog)
+            picker.title("Suggested Times")
+            picker.geometry("360x420")
+            picker.transient(dialog)
+            picker.grab_set()
+            picker.configure(fg_color=COLORS["background"])
+            
+            ModernLabel(picker, text="Available Times", 
+                       font=("Arial", 16, "bold"),
+                       text_color=COLORS["accent"]).pack(pady=10)
+            
+            def use_slot(slot):
+                entries["Veterinarian:"].set(slot['veterinarian'])
+                entries["Appointment Date:"].delete(0, "end")
+                entries["Appointment Date:"].insert(0, slot['date'])
+                entries["Appointment Time:"].set(slot['time'])
+                picker.destroy()
+            
+            for slot in suggestions:
+                ModernButton(picker, text=f"{slot['date']} {slot['time']} - {slot['veterinarian']}",
+                            command=lambda s=slot: use_slot(s)).pack(fill="x", padx=20, pady=3)
+        
+        suggest_btn = ModernButton(dialog, text="Suggest Times", 
+                                  command=suggest_times)
+        suggest_btn.pack(pady=(10, 0))
+        
         submit_btn = ModernButton(dialog, text="Create Appointment", 
                                  command=submit_appointment,
                                  fg_color=COLORS["success"], 
@@ -390,13 +431,15 @@ class AppointmentsModule:
         scrollbar.grid(row=0, column=1, sticky="ns")
         
         # Load upcoming appointments
-        upcoming = self.app.appointment_manager.get_upcoming_appointments(7)
-        
-        for apt in upcoming:
-            if len(apt) >= 9:  # Enhanced appointment
-                tree.insert("", "end", values=(
-                    apt[1], apt[2], apt[3], apt[4], apt[8], apt[9], apt[6], apt[5], apt[12]
-                ))
+        def show_upcoming(upcoming):
+            for apt in upcoming:
+                if len(apt) >= 9:  # Enhanced appointment
+                    tree.insert("", "end", values=(
+                        apt[1], apt[2], apt[3], apt[4], apt[8], apt[9], apt[6], apt[5], apt[12]
+                    ))
+        
+        self.app.tasks.submit(self.app.appointment_manager.get_upcoming_appointments, 7,
+                              key="appointments-upcoming", owner=tree, on_success=show_upcoming)
         
         # Add reminder button
         def send_reminder():
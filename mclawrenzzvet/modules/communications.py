@@ -3,6 +3,8 @@ from datetime import datetime, timedelta
 from tkinter import ttk, messagebox
 from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry
 from config import COLORS
+from database import schema_catalog
+from migrations import day_number
 
 class CommunicationsModule:
     def __init__(self, app):
@@ -83,9 +85,13 @@ class CommunicationsModule:
                    text_color=COLORS["accent"]).pack(pady=10)
         
         # Display communication statistics
-        stats = self.get_communication_stats()
+        stats_label = ModernLabel(display_frame, text="Loading statistics...",
+                                 font=("Arial", 12),
+                                 justify="left")
+        stats_label.pack(padx=20, pady=20)
         
-        stats_text = f"""
+        def show_stats(stats):
+            stats_text = f"""
         📊 Communication Statistics:
         
         • Total Communications Sent: {stats.get('total', 0)}
@@ -95,20 +101,17 @@ class CommunicationsModule:
         
         Last checked: {datetime.now().strftime('%Y-%m-%d %H:%M')}
         """
+            stats_label.configure(text=stats_text)
         
-        stats_label = ModernLabel(display_frame, text=stats_text,
-                                 font=("Arial", 12),
-                                 justify="left")
-        stats_label.pack(padx=20, pady=20)
+        self.app.tasks.submit(self.get_communication_stats, key="communication-stats",
+                              owner=stats_label, on_success=show_stats)
     
     def get_communication_stats(self):
         """Get communication statistics"""
         try:
             cur = self.app.db.cursor()
             
-            # Check if communication log table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='communication_log'")
-            if not cur.fetchone():
+            if not schema_catalog.has_table('communication_log', self.app.db):
                 return {'total': 0, 'reminders': 0, 'followups': 0, 'pending_followups': 0}
             
             # Get total communications
@@ -124,8 +127,7 @@ class CommunicationsModule:
             followups = cur.fetchone()[0]
             
             # Get pending follow-ups from appointments
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if cur.fetchone():
+            if schema_catalog.has_table('appointments_enhanced', self.app.db):
                 cur.execute("SELECT COUNT(*) FROM appointments_enhanced WHERE follow_up_needed = 1")
                 pending_followups = cur.fetchone()[0]
             else:
@@ -144,8 +146,11 @@ class CommunicationsModule:
     
     def view_communication_log(self):
         """View communication log"""
-        log = self.app.communication_manager.get_communication_log()
-        
+        self.app.tasks.submit(self.app.communication_manager.get_communication_log,
+                              key="communication-log", on_success=self.show_communication_log)
+    
+    def show_communication_log(self, log):
+        """Show the communication log in a dialog"""
         dialog = ctk.CTkToplevel(self.app.root)
         dialog.title("Communication Log")
         dialog.geometry("800x500")
@@ -190,100 +195,64 @@ class CommunicationsModule:
     
     def send_bulk_reminders(self):
         """Send bulk reminders for tomorrow's appointments"""
-        try:
-            cur = self.app.db.cursor()
-            
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if not cur.fetchone():
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        
+        def confirm(appointment_ids):
+            if appointment_ids is None:
                 messagebox.showinfo("Info", "Enhanced appointments not available")
-                return
-            
-            tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-            
-            cur.execute("""
-                SELECT COUNT(*) FROM appointments_enhanced 
-                WHERE appointment_date = ? 
-                AND status = 'SCHEDULED'
-                AND reminder_sent = 0
-            """, (tomorrow,))
-            
-            count = cur.fetchone()[0]
-            
-            if count == 0:
+            elif not appointment_ids:
                 messagebox.showinfo("Info", "No appointments need reminders for tomorrow")
-                return
-            
-            result = messagebox.askyesno("Confirm", 
-                                       f"Send reminders for {count} appointment(s) tomorrow?")
-            
-            if result:
-                sent_count = 0
-                cur.execute("""
-                    SELECT appointment_id FROM appointments_enhanced 
-                    WHERE appointment_date = ? 
-                    AND status = 'SCHEDULED'
-                    AND reminder_sent = 0
-                """, (tomorrow,))
-                
-                appointments = cur.fetchall()
-                
-                for apt in appointments:
-                    if self.app.communication_manager.send_appointment_reminder(apt[0]):
-                        sent_count += 1
-                
-                messagebox.showinfo("Success", f"Sent {sent_count} reminder(s)")
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to send reminders: {str(e)}")
+            elif messagebox.askyesno("Confirm", 
+                                     f"Send reminders for {len(appointment_ids)} appointment(s) tomorrow?"):
+                self.app.tasks.submit(self.send_each, self.app.communication_manager.send_appointment_reminder,
+                                      appointment_ids, key="bulk-reminders",
+                                      on_success=lambda sent_count: messagebox.showinfo(
+                                          "Success", f"Sent {sent_count} reminder(s)"),
+                                      on_error=lambda e: messagebox.showerror(
+                                          "Error", f"Failed to send reminders: {str(e)}"))
+        
+        self.app.tasks.submit(self.get_due_appointments, tomorrow, 'SCHEDULED', 'reminder_sent = 0',
+                              key=("due-appointments", tomorrow, 'SCHEDULED'), on_success=confirm,
+                              on_error=lambda e: messagebox.showerror("Error", f"Failed to send reminders: {str(e)}"))
     
     def send_bulk_followups(self):
         """Send bulk follow-ups for completed appointments"""
-        try:
-            cur = self.app.db.cursor()
-            
-            # Check if enhanced table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments_enhanced'")
-            if not cur.fetchone():
+        # Get appointments completed yesterday
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        message = "Thank you for visiting our clinic yesterday. How is your pet doing?"
+        
+        def confirm(appointment_ids):
+            if appointment_ids is None:
                 messagebox.showinfo("Info", "Enhanced appointments not available")
-                return
-            
-            # Get appointments completed yesterday
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            
-            cur.execute("""
-                SELECT COUNT(*) FROM appointments_enhanced 
-                WHERE appointment_date = ? 
-                AND status = 'COMPLETED'
-                AND follow_up_needed = 1
-            """, (yesterday,))
-            
-            count = cur.fetchone()[0]
-            
-            if count == 0:
+            elif not appointment_ids:
                 messagebox.showinfo("Info", "No completed appointments need follow-up from yesterday")
-                return
-            
-            result = messagebox.askyesno("Confirm", 
-                                       f"Send follow-ups for {count} completed appointment(s)?")
-            
-            if result:
-                sent_count = 0
-                cur.execute("""
-                    SELECT appointment_id FROM appointments_enhanced 
-                    WHERE appointment_date = ? 
-                    AND status = 'COMPLETED'
-                    AND follow_up_needed = 1
-                """, (yesterday,))
-                
-                appointments = cur.fetchall()
-                
-                for apt in appointments:
-                    message = "Thank you for visiting our clinic yesterday. How is your pet doing?"
-                    if self.app.communication_manager.send_follow_up(apt[0], message):
-                        sent_count += 1
-                
-                messagebox.showinfo("Success", f"Sent {sent_count} follow-up(s)")
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to send follow-ups: {str(e)}")
\ No newline at end of file
+            elif messagebox.askyesno("Confirm", 
+                                     f"Send follow-ups for {len(appointment_ids)} completed appointment(s)?"):
+                self.app.tasks.submit(self.send_each, self.app.communication_manager.send_follow_up,
+                                      appointment_ids, message, key="bulk-followups",
+                                      on_success=lambda sent_count: messagebox.showinfo(
+                                          "Success", f"Sent {sent_count} follow-up(s)"),
+                                      on_error=lambda e: messagebox.showerror(
+                                          "Error", f"Failed to send follow-ups: {str(e)}"))
+        
+        self.app.tasks.submit(self.get_due_appointments, yesterday, 'COMPLETED', 'follow_up_needed = 1',
+                              key=("due-appointments", yesterday, 'COMPLETED'), on_success=confirm,
+                              on_error=lambda e: messagebox.showerror("Error", f"Failed to send follow-ups: {str(e)}"))
+    
+    def get_due_appointments(self, appointment_date, status, condition):
+        """Get the IDs of appointments on a date that still need a message (None without the table)"""
+        if not schema_catalog.has_table('appointments_enhanced', self.app.db):
+            return None
+        cur = self.app.db.cursor()
+        cur.execute(f"""
+            SELECT appointment_id FROM appointments_enhanced 
+            WHERE appointment_day = ? 
+            AND status = ?
+            AND {condition}
+        """, (day_number(appointment_date), status))
+        return [row[0] for row in cur.fetchall()]
+    
+    @staticmethod
+    def send_each(send, appointment_ids, *args):
+        """Send one message per appointment and return how many were sent"""
+        return sum(1 for appointment_id in appointment_ids if send(appointment_id, *args))
@@ -1,7 +1,7 @@
 import customtkinter as ctk
 from datetime import datetime
 from tkinter import ttk, messagebox
-from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry, ColorfulCard
+from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry, ColorfulCard, VirtualTreeview
 from config import COLORS
 from models import Medicine
 
@@ -86,7 +86,7 @@ class InventoryModule:
         
         # Create treeview for inventory
         columns = ("ID", "Name", "Price", "Stock", "Category", "Brand", "Animal Type", "Expiration", "Status")
-        self.inventory_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        self.inventory_tree = VirtualTreeview(list_frame, columns=columns, height=15)
         
         # Style the treeview
         style = ttk.Style()
@@ -112,12 +112,7 @@ class InventoryModule:
             self.inventory_tree.heading(col, text=col)
             self.inventory_tree.column(col, width=column_widths.get(col, 100))
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.inventory_tree.yview)
-        self.inventory_tree.configure(yscrollcommand=scrollbar.set)
-        
         self.inventory_tree.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-        scrollbar.grid(row=0, column=1, sticky="ns")
         
         # Load inventory data
         self.load_inventory_data()
@@ -126,51 +121,45 @@ class InventoryModule:
         """Load inventory data into the treeview with status indicators"""
         if not self.inventory_tree:
             return
-            
-        # Clear existing data
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        
-        # Get inventory items
-        items = self.app.inventory_manager.get_all_items()
-        
-        # Get today's date for expiration check
-        today = datetime.now().date()
-        
-        # Populate treeview with status
-        for item in items:
-            # Determine status
-            status = ""
-            if item.stock <= 0:
-                status = "❌ Out"
+        
+        self.app.tasks.submit(self.get_inventory_rows, self.app.inventory_manager.get_all_items,
+                              key="inventory-all", group="inventory-list", owner=self.inventory_tree,
+                              on_success=self.show_inventory_rows)
+    
+    def get_inventory_rows(self, fetch_items, *args):
+        """Fetch items and format their treeview rows (runs on a worker thread)"""
+        items = fetch_items(*args)
+        return [(
+            item.id,
+            item.name,
+            f"₱{item.price:.2f}",
+            item.stock,
+            item.category,
+            item.brand,
+            item.animal_type,
+            item.expiration_date,
+            status
+        ) for item, status in zip(items, self.get_status_badges(items))]
+    
+    def show_inventory_rows(self, rows):
+        """Replace the treeview contents with formatted rows"""
+        self.inventory_tree.set_rows(rows)
+    
+    def get_status_badges(self, items):
+        """Get the status column text for a list of items"""
+        badges = []
+        for item, days_until_expiry in zip(items, self.app.inventory_manager.get_days_until_expiry(items)):
+            if days_until_expiry is not None and days_until_expiry < 0:
+                badges.append("⌛ Expired")
+            elif days_until_expiry is not None and days_until_expiry <= 30:
+                badges.append(f"⏰ {days_until_expiry}d")
+            elif item.stock <= 0:
+                badges.append("❌ Out")
             elif item.stock < 10:
-                status = "⚠️ Low"
+                badges.append("⚠️ Low")
             else:
-                status = "✅ OK"
-            
-            # Check expiration if date is available
-            if item.expiration_date:
-                try:
-                    exp_date = datetime.strptime(item.expiration_date, '%Y-%m-%d').date()
-                    days_until_expiry = (exp_date - today).days
-                    if days_until_expiry <= 30 and days_until_expiry >= 0:
-                        status = f"⏰ {days_until_expiry}d"
-                    elif days_until_expiry < 0:
-                        status = "⌛ Expired"
-                except:
-                    pass
-            
-            self.inventory_tree.insert("", "end", values=(
-                item.id,
-                item.name,
-                f"₱{item.price:.2f}",
-                item.stock,
-                item.category,
-                item.brand,
-                item.animal_type,
-                item.expiration_date,
-                status
-            ))
+                badges.append("✅ OK")
+        return badges
     
     def show_low_stock_items(self):
         """Show low stock items"""
@@ -203,21 +192,23 @@ class InventoryModule:
         scrollbar.grid(row=0, column=1, sticky="ns")
         
         # Load low stock items
-        low_stock_items = self.app.inventory_manager.get_low_stock_items(10)
-        
-        for item in low_stock_items:
-            tree.insert("", "end", values=(
-                item[0], item[1], item[4], item[3], f"₱{item[2]:.2f}", item[7]
-            ))
+        def show_items(low_stock_items):
+            for item in low_stock_items:
+                tree.insert("", "end", values=(
+                    item[0], item[1], item[4], item[3], f"₱{item[2]:.2f}", item[7]
+                ))
+        
+        self.app.tasks.submit(self.app.inventory_manager.get_low_stock_items, 10,
+                              key="inventory-low-stock", owner=tree, on_success=show_items)
     
     def show_expiring_items(self):
         """Show expiring items"""
         dialog = ctk.CTkToplevel(self.app.root)
-        dialog.title("Items Expiring Soon")
+        dialog.title("Expired and Expiring Items")
         dialog.geometry("800x400")
         dialog.configure(fg_color=COLORS["background"])
         
-        ModernLabel(dialog, text="📅 Items Expiring Within 30 Days", 
+        ModernLabel(dialog, text="📅 Items Expired or Expiring Within 30 Days", 
                    font=("Arial", 20, "bold"),
                    text_color=COLORS["accent"]).pack(pady=20)
         
@@ -240,14 +231,19 @@ class InventoryModule:
         tree.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
         scrollbar.grid(row=0, column=1, sticky="ns")
         
-        # Load expiring items
-        expiring_items = self.app.inventory_manager.get_expiring_items(30)
+        # Load expired items first, then the ones expiring soon
+        def load_items():
+            return (self.app.inventory_manager.get_expired_items() +
+                    self.app.inventory_manager.get_expiring_items(30))
+        
+        def show_items(expiring_items):
+            for item in expiring_items:
+                days_left = int(item[10]) if len(item) > 10 else 0
+                tree.insert("", "end", values=(
+                    item[0], item[1], item[9], days_left, item[3], item[4], f"₱{item[2]:.2f}"
+                ))
         
-        for item in expiring_items:
-            days_left = int(item[10]) if len(item) > 10 else 0
-            tree.insert("", "end", values=(
-                item[0], item[1], item[9], days_left, item[3], item[4], f"₱{item[2]:.2f}"
-            ))
+        self.app.tasks.submit(load_items, key="inventory-expiring", owner=tree, on_success=show_items)
     
     def search_inventory(self):
         """Search inventory items"""
@@ -259,50 +255,10 @@ class InventoryModule:
             self.load_inventory_data()
             return
         
-        # Clear existing data
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        
-        # Search items
-        items = self.app.inventory_manager.search_items(search_term)
-        
-        # Get today's date for expiration check
-        today = datetime.now().date()
-        
-        # Populate treeview with search results
-        for item in items:
-            # Determine status
-            status = ""
-            if item.stock <= 0:
-                status = "❌ Out"
-            elif item.stock < 10:
-                status = "⚠️ Low"
-            else:
-                status = "✅ OK"
-            
-            # Check expiration if date is available
-            if item.expiration_date:
-                try:
-                    exp_date = datetime.strptime(item.expiration_date, '%Y-%m-%d').date()
-                    days_until_expiry = (exp_date - today).days
-                    if days_until_expiry <= 30 and days_until_expiry >= 0:
-                        status = f"⏰ {days_until_expiry}d"
-                    elif days_until_expiry < 0:
-                        status = "⌛ Expired"
-                except:
-                    pass
-            
-            self.inventory_tree.insert("", "end", values=(
-                item.id,
-                item.name,
-                f"₱{item.price:.2f}",
-                item.stock,
-                item.category,
-                item.brand,
-                item.animal_type,
-                item.expiration_date,
-                status
-            ))
+        # Search items; a newer search replaces one still running
+        self.app.tasks.submit(self.get_inventory_rows, self.app.inventory_manager.search_items, search_term,
+                              key=("inventory-search", search_term), group="inventory-list",
+                              owner=self.inventory_tree, on_success=self.show_inventory_rows)
     
     def add_inventory_item(self):
         """Add new inventory item"""
@@ -324,12 +280,7 @@ class InventoryModule:
         item_id = values[0]
         
         # Get the full item details
-        items = self.app.inventory_manager.get_all_items()
-        selected_item = None
-        for item_obj in items:
-            if item_obj.id == item_id:
-                selected_item = item_obj
-                break
+        selected_item = self.app.inventory_manager.get_item(item_id)
         
         if selected_item:
             self.show_inventory_item_dialog(selected_item)
@@ -1,10 +1,11 @@
 import customtkinter as ctk
 from datetime import datetime
 from tkinter import ttk, messagebox, filedialog
-from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry
+from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry, VirtualTreeview
 from config import COLORS
 from utils.helpers import generate_transaction_id
 from utils.receipt_manager import ReceiptManager
+from managers import InsufficientStockError
 
 class PointOfSaleModule:
     def __init__(self, app):
@@ -49,7 +50,7 @@ class PointOfSaleModule:
         
         # Products treeview
         products_columns = ("ID", "Name", "Price", "Stock", "Category")
-        self.products_tree = ttk.Treeview(products_frame, columns=products_columns, show="headings", height=15)
+        self.products_tree = VirtualTreeview(products_frame, columns=products_columns, height=15)
         
         for col in products_columns:
             self.products_tree.heading(col, text=col)
@@ -62,11 +63,7 @@ class PointOfSaleModule:
                        foreground=COLORS["text_light"],
                        fieldbackground=COLORS["card"])
         
-        products_scrollbar = ttk.Scrollbar(products_frame, orient="vertical", command=self.products_tree.yview)
-        self.products_tree.configure(yscrollcommand=products_scrollbar.set)
-        
         self.products_tree.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
-        products_scrollbar.grid(row=1, column=1, sticky="ns")
         
         # Add to cart button
         add_to_cart_btn = ModernButton(products_frame, text="➕ Add to Cart", 
@@ -152,24 +149,14 @@ class PointOfSaleModule:
         """Load products for POS interface"""
         if not self.products_tree:
             return
-            
-        # Clear existing data
-        for item in self.products_tree.get_children():
-            self.products_tree.delete(item)
-        
-        # Get inventory items
-        items = self.app.inventory_manager.get_all_items()
-        
-        # Populate products treeview
-        for item in items:
-            if item.stock > 0:  # Only show items with stock
-                self.products_tree.insert("", "end", values=(
-                    item.id,
-                    item.name,
-                    f"₱{item.price:.2f}",
-                    item.stock,
-                    item.category
-                ))
+        
+        def load_products():
+            # Only show items with stock
+            return [(item.id, item.name, f"₱{item.price:.2f}", item.stock, item.category)
+                    for item in self.app.inventory_manager.get_all_items() if item.stock > 0]
+        
+        self.app.tasks.submit(load_products, key="pos-products", owner=self.products_tree,
+                              on_success=self.products_tree.set_rows)
     
     def add_to_cart(self):
         """Add selected product to cart"""
@@ -260,24 +247,21 @@ class PointOfSaleModule:
         
         payment_method = self.payment_method_combo.get()
         
-        # Check stock availability
-        for cart_item in self.app.cart.items:
-            # Get current stock from database
-            items = self.app.inventory_manager.get_all_items()
-            for item in items:
-                if item.id == cart_item.item_id:
-                    if item.stock < cart_item.quantity:
-                        messagebox.showerror("Error", 
-                                           f"Not enough stock for {item.name}. Available: {item.stock}")
-                        return
-                    break
-        
-        # Process sale
-        transaction_id = generate_transaction_id()
+        # Process sale; stock is checked and taken in the same transaction
         cart_items_dict = self.app.cart.to_legacy_format()
+        transaction_id = generate_transaction_id()
+        
+        try:
+            recorded = self.app.sales_manager.record_sale(transaction_id, cart_items_dict, 
+                                                          self.app.cart.total, payment_method, customer_name)
+        except InsufficientStockError as e:
+            details = "\n".join(f"{s['name']}: requested {s['requested']}, available {s['available']}"
+                                for s in e.shortfalls)
+            messagebox.showerror("Error", f"Not enough stock:\n{details}")
+            self.load_products_for_pos()
+            return
         
-        if self.app.sales_manager.record_sale(transaction_id, cart_items_dict, 
-                                            self.app.cart.total, payment_method, customer_name):
+        if recorded:
             # Generate receipt
             receipt_text = ReceiptManager.generate_receipt_text(
                 transaction_id, 
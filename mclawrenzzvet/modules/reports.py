@@ -1,9 +1,12 @@
 import customtkinter as ctk
 from datetime import datetime, timedelta
 from tkinter import ttk, messagebox, filedialog
-import csv
+import os
 from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry, ColorfulCard
 from config import COLORS
+from analytics_engine import analytics_engine, moving_average
+from caches import query_cache
+from utils.exporters import StreamingExporter, ExportCancelled, COLUMNAR_EXPORTS, HAS_PYARROW
 
 class ReportsModule:
     def __init__(self, app):
@@ -101,33 +104,47 @@ class ReportsModule:
         if not self.report_display_frame:
             return
             
+        def load_report():
+            # Get enhanced report data
+            total_sales = self.calculate_total_sales()
+            total_appointments = len(self.app.appointment_manager.get_all_appointments())
+            
+            # Get inventory valuation
+            inv_valuation = self.app.inventory_manager.get_inventory_valuation()
+            total_inventory_value = inv_valuation[0] if inv_valuation else 0
+            low_stock_items = inv_valuation[2] if inv_valuation else 0
+            expiring_soon = inv_valuation[3] if inv_valuation else 0
+            
+            # Get popular services
+            popular_services = self.app.analytics_manager.get_popular_services(limit=1)
+            top_service = popular_services[0][0] if popular_services else "N/A"
+            
+            return [
+                ("💰 Total Revenue", f"₱{total_sales:,.2f}", COLORS["success"]),
+                ("📅 Total Appointments", f"{total_appointments}", COLORS["primary"]),
+                ("📦 Inventory Value", f"₱{total_inventory_value:,.2f}", COLORS["secondary"]),
+                ("⚠️ Low Stock Items", f"{low_stock_items}", COLORS["warning"]),
+                ("⏰ Expiring Soon", f"{expiring_soon}", COLORS["danger"]),
+                ("🏥 Top Service", top_service, COLORS["accent"])
+            ]
+        
+        self.run_report(load_report, "report-cards", self.show_report_cards)
+    
+    def run_report(self, load, key, show):
+        """Compute a report on a worker thread and show it when ready.
+
+        Reports share one group, so picking another report while one is
+        still loading replaces it.
+        """
+        self.app.tasks.submit(load, key=key, group="report", owner=self.report_display_frame,
+                              on_success=show)
+    
+    def show_report_cards(self, report_cards):
+        """Show the summary report cards"""
         # Clear display
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
         
-        # Get enhanced report data
-        total_sales = self.calculate_total_sales()
-        total_appointments = len(self.app.appointment_manager.get_all_appointments())
-        
-        # Get inventory valuation
-        inv_valuation = self.app.inventory_manager.get_inventory_valuation()
-        total_inventory_value = inv_valuation[0] if inv_valuation else 0
-        low_stock_items = inv_valuation[2] if inv_valuation else 0
-        expiring_soon = inv_valuation[3] if inv_valuation else 0
-        
-        # Get popular services
-        popular_services = self.app.analytics_manager.get_popular_services(limit=1)
-        top_service = popular_services[0][0] if popular_services else "N/A"
-        
-        report_cards = [
-            ("💰 Total Revenue", f"₱{total_sales:,.2f}", COLORS["success"]),
-            ("📅 Total Appointments", f"{total_appointments}", COLORS["primary"]),
-            ("📦 Inventory Value", f"₱{total_inventory_value:,.2f}", COLORS["secondary"]),
-            ("⚠️ Low Stock Items", f"{low_stock_items}", COLORS["warning"]),
-            ("⏰ Expiring Soon", f"{expiring_soon}", COLORS["danger"]),
-            ("🏥 Top Service", top_service, COLORS["accent"])
-        ]
-        
         for i, (title, value, color) in enumerate(report_cards):
             row = i // 3
             col = i % 3
@@ -142,14 +159,29 @@ class ReportsModule:
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
         
-        revenue_data = self.app.analytics_manager.get_revenue_trends('monthly', start_date, end_date)
+        def load_report():
+            if analytics_engine.available:
+                revenue_data = analytics_engine.revenue_trends(self.app.db, 'monthly', start_date, end_date)
+                trend = moving_average([row[1] or 0 for row in revenue_data], window=3)
+                percentiles = analytics_engine.transaction_percentiles(self.app.db, start_date, end_date)
+            else:
+                revenue_data = self.app.analytics_manager.get_revenue_trends('monthly', start_date, end_date)
+                trend = []
+                percentiles = {}
+            return revenue_data, trend, percentiles
+        
+        self.run_report(load_report, ("revenue-trends", start_date, end_date), self.show_revenue_trends)
+    
+    def show_revenue_trends(self, report):
+        """Display revenue trends"""
+        revenue_data, trend, percentiles = report
         
         # Clear display
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
         
         # Create revenue trends treeview
-        columns = ("Period", "Revenue", "Transactions", "Avg Transaction")
+        columns = ("Period", "Revenue", "Transactions", "Avg Transaction", "3-Month Avg")
         tree = ttk.Treeview(self.report_display_frame, columns=columns, show="headings", height=15)
         
         for col in columns:
@@ -166,12 +198,13 @@ class ReportsModule:
         total_revenue = 0
         total_transactions = 0
         
-        for row in revenue_data:
+        for i, row in enumerate(revenue_data):
             tree.insert("", "end", values=(
                 row[0],
                 f"₱{row[1]:,.2f}",
                 row[2],
-                f"₱{row[3]:,.2f}"
+                f"₱{row[3]:,.2f}",
+                f"₱{trend[i]:,.2f}" if i < len(trend) else ""
             ))
             total_revenue += row[1] if row[1] else 0
             total_transactions += row[2] if row[2] else 0
@@ -182,8 +215,14 @@ class ReportsModule:
             "TOTAL",
             f"₱{total_revenue:,.2f}",
             total_transactions,
-            f"₱{avg_transaction:,.2f}"
+            f"₱{avg_transaction:,.2f}",
+            ""
         ))
+        
+        if percentiles:
+            ModernLabel(self.report_display_frame,
+                       text=f"Transaction value — median ₱{percentiles[50]:,.2f}, "
+                            f"90th percentile ₱{percentiles[90]:,.2f}").grid(row=1, column=0, sticky="w", padx=10)
     
     def generate_popular_services(self):
         """Generate and display popular services report"""
@@ -193,8 +232,15 @@ class ReportsModule:
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
         
-        services = self.app.analytics_manager.get_popular_services(10, start_date, end_date)
+        def load_report():
+            if analytics_engine.available:
+                return analytics_engine.popular_services(self.app.db, 10, start_date, end_date)
+            return self.app.analytics_manager.get_popular_services(10, start_date, end_date)
         
+        self.run_report(load_report, ("popular-services", start_date, end_date), self.show_popular_services)
+    
+    def show_popular_services(self, services):
+        """Display the popular services report"""
         # Clear display
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
@@ -238,8 +284,15 @@ class ReportsModule:
         if not self.report_display_frame:
             return
             
-        demographics = self.app.analytics_manager.get_customer_demographics()
+        def load_report():
+            if analytics_engine.available:
+                return analytics_engine.customer_demographics(self.app.db)
+            return self.app.analytics_manager.get_customer_demographics()
         
+        self.run_report(load_report, "demographics", self.show_demographics)
+    
+    def show_demographics(self, demographics):
+        """Display the demographics report"""
         # Clear display
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
@@ -303,8 +356,15 @@ class ReportsModule:
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
         
-        performance = self.app.analytics_manager.get_veterinarian_performance(start_date, end_date)
+        def load_report():
+            if analytics_engine.available:
+                return analytics_engine.veterinarian_performance(self.app.db, start_date, end_date)
+            return self.app.analytics_manager.get_veterinarian_performance(start_date, end_date)
         
+        self.run_report(load_report, ("performance", start_date, end_date), self.show_performance)
+    
+    def show_performance(self, performance):
+        """Display the veterinarian performance report"""
         # Clear display
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
@@ -359,13 +419,17 @@ class ReportsModule:
     
     def calculate_total_sales(self):
         """Calculate total sales amount"""
-        try:
-            cur = self.app.db.cursor()
-            cur.execute("SELECT SUM(total_amount) FROM sales")
-            result = cur.fetchone()
-            return result[0] or 0.0
-        except Exception:
-            return 0.0
+        def total_sales():
+            try:
+                cur = self.app.db.cursor()
+                # The rollup counts each transaction total once, unlike summing sale lines
+                cur.execute("SELECT SUM(revenue) FROM sales_daily_rollup")
+                result = cur.fetchone()
+                return result[0] or 0.0
+            except Exception:
+                return 0.0
+        
+        return query_cache.get_or_compute(('calculate_total_sales',), ('sales',), total_sales)
     
     def export_data(self):
         """Export data to CSV"""
@@ -374,13 +438,16 @@ class ReportsModule:
             ("Inventory Data", "inventory"),
             ("Appointments Data", "appointments"),
             ("Enhanced Appointments", "appointments_enhanced"),
+            ("Appointment Services", "appointment_services"),
             ("Communication Log", "communication_log")
         ]
+        formats = ["CSV", "Parquet", "Feather"] if HAS_PYARROW else ["CSV"]
+        partitions = {"None": None, "By Month": "month", "By Year": "year"}
         
         # Create dialog for export type selection
         export_dialog = ctk.CTkToplevel(self.app.root)
         export_dialog.title("Export Data")
-        export_dialog.geometry("300x300")
+        export_dialog.geometry("320x480")
         export_dialog.transient(self.app.root)
         export_dialog.grab_set()
         export_dialog.configure(fg_color=COLORS["background"])
@@ -395,69 +462,87 @@ class ReportsModule:
             radio = ctk.CTkRadioButton(export_dialog, text=text, variable=export_var, value=value)
             radio.pack(pady=5)
         
+        format_var = ctk.StringVar(value="CSV")
+        partition_var = ctk.StringVar(value="None")
+        if len(formats) > 1:
+            ModernLabel(export_dialog, text="Format").pack(pady=(15, 5))
+            ctk.CTkSegmentedButton(export_dialog, values=formats, variable=format_var).pack(pady=5)
+            ModernLabel(export_dialog, text="Partition Parquet/Feather files").pack(pady=(10, 5))
+            ctk.CTkOptionMenu(export_dialog, values=list(partitions), variable=partition_var).pack(pady=5)
+        
         def perform_export():
             export_type = export_var.get()
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv")],
-                initialfile=f"vetclinic_{export_type}_{datetime.now().strftime('%Y%m%d')}.csv"
-            )
+            export_format = format_var.get().lower()
+            partition_by = partitions[partition_var.get()]
+            basename = f"vetclinic_{export_type}_{datetime.now().strftime('%Y%m%d')}"
             
-            if filename:
-                if self.export_to_csv(export_type, filename):
-                    messagebox.showinfo("Success", f"Data exported to {filename}")
-                    export_dialog.destroy()
+            if export_format == "csv":
+                filename = filedialog.asksaveasfilename(
+                    defaultextension=".csv",
+                    filetypes=[("CSV files", "*.csv")],
+                    initialfile=f"{basename}.csv"
+                )
+                options = {}
+            else:
+                if export_type not in COLUMNAR_EXPORTS:
+                    messagebox.showerror("Error", f"{format_var.get()} export is not available for this data")
+                    return
+                if partition_by:
+                    # Partitioned exports are a directory of files, one per period
+                    directory = filedialog.askdirectory(title="Export to folder")
+                    filename = os.path.join(directory, basename) if directory else ""
+                    if filename and os.path.exists(filename):
+                        messagebox.showerror("Error", f"{filename} already exists")
+                        return
                 else:
-                    messagebox.showerror("Error", "Failed to export data")
+                    filename = filedialog.asksaveasfilename(
+                        defaultextension=f".{export_format}",
+                        filetypes=[(f"{format_var.get()} files", f"*.{export_format}")],
+                        initialfile=f"{basename}.{export_format}"
+                    )
+                options = {"partition_by": partition_by}
+            
+            if filename:
+                self.export_to_file(export_type, filename, export_dialog, export_format, **options)
         
         export_btn = ModernButton(export_dialog, text="Export", command=perform_export)
         export_btn.pack(pady=20)
     
-    def export_to_csv(self, data_type, filename):
-        """Export data to CSV file"""
-        try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                if data_type == "sales":
-                    # Export sales data
-                    sales = self.app.sales_manager.get_sales_report()
-                    writer.writerow(["Transaction ID", "Item ID", "Item Name", "Quantity", "Price", "Subtotal", "Total Amount", "Payment Method", "Customer Name", "Sale Date"])
-                    for sale in sales:
-                        writer.writerow(sale[1:11])  # Skip ID column
-                
-                elif data_type == "inventory":
-                    # Export inventory data
-                    items = self.app.inventory_manager.get_all_items()
-                    writer.writerow(["ID", "Name", "Price", "Stock", "Category", "Image", "Brand", "Animal Type", "Dosage", "Expiration Date"])
-                    for item in items:
-                        writer.writerow([
-                            item.id, item.name, item.price, item.stock, item.category,
-                            "", item.brand, item.animal_type, item.dosage, item.expiration_date
-                        ])
-                
-                elif data_type == "appointments":
-                    # Export appointments data
-                    appointments = self.app.appointment_manager.get_all_appointments()
-                    writer.writerow(["Appointment ID", "Patient Name", "Owner Name", "Animal Type", "Date", "Notes", "Status", "Total Amount"])
-                    for apt in appointments:
-                        writer.writerow(apt[:8])  # Use first 8 columns
-                
-                elif data_type == "appointments_enhanced":
-                    # Export enhanced appointments
-                    appointments = self.app.appointment_manager.get_all_enhanced_appointments()
-                    writer.writerow(["Appointment ID", "Patient Name", "Owner Name", "Animal Type", "Service", "Veterinarian", "Duration", "Appointment Date", "Appointment Time", "Date Created", "Notes", "Status", "Total Amount", "Reminder Sent", "Follow-up Needed"])
-                    for apt in appointments:
-                        writer.writerow(apt[1:16])  # Skip ID column
-                
-                elif data_type == "communication_log":
-                    # Export communication log
-                    log = self.app.communication_manager.get_communication_log()
-                    writer.writerow(["Appointment ID", "Type", "To", "Message", "Date", "Status"])
-                    for entry in log:
-                        writer.writerow(entry[1:7])  # Skip ID column
-        
-            return True
-        except Exception as e:
-            print(f"Export error: {e}")
-            return False
\ No newline at end of file
+    def export_to_file(self, data_type, filename, export_dialog, export_format="csv", **options):
+        """Export data on a worker thread, showing progress in the dialog"""
+        for widget in export_dialog.winfo_children():
+            widget.destroy()
+        
+        ModernLabel(export_dialog, text="Exporting...", 
+                   font=("Arial", 16, "bold"),
+                   text_color=COLORS["accent"]).pack(pady=20)
+        
+        progress_bar = ctk.CTkProgressBar(export_dialog, width=240)
+        progress_bar.set(0)
+        progress_bar.pack(pady=10)
+        
+        progress_label = ModernLabel(export_dialog, text="Starting...")
+        progress_label.pack(pady=5)
+        
+        job = StreamingExporter(self.app.db_pool).start(data_type, filename, export_format, **options)
+        
+        cancel_btn = ModernButton(export_dialog, text="Cancel", command=job.cancel)
+        cancel_btn.pack(pady=20)
+        export_dialog.protocol("WM_DELETE_WINDOW", job.cancel)
+        
+        def poll():
+            if not job.finished:
+                progress_bar.set(job.progress)
+                progress_label.configure(text=f"{job.rows_written:,} of {job.total_rows:,} rows")
+                export_dialog.after(100, poll)
+                return
+            export_dialog.destroy()
+            if job.error is None:
+                messagebox.showinfo("Success", f"Exported {job.rows_written:,} rows to {filename}")
+            elif isinstance(job.error, ExportCancelled):
+                messagebox.showinfo("Export Cancelled", "The export was cancelled")
+            else:
+                print(f"Export error: {job.error}")
+                messagebox.showerror("Error", "Failed to export data")
+        
+        poll()
\ No newline at end of file
@@ -1,17 +1,22 @@
 import customtkinter as ctk
 import tkinter.messagebox as messagebox
 import sqlite3
-import shutil
+import os
 from tkinter import ttk, filedialog
 from datetime import datetime
 from ui_components import ModernFrame, ModernLabel, ModernButton, ModernEntry
-from config import COLORS, THEME_MODE, DB_FILE
+from config import COLORS, THEME_MODE, DB_FILE, DB_PERFORMANCE_PROFILES, BACKUP_DIR
+from database import get_connection_pragmas, schema_catalog
+from caches import inventory_catalog, query_cache
+from analytics_engine import analytics_engine
 from utils.helpers import apply_theme
+from utils.backup_manager import BackupManager, BackupCancelled, HAS_ZSTD
 
 class SettingsModule:
     def __init__(self, app):
         self.app = app
         self.users_tree = None
+        self.backup_manager = BackupManager()
     
     def show_settings(self):
         """Show settings screen with complete functionality"""
@@ -393,13 +398,26 @@ class SettingsModule:
                                   fg_color=COLORS["warning"])
         restore_btn.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
         
+        snapshot_btn = ModernButton(db_actions_frame, text="🧩 Snapshot Backup", 
+                                   command=self.snapshot_database)
+        snapshot_btn.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+        
+        restore_snapshot_btn = ModernButton(db_actions_frame, text="🕘 Restore Snapshot", 
+                                           command=self.restore_snapshot,
+                                           fg_color=COLORS["warning"])
+        restore_snapshot_btn.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
+        
+        rollup_btn = ModernButton(db_actions_frame, text="📊 Rebuild Report Totals", 
+                                 command=self.rebuild_report_rollups)
+        rollup_btn.grid(row=2, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+        
         # Database info
         info_frame = ModernFrame(parent)
         info_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
         info_frame.grid_columnconfigure(1, weight=1)
         
         # Get database info
-        try:
+        def load_table_counts():
             cur = self.app.db.cursor()
             
             # Table counts
@@ -412,7 +430,9 @@ class SettingsModule:
                     table_counts[table] = cur.fetchone()[0]
                 except:
                     table_counts[table] = 0
-            
+            return table_counts
+        
+        def show_table_counts(table_counts):
             ModernLabel(info_frame, text="Database File:").grid(row=0, column=0, sticky="w", padx=10, pady=5)
             ModernLabel(info_frame, text=DB_FILE).grid(row=0, column=1, sticky="w", padx=10, pady=5)
             
@@ -433,42 +453,159 @@ class SettingsModule:
             
             ModernLabel(info_frame, text="Communications:").grid(row=6, column=0, sticky="w", padx=10, pady=5)
             ModernLabel(info_frame, text=str(table_counts.get("communication_log", 0))).grid(row=6, column=1, sticky="w", padx=10, pady=5)
-            
-        except Exception as e:
+        
+        def show_error(e):
             ModernLabel(info_frame, text=f"Error loading database info: {str(e)}").grid(row=0, column=0, columnspan=2, padx=10, pady=5)
+        
+        self.app.tasks.submit(load_table_counts, key="database-info", owner=info_frame,
+                              on_success=show_table_counts, on_error=show_error)
+        
+        self.create_performance_profile_section(parent)
+    
+    def create_performance_profile_section(self, parent):
+        """Create the SQLite performance profile selector"""
+        import config
+        
+        perf_frame = ModernFrame(parent)
+        perf_frame.grid(row=3, column=0, sticky="ew", padx=10, pady=10)
+        perf_frame.grid_columnconfigure(1, weight=1)
+        
+        ModernLabel(perf_frame, text="Performance Profile:").grid(row=0, column=0, sticky="w", padx=10, pady=5)
+        
+        profile_var = ctk.StringVar(value=config.DB_PERFORMANCE_PROFILE)
+        profile_combo = ctk.CTkComboBox(perf_frame, 
+                                       values=list(DB_PERFORMANCE_PROFILES.keys()),
+                                       variable=profile_var)
+        profile_combo.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
+        
+        # Effective PRAGMA values of the current connection
+        pragma_labels = {}
+        for i, pragma in enumerate(get_connection_pragmas(self.app.db), 1):
+            ModernLabel(perf_frame, text=f"{pragma}:").grid(row=i, column=0, sticky="w", padx=10, pady=2)
+            pragma_labels[pragma] = ModernLabel(perf_frame, text="")
+            pragma_labels[pragma].grid(row=i, column=1, sticky="w", padx=10, pady=2)
+        
+        def refresh_pragmas():
+            for pragma, value in get_connection_pragmas(self.app.db).items():
+                pragma_labels[pragma].configure(text=str(value))
+        
+        def apply_profile():
+            config.DB_PERFORMANCE_PROFILE = profile_var.get()
+            # Pooled connections are reopened with the new profile on next use
+            self.app.db_pool.reset()
+            refresh_pragmas()
+            messagebox.showinfo("Success", f"Performance profile '{config.DB_PERFORMANCE_PROFILE}' applied!")
+        
+        apply_btn = ModernButton(perf_frame, text="Apply Profile", command=apply_profile)
+        apply_btn.grid(row=len(pragma_labels) + 1, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+        
+        stats = query_cache.stats()
+        ModernLabel(perf_frame, text="Report cache:").grid(row=len(pragma_labels) + 2, column=0, sticky="w", padx=10, pady=2)
+        ModernLabel(perf_frame, text=f"{stats['hits']} hits, {stats['misses']} misses "
+                                     f"({stats['hit_rate']}%), {stats['entries']} entries").grid(
+            row=len(pragma_labels) + 2, column=1, sticky="w", padx=10, pady=2)
+        
+        refresh_pragmas()
     
     def backup_database(self):
-        """Backup database to file"""
+        """Back up the database in the background while the clinic keeps working"""
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        file_types = [("Compressed backup (gzip)", "*.db.gz"), ("Database files", "*.db")]
+        if HAS_ZSTD:
+            file_types.insert(1, ("Compressed backup (zstd)", "*.db.zst"))
+        default_name = os.path.basename(self.backup_manager.default_filename(self.backup_manager.compression))
         filename = filedialog.asksaveasfilename(
-            defaultextension=".db",
-            filetypes=[("Database files", "*.db"), ("All files", "*.*")],
-            initialfile=f"vetclinic_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+            defaultextension=default_name[default_name.index(".db"):],
+            filetypes=file_types + [("All files", "*.*")],
+            initialdir=os.path.abspath(BACKUP_DIR),
+            initialfile=default_name
         )
         
         if filename:
-            try:
-                # Close current connection
-                self.app.db.close()
-                
-                # Copy database file
-                shutil.copy2(DB_FILE, filename)
-                
-                # Reopen connection
-                self.app.db = sqlite3.connect(DB_FILE)
-                
-                messagebox.showinfo("Success", f"Database backed up to {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Backup failed: {str(e)}")
-                # Reopen connection on error
-                try:
-                    self.app.db = sqlite3.connect(DB_FILE)
-                except:
-                    pass
+            job = self.backup_manager.start_backup(filename)
+            
+            def on_done():
+                if job.error is None:
+                    messagebox.showinfo("Success", f"Database backed up to {job.result}")
+                elif isinstance(job.error, BackupCancelled):
+                    messagebox.showinfo("Backup Cancelled", "The backup was cancelled")
+                else:
+                    messagebox.showerror("Error", f"Backup failed: {str(job.error)}")
+            
+            self.show_job_progress("Backing Up Database", job, on_done)
+    
+    def snapshot_database(self):
+        """Take a differential backup that only stores what changed since the last snapshot"""
+        job = self.backup_manager.start_differential_backup()
+        
+        def on_done():
+            if job.error is None:
+                manifest = job.result
+                messagebox.showinfo("Success", 
+                                  f"Snapshot {manifest['id']} saved.\n"
+                                  f"{manifest['new_chunks']} of {len(manifest['chunks'])} chunks changed "
+                                  f"({manifest['new_bytes'] / 1048576:.1f} MB stored).")
+            elif isinstance(job.error, BackupCancelled):
+                messagebox.showinfo("Backup Cancelled", "The snapshot was cancelled")
+            else:
+                messagebox.showerror("Error", f"Snapshot failed: {str(job.error)}")
+        
+        self.show_job_progress("Taking Snapshot", job, on_done)
+    
+    def show_job_progress(self, title, job, on_done):
+        """Show a progress dialog for a background job and call on_done when it finishes"""
+        dialog = ctk.CTkToplevel(self.app.root)
+        dialog.title(title)
+        dialog.geometry("320x180")
+        dialog.transient(self.app.root)
+        dialog.configure(fg_color=COLORS["background"])
+        
+        ModernLabel(dialog, text=f"{title}...", 
+                   font=("Arial", 14, "bold"),
+                   text_color=COLORS["accent"]).pack(pady=15)
+        
+        progress_bar = ctk.CTkProgressBar(dialog, width=260)
+        progress_bar.set(0)
+        progress_bar.pack(pady=10)
+        
+        cancel_btn = ModernButton(dialog, text="Cancel", command=job.cancel)
+        cancel_btn.pack(pady=15)
+        dialog.protocol("WM_DELETE_WINDOW", job.cancel)
+        
+        def poll():
+            if not job.finished:
+                progress_bar.set(job.progress)
+                dialog.after(100, poll)
+                return
+            dialog.destroy()
+            on_done()
+        
+        poll()
+    
+    def rebuild_report_rollups(self):
+        """Recompute the report rollup tables from the raw records"""
+        analytics = self.app.analytics_manager
+        
+        def rebuild():
+            return analytics.rebuild_sales_rollup() and analytics.rebuild_appointment_rollups()
+        
+        def show_result(rebuilt):
+            if rebuilt:
+                messagebox.showinfo("Success", "Report totals rebuilt successfully!")
+            else:
+                messagebox.showerror("Error", "Failed to rebuild report totals")
+        
+        def show_error(e):
+            messagebox.showerror("Error", f"Failed to rebuild report totals: {str(e)}")
+        
+        self.app.tasks.submit(rebuild, key="report-rollups", owner=self.app.root,
+                              on_success=show_result, on_error=show_error)
     
     def restore_database(self):
-        """Restore database from backup"""
+        """Restore database from a backup file"""
         filename = filedialog.askopenfilename(
-            filetypes=[("Database files", "*.db"), ("All files", "*.*")]
+            initialdir=os.path.abspath(BACKUP_DIR),
+            filetypes=[("Backups", "*.db *.db.gz *.db.zst"), ("Database files", "*.db"), ("All files", "*.*")]
         )
         
         if filename:
@@ -476,28 +613,83 @@ class SettingsModule:
                                        "This will replace the current database. Continue?")
             
             if result:
-                try:
-                    # Close current connection
-                    self.app.db.close()
-                    
-                    # Replace database file
-                    shutil.copy2(filename, DB_FILE)
-                    
-                    # Reopen connection
-                    from database import get_db
-                    self.app.db = get_db()
-                    
-                    messagebox.showinfo("Success", "Database restored successfully!")
-                    messagebox.showinfo("Info", "Please restart the application for changes to take effect.")
-                    
-                except Exception as e:
-                    messagebox.showerror("Error", f"Restore failed: {str(e)}")
-                    # Try to reopen connection
-                    try:
-                        from database import get_db
-                        self.app.db = get_db()
-                    except:
-                        pass
+                self.run_restore(self.backup_manager.start_restore(filename))
+    
+    def restore_snapshot(self):
+        """Restore database from a differential snapshot"""
+        snapshots = self.backup_manager.snapshots.list_snapshots()
+        if not snapshots:
+            messagebox.showinfo("Restore Snapshot", "No snapshots have been taken yet")
+            return
+        
+        dialog = ctk.CTkToplevel(self.app.root)
+        dialog.title("Restore Snapshot")
+        dialog.geometry("500x400")
+        dialog.transient(self.app.root)
+        dialog.grab_set()
+        dialog.configure(fg_color=COLORS["background"])
+        
+        ModernLabel(dialog, text="Select Snapshot to Restore", 
+                   font=("Arial", 16, "bold"),
+                   text_color=COLORS["accent"]).pack(pady=15)
+        
+        frame = ModernFrame(dialog)
+        frame.pack(fill="both", expand=True, padx=20, pady=10)
+        frame.grid_rowconfigure(0, weight=1)
+        frame.grid_columnconfigure(0, weight=1)
+        
+        columns = ("Snapshot", "Created", "Size")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=10)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=140)
+        
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        
+        for manifest in snapshots:
+            tree.insert("", "end", iid=manifest['id'], values=(
+                manifest['id'], manifest['created'].replace("T", " "), f"{manifest['size'] / 1048576:.1f} MB"
+            ))
+        
+        def perform_restore():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showwarning("Warning", "Please select a snapshot")
+                return
+            if messagebox.askyesno("Confirm Restore", 
+                                 f"This will replace the current database with snapshot {selection[0]}. Continue?"):
+                dialog.destroy()
+                self.run_restore(self.backup_manager.start_restore(snapshot_id=selection[0]))
+        
+        ModernButton(dialog, text="Restore", command=perform_restore,
+                    fg_color=COLORS["warning"]).pack(pady=15)
+    
+    def run_restore(self, job):
+        """Follow a restore job and refresh the application once the data is replaced"""
+        def on_done():
+            if job.error is None:
+                self.invalidate_after_restore()
+                messagebox.showinfo("Success", "Database restored successfully!")
+                self.show_settings()
+            elif isinstance(job.error, BackupCancelled):
+                messagebox.showinfo("Restore Cancelled", "The restore was cancelled; nothing was changed")
+            else:
+                messagebox.showerror("Error", f"Restore failed: {str(job.error)}")
+        
+        self.show_job_progress("Restoring Database", job, on_done)
+    
+    def invalidate_after_restore(self):
+        """Reopen database handles and drop everything cached from the old data"""
+        self.app.db_pool.reset()
+        schema_catalog.invalidate()
+        inventory_catalog.invalidate()
+        self.app.appointment_manager.schedule.invalidate()
+        self.app.appointment_manager.availability.invalidate()
+        analytics_engine.invalidate()
+        query_cache.clear()
     
     def create_security_tab(self, parent):
         """Create security settings tab"""
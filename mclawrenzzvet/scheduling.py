@@ -0,0 +1,338 @@
+"""Veterinarian schedule indexing.
+
+Appointments are kept per veterinarian and per day as intervals sorted by
+start minute. Conflict checks and free-slot searches use bisect on the sorted
+starts instead of re-reading and re-parsing every appointment of the day.
+Availability searches across veterinarians use per-day occupancy bitmaps.
+
+Both caches only see this process's own bookings as they happen, so loaded
+days expire after ``SCHEDULE_CACHE_TTL`` seconds to pick up bookings made on
+other terminals. They answer the booking form's checks; the booking itself is
+re-checked against the database inside its write transaction.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from config import (CLINIC_OPEN, CLINIC_CLOSE, SCHEDULE_SLOT_MINUTES,
+                    APPOINTMENT_BUFFER_MINUTES, SCHEDULE_CACHE_TTL, VETERINARIANS)
+
+# Appointments in these states occupy the veterinarian's time
+ACTIVE_STATUSES = ("SCHEDULED", "IN_PROGRESS")
+
+
+def time_to_minutes(value):
+    """Convert an 'HH:MM' string to minutes after midnight (None if invalid)"""
+    if isinstance(value, int):
+        # Already encoded, e.g. appointments_enhanced.appointment_minute
+        return value
+    try:
+        hours, minutes = str(value).split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+
+
+def minutes_to_time(minutes):
+    """Convert minutes after midnight to an 'HH:MM' string"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class DaySchedule:
+    """Sorted appointment intervals of one veterinarian on one day.
+
+    ``max_duration`` bounds how far before a query window an overlapping
+    interval can start, so overlap queries only look at a small slice of the
+    sorted starts even when stored intervals overlap each other.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.intervals = []      # (start, end, appointment_id) sorted by start
+        self.max_duration = 0
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, start, end, appointment_id):
+        """Insert an interval"""
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.intervals.insert(index, (start, end, appointment_id))
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, appointment_id):
+        """Remove the intervals of an appointment"""
+        keep = [iv for iv in self.intervals if iv[2] != appointment_id]
+        removed = len(keep) != len(self.intervals)
+        if removed:
+            self.intervals = keep
+            self.starts = [iv[0] for iv in keep]
+        return removed
+
+    def conflicts(self, start, end):
+        """Get the intervals overlapping [start, end)"""
+        lo = bisect_right(self.starts, start - self.max_duration)
+        hi = bisect_left(self.starts, end)
+        return [iv for iv in self.intervals[lo:hi] if iv[1] > start]
+
+    def next_free(self, duration, earliest, latest, buffer=0):
+        """Get the first start >= earliest where duration minutes fit before latest.
+
+        ``buffer`` minutes are kept free after every appointment, including
+        the new one; the new appointment's buffer may run past ``latest``.
+        """
+        candidate = earliest
+        for iv_start, iv_end, _ in self.conflicts(earliest - buffer, latest):
+            if iv_start - candidate >= duration + buffer:
+                break
+            candidate = max(candidate, iv_end + buffer)
+        if candidate + duration <= latest:
+            return candidate
+        return None
+
+
+class ScheduleIndex:
+    """Per-veterinarian, per-day interval index over active appointments.
+
+    Days are loaded lazily through ``loader(veterinarian, date)``, which
+    returns ``(appointment_id, start, duration)`` rows with the start as
+    'HH:MM' or minutes after midnight. The owning manager keeps loaded days
+    current on create, status change and delete; a day is reloaded once it
+    is older than ``ttl`` seconds. Free-slot searches keep ``buffer_minutes``
+    free after every appointment, as the availability search does; conflict
+    checks only report real overlaps.
+    """
+
+    def __init__(self, loader, buffer_minutes=APPOINTMENT_BUFFER_MINUTES, ttl=SCHEDULE_CACHE_TTL):
+        self._loader = loader
+        self._lock = threading.RLock()
+        self.buffer_minutes = buffer_minutes
+        self.ttl = ttl
+        self._days = {}            # (veterinarian, date) -> DaySchedule
+        self._loaded_at = {}       # (veterinarian, date) -> time.monotonic() of the load
+        self._locations = {}       # appointment_id -> (veterinarian, date)
+
+    def _is_fresh(self, key):
+        """Check whether a loaded day is younger than the TTL (lock must be held)"""
+        loaded_at = self._loaded_at.get(key)
+        return loaded_at is not None and (self.ttl is None or time.monotonic() - loaded_at < self.ttl)
+
+    def day(self, veterinarian, date):
+        """Get the schedule of a veterinarian for a date ('YYYY-MM-DD')"""
+        key = (veterinarian, date)
+        with self._lock:
+            if not self._is_fresh(key):
+                self.invalidate_day(veterinarian, date)
+                schedule = DaySchedule()
+                for appointment_id, appointment_time, duration in self._loader(veterinarian, date):
+                    self._insert(schedule, key, appointment_id, appointment_time, duration)
+                self._days[key] = schedule
+                self._loaded_at[key] = time.monotonic()
+            return self._days[key]
+
+    def _insert(self, schedule, key, appointment_id, appointment_time, duration):
+        """Add one appointment to a loaded day (lock must be held)"""
+        start = time_to_minutes(appointment_time)
+        if start is None or not duration:
+            return
+        schedule.add(start, start + int(duration), appointment_id)
+        self._locations[appointment_id] = key
+
+    def add(self, veterinarian, date, appointment_time, duration, appointment_id):
+        """Record a new active appointment (ignored when the day is not loaded yet)"""
+        key = (veterinarian, date)
+        with self._lock:
+            schedule = self._days.get(key)
+            if schedule is not None:
+                self._insert(schedule, key, appointment_id, appointment_time, duration)
+
+    def remove(self, appointment_id):
+        """Drop an appointment from the index"""
+        with self._lock:
+            key = self._locations.pop(appointment_id, None)
+            if key in self._days:
+                self._days[key].remove(appointment_id)
+
+    def invalidate_day(self, veterinarian, date):
+        """Forget a loaded day so it is reloaded on next use"""
+        with self._lock:
+            self._loaded_at.pop((veterinarian, date), None)
+            schedule = self._days.pop((veterinarian, date), None)
+            if schedule is not None:
+                for _, _, appointment_id in schedule.intervals:
+                    self._locations.pop(appointment_id, None)
+
+    def invalidate(self):
+        """Forget every loaded day"""
+        with self._lock:
+            self._days.clear()
+            self._loaded_at.clear()
+            self._locations.clear()
+
+    def find_conflicts(self, veterinarian, date, start, end):
+        """Get (appointment_id, 'HH:MM', duration) of appointments overlapping [start, end) minutes"""
+        with self._lock:
+            return [(appointment_id, minutes_to_time(iv_start), iv_end - iv_start)
+                    for iv_start, iv_end, appointment_id in self.day(veterinarian, date).conflicts(start, end)]
+
+    def next_free_slot(self, veterinarian, date, duration, earliest=None):
+        """Get the first free start minute on a date within clinic hours (None if full)"""
+        opening = time_to_minutes(CLINIC_OPEN)
+        closing = time_to_minutes(CLINIC_CLOSE)
+        earliest = opening if earliest is None else max(earliest, opening)
+        with self._lock:
+            return self.day(veterinarian, date).next_free(duration, earliest, closing, self.buffer_minutes)
+
+
+class AvailabilityEngine:
+    """Free-slot search across veterinarians over a date range.
+
+    Each (veterinarian, date) is an integer bitmap with one bit per
+    ``SCHEDULE_SLOT_MINUTES`` slot of clinic hours; a set bit means the slot
+    is taken by an appointment or the buffer after it. Missing days are
+    loaded with one range query through ``loader(start_date, end_date)``,
+    which returns ``(veterinarian, appointment_date, start, duration)`` rows
+    of active appointments, and reloaded once older than ``ttl`` seconds. A
+    query then only shifts and ANDs integers, however many bookings the
+    database holds.
+    """
+
+    def __init__(self, loader, slot_minutes=SCHEDULE_SLOT_MINUTES,
+                 buffer_minutes=APPOINTMENT_BUFFER_MINUTES, ttl=SCHEDULE_CACHE_TTL):
+        self._loader = loader
+        self._lock = threading.RLock()
+        self.slot_minutes = slot_minutes
+        self.buffer_minutes = buffer_minutes
+        self.ttl = ttl
+        self.opening = time_to_minutes(CLINIC_OPEN)
+        self.closing = time_to_minutes(CLINIC_CLOSE)
+        self.slots_per_day = (self.closing - self.opening) // slot_minutes
+        self._bitmaps = {}         # (veterinarian, date) -> occupancy bitmap
+        self._loaded_dates = {}    # date -> time.monotonic() of the load
+
+    def _slots(self, minutes):
+        """Number of slots needed to cover a number of minutes"""
+        return -(-minutes // self.slot_minutes)
+
+    def _mask(self, appointment_time, duration):
+        """Occupancy bits of one appointment and its buffer"""
+        start = time_to_minutes(appointment_time)
+        if start is None or not duration:
+            return 0
+        end = start + int(duration) + self.buffer_minutes
+        first = max((start - self.opening) // self.slot_minutes, 0)
+        last = min(self._slots(end - self.opening), self.slots_per_day)
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def _is_fresh(self, date):
+        """Check whether a date's bitmaps are younger than the TTL (lock must be held)"""
+        loaded_at = self._loaded_dates.get(date)
+        return loaded_at is not None and (self.ttl is None or time.monotonic() - loaded_at < self.ttl)
+
+    def _ensure_loaded(self, dates):
+        """Load the bitmaps of any dates not cached yet or expired (lock must be held)"""
+        missing = sorted(date for date in dates if not self._is_fresh(date))
+        if not missing:
+            return
+        for date in missing:
+            self.invalidate_day(date)
+        wanted = set(missing)
+        for veterinarian, date, appointment_time, duration in self._loader(missing[0], missing[-1]):
+            if date not in wanted:
+                continue
+            key = (veterinarian, date)
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | self._mask(appointment_time, duration)
+        loaded_at = time.monotonic()
+        self._loaded_dates.update((date, loaded_at) for date in missing)
+
+    def add(self, veterinarian, date, appointment_time, duration):
+        """Mark a new active appointment (ignored when the date is not loaded yet)"""
+        with self._lock:
+            if date in self._loaded_dates:
+                key = (veterinarian, date)
+                self._bitmaps[key] = self._bitmaps.get(key, 0) | self._mask(appointment_time, duration)
+
+    def invalidate_day(self, date):
+        """Forget the bitmaps of a date so they are rebuilt on next use"""
+        with self._lock:
+            self._loaded_dates.pop(date, None)
+            for key in [key for key in self._bitmaps if key[1] == date]:
+                del self._bitmaps[key]
+
+    def invalidate(self):
+        """Forget every bitmap"""
+        with self._lock:
+            self._bitmaps.clear()
+            self._loaded_dates.clear()
+
+    def occupancy(self, veterinarian, date):
+        """Get the occupancy bitmap of a veterinarian on a date"""
+        with self._lock:
+            self._ensure_loaded([date])
+            return self._bitmaps.get((veterinarian, date), 0)
+
+    def free_starts(self, bitmap, duration):
+        """Get the slot positions where duration minutes plus the buffer fit"""
+        needed = self._slots(duration)
+        if needed > self.slots_per_day:
+            return []
+        # The trailing buffer may run past closing time, so slots after the
+        # last one count as free
+        buffer_slots = self._slots(self.buffer_minutes)
+        free = ~bitmap & ((1 << (self.slots_per_day + buffer_slots)) - 1)
+        runs = free
+        for shift in range(1, needed + buffer_slots):
+            runs &= free >> shift
+        last_start = self.slots_per_day - needed
+        return [slot for slot in range(last_start + 1) if runs >> slot & 1]
+
+    def suggest(self, duration, start_date, end_date, veterinarians=None,
+                preferred_time=None, earliest=None, limit=10):
+        """Get ranked free slots as dicts with veterinarian, date, time and duration.
+
+        Each veterinarian contributes its best slot per day: the one closest
+        to ``preferred_time`` ('HH:MM'), or the earliest one. Suggestions are
+        ordered by date, distance from the preferred time and then by how
+        busy the veterinarian is that day, so load is spread across vets.
+        ``earliest`` (a datetime) excludes slots that have already passed.
+        """
+        veterinarians = veterinarians or VETERINARIANS
+        preferred = time_to_minutes(preferred_time) if preferred_time else None
+        dates = []
+        day = start_date
+        while day <= end_date:
+            dates.append(day.strftime('%Y-%m-%d'))
+            day += timedelta(days=1)
+
+        candidates = []
+        with self._lock:
+            self._ensure_loaded(dates)
+            for date in dates:
+                cutoff = None
+                if earliest is not None and earliest.strftime('%Y-%m-%d') == date:
+                    cutoff = earliest.hour * 60 + earliest.minute
+                for order, veterinarian in enumerate(veterinarians):
+                    bitmap = self._bitmaps.get((veterinarian, date), 0)
+                    starts = [self.opening + slot * self.slot_minutes
+                              for slot in self.free_starts(bitmap, duration)]
+                    if cutoff is not None:
+                        starts = [start for start in starts if start >= cutoff]
+                    if not starts:
+                        continue
+                    if preferred is None:
+                        best = starts[0]
+                    else:
+                        best = min(starts, key=lambda start: abs(start - preferred))
+                    distance = abs(best - preferred) if preferred is not None else best
+                    load = bin(bitmap).count("1")
+                    candidates.append(((date, distance, load, order), {
+                        'veterinarian': veterinarian,
+                        'date': date,
+                        'time': minutes_to_time(best),
+                        'duration': duration,
+                    }))
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [suggestion for _, suggestion in candidates[:limit]]
@@ -1,5 +1,7 @@
 import customtkinter as ctk
+import threading
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import ttk
 from config import COLORS
 
@@ -103,4 +105,309 @@ class ResponsiveFrame(ctk.CTkFrame):
                 elif isinstance(child, (ctk.CTkLabel, ModernLabel)):
                     child.configure(font=("Arial", 12))
                 elif isinstance(child, (ctk.CTkEntry, ModernEntry)):
-                    child.configure(height=35, font=("Arial", 14))
\ No newline at end of file
+                    child.configure(height=35, font=("Arial", 14))
+
+
+class ListRowSource:
+    """Row source over rows already in memory"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def get(self, start, stop):
+        return self.rows[start:stop]
+    
+    def missing_pages(self, start, stop):
+        return []
+
+
+class PagedRowSource:
+    """Row source that reads pages on demand through a keyset cursor.
+    
+    ``count()`` returns the total number of rows and
+    ``fetch(limit, after, skip)`` the ``limit`` rows that follow the row
+    whose ``key(row)`` is ``after`` (None for the top), passing over
+    ``skip`` rows first. The key of the last row of every page read is
+    remembered, so scrolling on or back to a page seen before is a short
+    index range; only a jump past unseen pages needs ``skip``. At most
+    ``max_pages`` formatted pages are kept in memory.
+    
+    ``get()`` never touches the database: rows of pages that are not
+    loaded come back as None. ``load_pages()`` reads them, e.g. on a
+    worker thread, and ``add_pages()`` stores the result.
+    """
+    
+    def __init__(self, count, fetch, key, formatter=tuple, page_size=200, max_pages=10):
+        self._count = count
+        self._fetch = fetch
+        self._key = key
+        self.formatter = formatter
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._total = None
+        self._pages = OrderedDict()
+        self._page_ends = {-1: None}    # page number -> key of its last row
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        if self._total is None:
+            self._total = self._count()
+        return self._total
+    
+    def prefetch(self):
+        """Read the row count and the first page, e.g. on a worker thread"""
+        len(self)
+        self.add_pages(self.load_pages([0]))
+        return self
+    
+    def missing_pages(self, start, stop):
+        """Numbers of the pages covering rows start to stop that are not loaded"""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        with self._lock:
+            return [number for number in range(start // self.page_size, (stop - 1) // self.page_size + 1)
+                    if number not in self._pages]
+    
+    def load_pages(self, numbers):
+        """Read pages from the data source; returns {number: (rows, last key)}"""
+        loaded = {}
+        for number in sorted(numbers):
+            with self._lock:
+                ends = dict(self._page_ends)
+            ends.update((n, end) for n, (_, end) in loaded.items())
+            # Continue from the closest page before this one whose end is known
+            previous = max(n for n in ends if n < number)
+            rows = self._fetch(self.page_size, ends[previous], (number - previous - 1) * self.page_size)
+            loaded[number] = ([self.formatter(row) for row in rows],
+                              self._key(rows[-1]) if rows else None)
+        return loaded
+    
+    def add_pages(self, loaded):
+        """Store pages read by load_pages()"""
+        with self._lock:
+            for number, (rows, end) in loaded.items():
+                self._pages[number] = rows
+                self._pages.move_to_end(number)
+                if end is not None:
+                    self._page_ends[number] = end
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+    
+    def get(self, start, stop):
+        stop = min(stop, len(self))
+        rows = []
+        with self._lock:
+            while start < stop:
+                number, index = divmod(start, self.page_size)
+                count = min(self.page_size - index, stop - start)
+                page = self._pages.get(number)
+                if page is None:
+                    rows.extend([None] * count)
+                else:
+                    self._pages.move_to_end(number)
+                    chunk = page[index:index + count]
+                    rows.extend(chunk + [None] * (count - len(chunk)))
+                start += count
+        return rows
+
+
+class VirtualTreeview(tk.Frame):
+    """Treeview that only creates items for the rows in view.
+    
+    Rows come from a row source (``ListRowSource`` or ``PagedRowSource``)
+    and are rendered a window at a time as the user scrolls, so lists of
+    tens of thousands of rows cost no more than one screenful. Item IDs are
+    the row indexes, and ``selection()`` and ``item()`` keep working for the
+    selected row after it scrolls out of view.
+    
+    Pages a paged source has not loaded yet are read through ``submit``
+    (``TaskExecutor.submit``) and shown as placeholders until they arrive,
+    so scrolling never waits on the database. Without ``submit`` they are
+    read in place.
+    """
+    
+    PLACEHOLDER = ("…",)
+    
+    def __init__(self, master, columns, height=15, submit=None, **kwargs):
+        kwargs.setdefault("bg", COLORS["card"])
+        super().__init__(master, **kwargs)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height, selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        
+        self.submit = submit
+        self.source = ListRowSource([])
+        self.offset = 0
+        self.selected_index = None
+        self._selected_values = None
+        self._loading = set()
+        self._rendering = False
+        
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3) or "break")
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3) or "break")
+        self.tree.bind("<Up>", lambda event: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda event: self._move_selection(-self.visible_rows()))
+        self.tree.bind("<Next>", lambda event: self._move_selection(self.visible_rows()))
+        self.tree.bind("<Home>", lambda event: self._move_selection(-len(self.source)))
+        self.tree.bind("<End>", lambda event: self._move_selection(len(self.source)))
+    
+    def heading(self, column, **kwargs):
+        return self.tree.heading(column, **kwargs)
+    
+    def column(self, column, **kwargs):
+        return self.tree.column(column, **kwargs)
+    
+    def set_source(self, source):
+        """Show the rows of a row source, starting from the top"""
+        self.source = source
+        self.offset = 0
+        self.selected_index = None
+        self._selected_values = None
+        self._loading = set()
+        self.refresh()
+    
+    def set_rows(self, rows):
+        """Show a list of row values"""
+        self.set_source(ListRowSource(rows))
+    
+    def visible_rows(self):
+        """Number of rows that fit in the treeview"""
+        if self.tree.winfo_height() <= 1:
+            # Not laid out yet
+            return int(self.tree.cget("height"))
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or 20
+        fitting = (self.tree.winfo_height() - 25) // int(row_height)  # minus the heading
+        return max(fitting, 1)
+    
+    def scroll_to(self, offset):
+        """Show the rows from offset on"""
+        total = len(self.source)
+        offset = max(0, min(int(offset), total - self.visible_rows()))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+    
+    def yview(self, *args):
+        """Scrollbar command: 'moveto fraction' or 'scroll n units|pages'"""
+        if not args:
+            return self.scrollbar.get()
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * len(self.source))
+        elif args[0] == "scroll":
+            step = self.visible_rows() if args[2] == "pages" else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+    
+    def refresh(self):
+        """Render the rows currently in view"""
+        if self._rendering:
+            return
+        self._rendering = True
+        try:
+            visible = self.visible_rows()
+            total = len(self.source)
+            self.offset = max(0, min(self.offset, total - visible))
+            self._load_missing(self.offset, self.offset + visible)
+            rows = self.source.get(self.offset, self.offset + visible)
+            
+            self.tree.delete(*self.tree.get_children())
+            for index, values in enumerate(rows, self.offset):
+                self.tree.insert("", "end", iid=str(index), values=self.PLACEHOLDER if values is None else values)
+                if index == self.selected_index and values is not None:
+                    self._selected_values = list(values)
+            if self.selected_index is not None and self.tree.exists(str(self.selected_index)):
+                self.tree.selection_set(str(self.selected_index))
+            
+            if total:
+                self.scrollbar.set(self.offset / total, min((self.offset + visible) / total, 1.0))
+            else:
+                self.scrollbar.set(0.0, 1.0)
+        finally:
+            self._rendering = False
+    
+    def _load_missing(self, start, stop):
+        """Request the pages of rows start to stop that the source has not loaded"""
+        missing = set(self.source.missing_pages(start, stop))
+        if not missing or missing <= self._loading:
+            return
+        source = self.source
+        if self.submit is None:
+            source.add_pages(source.load_pages(missing))
+            return
+        
+        def loaded(pages):
+            self._loading.difference_update(pages)
+            if self.source is source:
+                source.add_pages(pages)
+                self.refresh()
+        
+        def failed(error):
+            self._loading.difference_update(missing)
+            print(f"Error loading rows: {error}")
+        
+        # A newer request for this list supersedes the pages still loading
+        self._loading = missing
+        self.submit(source.load_pages, sorted(missing), key=(id(self), tuple(sorted(missing))),
+                    group=("virtual-list", id(self)), owner=self, on_success=loaded, on_error=failed)
+    
+    def _on_select(self, event):
+        if self._rendering:
+            return
+        selection = self.tree.selection()
+        if selection:
+            self.selected_index = int(selection[0])
+            rows = self.source.get(self.selected_index, self.selected_index + 1)
+            self._selected_values = list(rows[0]) if rows and rows[0] is not None else None
+    
+    def _on_mousewheel(self, event):
+        self.scroll_to(self.offset - int(event.delta / 120) * 3)
+        return "break"
+    
+    def _move_selection(self, step):
+        """Move the selection by step rows, scrolling to keep it in view"""
+        total = len(self.source)
+        if not total:
+            return "break"
+        index = 0 if self.selected_index is None else max(0, min(self.selected_index + step, total - 1))
+        self.selected_index = index
+        self._selected_values = None
+        visible = self.visible_rows()
+        if index < self.offset:
+            self.scroll_to(index)
+        elif index >= self.offset + visible:
+            self.scroll_to(index - visible + 1)
+        self.refresh()
+        self.tree.focus(str(index))
+        return "break"
+    
+    def selection(self):
+        """IDs of the selected row (kept while it is scrolled out of view).
+        
+        Empty while the selected row is still a placeholder.
+        """
+        if self.selected_index is None or self._selected_values is None:
+            return ()
+        return (str(self.selected_index),)
+    
+    def item(self, iid, option=None):
+        """Item options of a row; works for rows outside the rendered window"""
+        if self.tree.exists(iid):
+            return self.tree.item(iid, option) if option else self.tree.item(iid)
+        if iid == str(self.selected_index) and self._selected_values is not None:
+            values = self._selected_values
+        else:
+            rows = self.source.get(int(iid), int(iid) + 1)
+            values = list(rows[0]) if rows and rows[0] is not None else ""
+        return values if option == "values" else {'values': values}
+
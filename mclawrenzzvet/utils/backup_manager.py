@@ -0,0 +1,529 @@
+"""Online database backups.
+
+Backups use SQLite's backup API and always copy a consistent snapshot. The
+clinic keeps working while a backup runs and other connections are never
+closed. In WAL mode the whole copy is one step inside a single read
+transaction, which writers do not wait for. Under a rollback journal the
+copy goes a few pages at a time so writers can run between steps; a write
+makes SQLite restart the copy, and after ``BACKUP_MAX_RESTARTS`` restarts
+the rest is copied in one step so a busy database cannot starve it. The
+copy can be compressed with gzip or zstd (the latter needs the optional
+``zstandard`` package), and old backups in the backup folder are pruned
+to the configured retention.
+
+Differential backups split a consistent copy into fixed-size chunks and
+keep them in a content-addressed store (``SnapshotStore``): a chunk is
+saved once under its SHA-256 digest and every snapshot is a manifest
+listing the digests of its chunks. A nightly snapshot therefore only adds
+the chunks that changed since the previous one.
+
+Restores stage the backup next to the live database, verify it with
+``PRAGMA integrity_check``, upgrade its schema and then copy it into the
+live database with the backup API in a single transaction. Every open
+connection sees the restored data as soon as that transaction commits, so
+no file is swapped underneath them and the application does not need a
+restart.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from config import (DB_FILE, BACKUP_DIR, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP,
+                    BACKUP_MAX_RESTARTS, BACKUP_COMPRESSION, BACKUP_RETENTION, BACKUP_SNAPSHOT_DIR, BACKUP_CHUNK_SIZE, RESTORE_VERIFY_PRAGMA)
+from migrations import run_migrations
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+HAS_ZSTD = zstandard is not None
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+BACKUP_PREFIX = "vetclinic_backup_"
+
+
+def compression_for(filename):
+    """Guess the compression of a backup file from its extension"""
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if compression and filename.endswith(extension):
+            return compression
+    return None
+
+
+def _copy_stream(source, destination, cancel_event=None, chunk_size=1024 * 1024):
+    """Copy one file object into another, stopping if cancelled"""
+    while True:
+        _check_cancelled(cancel_event)
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        destination.write(chunk)
+
+
+def open_compressed(filename, mode="rb", compression=None):
+    """Open a backup file for reading or writing bytes, (de)compressing as needed"""
+    if compression == "gzip":
+        return gzip.open(filename, mode, compresslevel=6)
+    if compression == "zstd":
+        if not HAS_ZSTD:
+            raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)")
+        return zstandard.open(filename, mode)
+    return open(filename, mode)
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise BackupCancelled("Backup cancelled")
+
+
+def _scaled(progress, start, end):
+    """Map a progress callback's 0-1 range onto [start, end] of another one"""
+    if progress is None:
+        return None
+    return lambda fraction: progress(start + (end - start) * fraction)
+
+
+class BackupCancelled(Exception):
+    """Raised when a backup is cancelled before it finishes"""
+
+
+class BackupVerificationError(Exception):
+    """Raised when a backup fails verification and is not restored"""
+
+
+class SnapshotStore:
+    """Content-addressed chunk store holding point-in-time database snapshots.
+
+    Layout under ``root``::
+
+        chunks/ab/abcd...ef.gz   one file per distinct chunk, named by digest
+        snapshots/<id>.json      manifest: size, chunk size and chunk digests
+
+    Chunks are written before the manifest that references them, so an
+    interrupted snapshot never leaves a manifest pointing at missing data;
+    its orphaned chunks are removed by ``collect_garbage``. Taking a
+    snapshot, restoring one and garbage collection hold the store's lock
+    (shared by every store on the same directory), so a collection never
+    removes the chunks of a snapshot whose manifest is not written yet.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, root=BACKUP_SNAPSHOT_DIR, chunk_size=BACKUP_CHUNK_SIZE,
+                 compression=BACKUP_COMPRESSION, retention=BACKUP_RETENTION):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.retention = retention
+        with self._locks_guard:
+            self._lock = self._locks.setdefault(os.path.abspath(root), threading.RLock())
+
+    def _chunk_path(self, digest, compression):
+        extension = COMPRESSION_EXTENSIONS[compression]
+        return os.path.join(self.root, "chunks", digest[:2], digest + extension)
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.root, "snapshots", f"{snapshot_id}.json")
+
+    def _new_snapshot_id(self):
+        snapshot_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        candidate, counter = snapshot_id, 1
+        while os.path.exists(self._manifest_path(candidate)):
+            candidate = f"{snapshot_id}_{counter}"
+            counter += 1
+        return candidate
+
+    @staticmethod
+    def _write_atomic(path, data, compression=None):
+        """Write bytes to a file that only appears once complete"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + ".part"
+        with open_compressed(partial, "wb", compression) as target:
+            target.write(data)
+        os.replace(partial, path)
+
+    def add(self, database_copy, progress=None, cancel_event=None):
+        """Store a consistent database file as a new snapshot; returns its manifest.
+
+        The manifest's ``new_chunks`` and ``new_bytes`` show how much this
+        snapshot actually added to the store.
+        """
+        with self._lock:
+            size = os.path.getsize(database_copy)
+            chunks = []
+            new_chunks = new_bytes = 0
+            with open(database_copy, "rb") as source:
+                while True:
+                    _check_cancelled(cancel_event)
+                    data = source.read(self.chunk_size)
+                    if not data:
+                        break
+                    digest = hashlib.sha256(data).hexdigest()
+                    path = self._chunk_path(digest, self.compression)
+                    if not os.path.exists(path):
+                        self._write_atomic(path, data, self.compression)
+                        new_chunks += 1
+                        new_bytes += len(data)
+                    chunks.append(digest)
+                    if progress and size:
+                        progress(min(len(chunks) * self.chunk_size / size, 1.0))
+
+            manifest = {
+                'id': self._new_snapshot_id(),
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'size': size,
+                'chunk_size': self.chunk_size,
+                'compression': self.compression,
+                'chunks': chunks,
+                'new_chunks': new_chunks,
+                'new_bytes': new_bytes,
+            }
+            self._write_atomic(self._manifest_path(manifest['id']), json.dumps(manifest).encode("utf-8"))
+            return manifest
+
+    def get(self, snapshot_id):
+        """Get a snapshot's manifest"""
+        with open(self._manifest_path(snapshot_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_snapshots(self):
+        """Get the manifests of all snapshots, newest first"""
+        directory = os.path.join(self.root, "snapshots")
+        manifests = []
+        for filename in glob.glob(os.path.join(directory, "*.json")):
+            try:
+                with open(filename, encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable snapshot {filename}: {e}")
+        return sorted(manifests, key=lambda manifest: manifest['id'], reverse=True)
+
+    def restore(self, snapshot_id, destination, progress=None, cancel_event=None):
+        """Reassemble a snapshot into a database file, verifying every chunk"""
+        with self._lock:
+            manifest = self.get(snapshot_id)
+            total = len(manifest['chunks'])
+            partial = destination + ".part"
+            try:
+                with open(partial, "wb") as target:
+                    for done, digest in enumerate(manifest['chunks'], 1):
+                        _check_cancelled(cancel_event)
+                        with open_compressed(self._chunk_path(digest, manifest['compression']), "rb",
+                                             manifest['compression']) as source:
+                            data = source.read()
+                        if hashlib.sha256(data).hexdigest() != digest:
+                            raise ValueError(f"Snapshot {snapshot_id} has a corrupt chunk {digest}")
+                        target.write(data)
+                        if progress:
+                            progress(done / total)
+                if os.path.getsize(partial) != manifest['size']:
+                    raise ValueError(f"Snapshot {snapshot_id} does not match its recorded size")
+                os.replace(partial, destination)
+            except BaseException:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+            return destination
+
+    def delete(self, snapshot_id):
+        """Delete a snapshot's manifest; its chunks go at the next garbage collection"""
+        with self._lock:
+            os.remove(self._manifest_path(snapshot_id))
+
+    def prune(self, keep=None):
+        """Delete the oldest snapshots beyond the retention and their unused chunks"""
+        with self._lock:
+            keep = self.retention if keep is None else keep
+            if not keep:
+                return []
+            deleted = [manifest['id'] for manifest in self.list_snapshots()[keep:]]
+            for snapshot_id in deleted:
+                self.delete(snapshot_id)
+            if deleted:
+                self.collect_garbage()
+            return deleted
+
+    def collect_garbage(self):
+        """Remove chunks no snapshot references; returns how many were removed"""
+        with self._lock:
+            referenced = {self._chunk_path(digest, manifest['compression'])
+                          for manifest in self.list_snapshots() for digest in manifest['chunks']}
+            removed = 0
+            for path in glob.glob(os.path.join(self.root, "chunks", "*", "*")):
+                if path not in referenced:
+                    os.remove(path)
+                    removed += 1
+            return removed
+
+
+class BackupJob:
+    """A backup running on a worker thread.
+
+    The UI polls ``progress`` and ``finished`` (Tk widgets must only be
+    touched from the main thread) and may call ``cancel()`` at any time.
+    After it finishes, ``result`` holds the backup file name and ``error``
+    the exception that stopped it, if any.
+    """
+
+    def __init__(self, task, *args, **kwargs):
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.finished = False
+        self._cancel = threading.Event()
+        kwargs["cancel_event"] = self._cancel
+        kwargs["progress"] = self._on_progress
+        self._thread = threading.Thread(target=self._run, args=(task, args, kwargs),
+                                        name="database-backup", daemon=True)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop after the current step; partial files are removed"""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns True if it did"""
+        self._thread.join(timeout)
+        return self.finished
+
+    def _on_progress(self, fraction):
+        self.progress = fraction
+
+    def _run(self, task, args, kwargs):
+        try:
+            self.result = task(*args, **kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+
+class _CopyRestarted(Exception):
+    """Concurrent writes restarted a page-by-page copy too often"""
+
+
+class BackupManager:
+    """Creates, lists and prunes database backups"""
+
+    def __init__(self, database=DB_FILE, backup_dir=BACKUP_DIR, pages_per_step=BACKUP_PAGES_PER_STEP,
+                 compression=BACKUP_COMPRESSION, retention=BACKUP_RETENTION, snapshots=None):
+        self.database = database
+        self.backup_dir = backup_dir
+        self.pages_per_step = pages_per_step
+        self.compression = compression
+        self.retention = retention
+        self.snapshots = snapshots or SnapshotStore(compression=compression, retention=retention)
+
+    def default_filename(self, compression=None):
+        """Timestamped backup file name in the backup folder"""
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        extension = COMPRESSION_EXTENSIONS[compression]
+        return os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{stamp}.db{extension}")
+
+    def _copy_database(self, destination, progress=None, cancel_event=None):
+        """Copy the live database into a new SQLite file"""
+        restarts = 0
+        last_remaining = None
+
+        def on_step(status, remaining, total):
+            nonlocal restarts, last_remaining
+            _check_cancelled(cancel_event)
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > BACKUP_MAX_RESTARTS:
+                    raise _CopyRestarted()
+            last_remaining = remaining
+            if progress and total:
+                progress((total - remaining) / total)
+
+        source = sqlite3.connect(self.database, timeout=30)
+        target = sqlite3.connect(destination)
+        try:
+            if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                # Writers don't wait for readers in WAL mode, so one step in
+                # one read transaction blocks nobody
+                source.backup(target, pages=-1)
+            else:
+                try:
+                    source.backup(target, pages=self.pages_per_step, progress=on_step,
+                                  sleep=BACKUP_STEP_SLEEP)
+                except _CopyRestarted:
+                    source.backup(target, pages=-1)
+            if progress:
+                progress(1.0)
+        finally:
+            target.close()
+            source.close()
+
+    def backup(self, destination=None, compression="default", progress=None, cancel_event=None):
+        """Back up the database; returns the backup file name.
+
+        ``destination`` defaults to a timestamped file in the backup folder,
+        and ``compression`` to the configured one ('gzip', 'zstd' or None).
+        ``progress(fraction)`` is reported while pages are copied. Backups
+        written to the backup folder are pruned to the retention afterwards.
+        """
+        if compression == "default":
+            compression = self.compression if destination is None else compression_for(destination)
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown backup compression: {compression}")
+        if compression == "zstd" and not HAS_ZSTD:
+            raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)")
+        destination = destination or self.default_filename(compression)
+        directory = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(directory, exist_ok=True)
+
+        # Pages go to a temporary file next to the destination, which only
+        # replaces it once the backup is complete
+        handle, partial = tempfile.mkstemp(prefix=".backup_", suffix=".part", dir=directory)
+        os.close(handle)
+        copy = partial + ".db" if compression else partial
+        try:
+            self._copy_database(copy, progress, cancel_event)
+            if compression:
+                with open(copy, "rb") as source, open_compressed(partial, "wb", compression) as target:
+                    _copy_stream(source, target, cancel_event)
+            os.replace(partial, destination)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            if copy != partial and os.path.exists(copy):
+                os.remove(copy)
+        if progress:
+            progress(1.0)
+
+        if os.path.abspath(directory) == os.path.abspath(self.backup_dir):
+            self.prune()
+        return destination
+
+    def start_backup(self, destination=None, compression="default"):
+        """Run a backup on a worker thread; returns its BackupJob"""
+        return BackupJob(self.backup, destination, compression).start()
+
+    def differential_backup(self, progress=None, cancel_event=None):
+        """Take a snapshot that only stores the chunks changed since earlier ones; returns its manifest"""
+        os.makedirs(self.snapshots.root, exist_ok=True)
+        handle, copy = tempfile.mkstemp(prefix=".snapshot_", suffix=".db", dir=self.snapshots.root)
+        os.close(handle)
+        try:
+            self._copy_database(copy, _scaled(progress, 0.0, 0.5), cancel_event)
+            manifest = self.snapshots.add(copy, _scaled(progress, 0.5, 1.0), cancel_event)
+        finally:
+            os.remove(copy)
+        self.snapshots.prune()
+        return manifest
+
+    def start_differential_backup(self):
+        """Take a differential snapshot on a worker thread; returns its BackupJob"""
+        return BackupJob(self.differential_backup).start()
+
+    def list_backups(self):
+        """Get the backup files in the backup folder, newest first"""
+        pattern = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}*.db*")
+        files = [f for f in glob.glob(pattern) if not f.endswith(".part")]
+        return sorted(files, key=os.path.getmtime, reverse=True)
+
+    def prune(self, keep=None):
+        """Delete the oldest backups beyond the retention; returns the deleted files"""
+        keep = self.retention if keep is None else keep
+        if not keep:
+            return []
+        deleted = []
+        for filename in self.list_backups()[keep:]:
+            try:
+                os.remove(filename)
+                deleted.append(filename)
+            except OSError as e:
+                print(f"Could not delete old backup {filename}: {e}")
+        return deleted
+
+    def _stage(self, source, staged, snapshot_id=None, progress=None, cancel_event=None):
+        """Write the backup to restore as a plain database file"""
+        if snapshot_id is not None:
+            self.snapshots.restore(snapshot_id, staged, progress, cancel_event)
+            return
+        compression = compression_for(source)
+        with open_compressed(source, "rb", compression) as reader, open(staged, "wb") as target:
+            _copy_stream(reader, target, cancel_event)
+        if progress:
+            progress(1.0)
+
+    def _prepare(self, staged, page_size, cancel_event=None):
+        """Verify a staged backup and bring it up to the current schema"""
+        conn = sqlite3.connect(staged)
+        try:
+            try:
+                results = [row[0] for row in conn.execute(f"PRAGMA {RESTORE_VERIFY_PRAGMA}")]
+            except sqlite3.DatabaseError as e:
+                raise BackupVerificationError(f"Not a valid database backup: {e}")
+            if results != ["ok"]:
+                raise BackupVerificationError("Backup is damaged: " + "; ".join(results[:5]))
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if not {"inventory", "sales"} <= tables:
+                raise BackupVerificationError("File is not a clinic database backup")
+            _check_cancelled(cancel_event)
+
+            # A backup cannot be copied into a WAL database with a different page size
+            conn.execute("PRAGMA journal_mode = DELETE")
+            if conn.execute("PRAGMA page_size").fetchone()[0] != page_size:
+                conn.execute(f"PRAGMA page_size = {page_size}")
+                conn.execute("VACUUM")
+            run_migrations(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def restore(self, source=None, snapshot_id=None, progress=None, cancel_event=None):
+        """Replace the live database with a backup file or a snapshot.
+
+        The backup is staged and verified first; nothing is changed if that
+        fails or is cancelled. The copy into the live database happens in
+        one transaction, so other connections see either the old or the
+        restored data, never a mix. Callers must invalidate their caches
+        afterwards.
+        """
+        if source is None and snapshot_id is None:
+            raise ValueError("Nothing to restore")
+        directory = os.path.dirname(os.path.abspath(self.database))
+        handle, staged = tempfile.mkstemp(prefix=".restore_", suffix=".db", dir=directory)
+        os.close(handle)
+        live = sqlite3.connect(self.database, timeout=30)
+        try:
+            self._stage(source, staged, snapshot_id, _scaled(progress, 0.0, 0.4), cancel_event)
+            page_size = live.execute("PRAGMA page_size").fetchone()[0]
+            self._prepare(staged, page_size, cancel_event)
+            if progress:
+                progress(0.8)
+            _check_cancelled(cancel_event)
+
+            restored = sqlite3.connect(staged)
+            try:
+                restored.backup(live)
+            finally:
+                restored.close()
+        finally:
+            live.close()
+            os.remove(staged)
+        if progress:
+            progress(1.0)
+        return source if snapshot_id is None else snapshot_id
+
+    def start_restore(self, source=None, snapshot_id=None):
+        """Restore a backup file or snapshot on a worker thread; returns its BackupJob"""
+        return BackupJob(self.restore, source, snapshot_id).start()
@@ -0,0 +1,523 @@
+"""Streaming data exports.
+
+Rows are read from the cursor with ``fetchmany`` and written as they
+arrive, so memory use stays flat however large a table grows. An export
+reads through its own pooled connection, which lets it run on a worker
+thread while the clinic keeps recording sales. Rows added after the export
+started are left out (queries take the table's highest rowid at the start
+as a bound), so the row count and the rows written agree. With the WAL
+journal the rows come from one read transaction. With a rollback journal
+that would block every writer until the export finished, so the export
+order is copied once into a temp table and the rows are read back in
+short statements, a range of positions at a time. Rows deleted meanwhile
+are left out; none are written twice or skipped, however the others
+change.
+
+Besides CSV, ``sales``, ``appointments_enhanced``, ``appointment_services``
+and ``communication_log`` can be exported as Parquet or Feather (Arrow IPC)
+files with typed columns, dictionary-encoded categoricals, compression and
+optional one-file-per-month or per-year partitions. Those formats need
+pyarrow; without it ``HAS_PYARROW`` is False and only CSV is offered.
+"""
+import csv
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from config import EXPORT_CHUNK_SIZE
+from migrations import DAY_SQL, EPOCH_SQL
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+HAS_PYARROW = pa is not None
+
+# data type -> (header, table, query parts)
+# Query parts: "columns" and "order" of the export, and optionally the
+# "source" (FROM clause, default the table), the "rowid" column bounding the
+# export (default "id") and a "key" column the rows are grouped by (default
+# one row per rowid). Every query is bounded by the table's highest rowid at
+# the start of the export.
+EXPORTS = {
+    "sales": (
+        ["Transaction ID", "Item ID", "Item Name", "Quantity", "Price", "Subtotal",
+         "Total Amount", "Payment Method", "Customer Name", "Sale Date"],
+        "sales",
+        {"columns": """transaction_id, item_id, item_name, quantity, price, subtotal,
+                       total_amount, payment_method, customer_name, sale_date""",
+         "order": "sale_epoch DESC, id DESC"},
+    ),
+    "inventory": (
+        ["ID", "Name", "Price", "Stock", "Category", "Image", "Brand", "Animal Type",
+         "Dosage", "Expiration Date"],
+        "inventory",
+        {"columns": "id, name, price, stock, category, '', brand, animal_type, dosage, expiration_date",
+         "order": "category, name, id"},
+    ),
+    "appointments": (
+        ["Appointment ID", "Patient Name", "Owner Name", "Animal Type", "Date", "Notes",
+         "Status", "Total Amount"],
+        "appointments",
+        {"columns": "appointment_id, patient_name, owner_name, animal_type, date, notes, status, total_amount",
+         "order": "date DESC, appointment_id",
+         "key": "appointment_id"},
+    ),
+    "appointments_enhanced": (
+        ["Appointment ID", "Patient Name", "Owner Name", "Animal Type", "Service",
+         "Veterinarian", "Duration", "Appointment Date", "Appointment Time", "Date Created",
+         "Notes", "Status", "Total Amount", "Reminder Sent", "Follow-up Needed"],
+        "appointments_enhanced",
+        {"columns": """appointment_id, patient_name, owner_name, animal_type, service, veterinarian,
+                       duration, appointment_date, appointment_time, date_created, notes, status,
+                       total_amount, reminder_sent, follow_up_needed""",
+         "order": "appointment_date DESC, appointment_time DESC, id DESC"},
+    ),
+    "appointment_services": (
+        ["Appointment ID", "Service", "Quantity", "Price", "Subtotal"],
+        "appointment_services",
+        {"columns": "appointment_id, service_name, quantity, price, subtotal",
+         "order": "id"},
+    ),
+    "communication_log": (
+        ["Appointment ID", "Type", "To", "Message", "Date", "Status"],
+        "communication_log",
+        {"columns": "appointment_id, communication_type, sent_to, message, sent_date, status",
+         "order": "sent_date DESC, id DESC"},
+    ),
+}
+
+
+# data type -> (table, query parts, [(column, kind)], partition column)
+# Kinds: 'string', 'category' (dictionary encoded), 'int', 'float', 'bool',
+# 'date' (day number) and 'timestamp' (epoch seconds). Queries are ordered
+# by the partition column so each partition is written in one run.
+COLUMNAR_EXPORTS = {
+    "sales": (
+        "sales",
+        {"columns": """transaction_id, item_id, item_name, quantity, price, subtotal, total_amount,
+                       payment_method, customer_name, sale_epoch AS sale_time, sale_day AS sale_date""",
+         "order": "sale_epoch, id"},
+        [("transaction_id", "string"), ("item_id", "int"), ("item_name", "category"),
+         ("quantity", "int"), ("price", "float"), ("subtotal", "float"), ("total_amount", "float"),
+         ("payment_method", "category"), ("customer_name", "category"),
+         ("sale_time", "timestamp"), ("sale_date", "date")],
+        "sale_date",
+    ),
+    "appointments_enhanced": (
+        "appointments_enhanced",
+        {"columns": f"""appointment_id, patient_name, owner_name, animal_type, service, veterinarian,
+                        duration, appointment_day AS appointment_date, appointment_time,
+                        {EPOCH_SQL.format(column='date_created')} AS date_created, notes, status,
+                        total_amount, reminder_sent, follow_up_needed""",
+         "order": "appointment_day, appointment_minute, id"},
+        [("appointment_id", "string"), ("patient_name", "string"), ("owner_name", "category"),
+         ("animal_type", "category"), ("service", "category"), ("veterinarian", "category"),
+         ("duration", "int"), ("appointment_date", "date"), ("appointment_time", "string"),
+         ("date_created", "timestamp"), ("notes", "string"), ("status", "category"),
+         ("total_amount", "float"), ("reminder_sent", "bool"), ("follow_up_needed", "bool")],
+        "appointment_date",
+    ),
+    "appointment_services": (
+        "appointment_services",
+        {"columns": """s.appointment_id, s.service_name, s.quantity, s.price, s.subtotal,
+                       a.appointment_day AS appointment_date""",
+         "source": """appointment_services s
+                      LEFT JOIN appointments_enhanced a ON a.appointment_id = s.appointment_id""",
+         "rowid": "s.id",
+         "order": "a.appointment_day, s.id"},
+        [("appointment_id", "string"), ("service_name", "category"), ("quantity", "int"),
+         ("price", "float"), ("subtotal", "float"), ("appointment_date", "date")],
+        "appointment_date",
+    ),
+    "communication_log": (
+        "communication_log",
+        {"columns": f"""appointment_id, communication_type, sent_to, message,
+                        {EPOCH_SQL.format(column='sent_date')} AS sent_time,
+                        {DAY_SQL.format(column='sent_date')} AS sent_date, status""",
+         "order": f"{DAY_SQL.format(column='sent_date')}, id"},
+        [("appointment_id", "string"), ("communication_type", "category"), ("sent_to", "category"),
+         ("message", "string"), ("sent_time", "timestamp"), ("sent_date", "date"),
+         ("status", "category")],
+        "sent_date",
+    ),
+}
+
+# Temp table holding the export order of a paged export
+ORDER_TABLE = "export_order"
+
+
+def _export_sql(table, parts):
+    """Build (query, paged order query, page query, row count query) from query parts.
+
+    The query and the count take the rowid bound. The order query copies
+    the export order into ``temp.export_order``, whose rowid is then the
+    position of each row; the page query takes the bound and a position
+    range and reads those rows back by key.
+    """
+    columns, order = parts["columns"], parts["order"]
+    source = parts.get("source", table)
+    rowid = parts.get("rowid", "id")
+    key = parts.get("key", rowid)
+    group = f" GROUP BY {key}" if key != rowid else ""
+    query = f"SELECT {columns} FROM {source} WHERE {rowid} <= ?{group} ORDER BY {order}"
+    order_query = (f"CREATE TEMP TABLE {ORDER_TABLE} AS SELECT {key} AS key FROM {source} "
+                   f"WHERE {rowid} <= ?{group} ORDER BY {order}")
+    page_query = (f"SELECT {columns} FROM temp.{ORDER_TABLE} o CROSS JOIN {source} "
+                  f"WHERE {key} = o.key AND {rowid} <= ? AND o.rowid > ? AND o.rowid <= ?"
+                  f"{' GROUP BY o.rowid' if group else ''} ORDER BY o.rowid")
+    counted = f"DISTINCT {key}" if group else "*"
+    count_query = f"SELECT COUNT({counted}) FROM {table} WHERE id <= ?"
+    return query, order_query, page_query, count_query
+
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+PARTITIONS = ("month", "year")
+
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+def _coerce(values, convert):
+    """Convert values with a type constructor; NULLs and unconvertible values become None"""
+    result = []
+    for value in values:
+        try:
+            result.append(None if value is None else convert(value))
+        except (TypeError, ValueError):
+            result.append(None)
+    return result
+
+
+def _partition_key(day, partition_by):
+    """Partition directory name of a day number, e.g. 'month=2025-01'"""
+    if day is None:
+        return f"{partition_by}=unknown"
+    day = _EPOCH_DATE + timedelta(days=day)
+    return f"month={day:%Y-%m}" if partition_by == "month" else f"year={day:%Y}"
+
+
+class _DictionaryEncoder:
+    """Category codes of one column that stay stable for a whole export.
+
+    The dictionary only ever grows, so every batch's dictionary extends the
+    previous one and Arrow IPC files can carry it as dictionary deltas.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []
+
+    def encode(self, values):
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.labels)
+                self.labels.append(value)
+            indices.append(code)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()),
+                                              pa.array(self.labels, pa.string()))
+
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled before it finishes"""
+
+
+class ExportJob:
+    """An export running on a worker thread.
+
+    The UI polls ``rows_written``, ``total_rows`` and ``finished`` (Tk
+    widgets must only be touched from the main thread) and may call
+    ``cancel()`` at any time. After it finishes, ``error`` holds the
+    exception that stopped it, if any.
+    """
+
+    def __init__(self, export, data_type, filename, **options):
+        self.data_type = data_type
+        self.filename = filename
+        self.options = options
+        self.rows_written = 0
+        self.total_rows = 0
+        self.error = None
+        self.finished = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(export,),
+                                        name=f"export-{data_type}", daemon=True)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def progress(self):
+        """Fraction of rows written so far (0.0 - 1.0)"""
+        if not self.total_rows:
+            return 1.0 if self.finished else 0.0
+        return min(self.rows_written / self.total_rows, 1.0)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop the export after the current chunk; the partial file is removed"""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the export finishes; returns True if it did"""
+        self._thread.join(timeout)
+        return self.finished
+
+    def _on_progress(self, rows_written, total_rows):
+        self.rows_written = rows_written
+        self.total_rows = total_rows
+
+    def _run(self, export):
+        try:
+            export(self.data_type, self.filename, self._on_progress, self._cancel, **self.options)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+
+class StreamingExporter:
+    """Writes export queries to files chunk by chunk"""
+
+    def __init__(self, pool, chunk_size=EXPORT_CHUNK_SIZE):
+        self.pool = pool
+        self.chunk_size = chunk_size
+
+    @contextmanager
+    def _snapshot(self):
+        """Borrow a connection for an export; yields (connection, paged).
+
+        Under WAL the export runs in one read transaction, which does not
+        block writers. With a rollback journal its SHARED lock would hold
+        off every writer until the export finished, so ``paged`` is True
+        and the rows are read in short statements instead.
+        """
+        with self.pool.connection() as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode.lower() != "wal":
+                yield conn, True
+                return
+            own_transaction = not conn.in_transaction
+            if own_transaction:
+                conn.execute("BEGIN")
+            try:
+                yield conn, False
+            finally:
+                if own_transaction:
+                    conn.rollback()
+
+    def _pages(self, conn, order_query, page_query, upto):
+        """Read an export in pages, each in its own statement so no lock is held in between.
+
+        The export order is fixed up front in a temp table; every page is a
+        keyset range over its positions.
+        """
+        conn.execute(f"DROP TABLE IF EXISTS temp.{ORDER_TABLE}")
+        conn.execute(order_query, (upto,))
+        try:
+            last = conn.execute(f"SELECT MAX(rowid) FROM temp.{ORDER_TABLE}").fetchone()[0] or 0
+            position = 0
+            while position < last:
+                rows = conn.execute(page_query, (upto, position, position + self.chunk_size)).fetchall()
+                position += self.chunk_size
+                if rows:
+                    yield rows
+        finally:
+            conn.execute(f"DROP TABLE IF EXISTS temp.{ORDER_TABLE}")
+
+    def _cursor_chunks(self, conn, query, upto):
+        """Read a query with fetchmany from one open cursor"""
+        cur = conn.cursor()
+        try:
+            cur.execute(query, (upto,))
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            cur.close()
+
+    def _chunks(self, snapshot, table, parts, data_type, progress, cancel_event):
+        """Yield lists of rows, reporting progress and checking for cancellation between chunks"""
+        conn, paged = snapshot
+        query, order_query, page_query, count_query = _export_sql(table, parts)
+        upto = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+        total = conn.execute(count_query, (upto,)).fetchone()[0]
+        if progress:
+            progress(0, total)
+        written = 0
+        if paged:
+            chunks = self._pages(conn, order_query, page_query, upto)
+        else:
+            chunks = self._cursor_chunks(conn, query, upto)
+        try:
+            for rows in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled(f"Export of {data_type} cancelled")
+                yield rows
+                written += len(rows)
+                if progress:
+                    progress(written, max(total, written))
+        finally:
+            chunks.close()
+
+    @staticmethod
+    def _discard(path):
+        """Remove a partially written file or directory"""
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def export(self, data_type, filename, progress=None, cancel_event=None):
+        """Export a data type to a CSV file; returns the number of rows written.
+
+        ``progress(rows_written, total_rows)`` is called after every chunk.
+        The file is written under a temporary name and only replaces
+        ``filename`` once complete, so a cancelled or failed export never
+        leaves a truncated file behind.
+        """
+        if data_type not in EXPORTS:
+            raise ValueError(f"Unknown export type: {data_type}")
+        header, table, parts = EXPORTS[data_type]
+        partial = filename + ".part"
+        written = 0
+        try:
+            with self._snapshot() as snapshot, open(partial, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(header)
+                for rows in self._chunks(snapshot, table, parts, data_type, progress, cancel_event):
+                    writer.writerows(rows)
+                    written += len(rows)
+            os.replace(partial, filename)
+            return written
+        except BaseException:
+            self._discard(partial)
+            raise
+
+    def _schema(self, fields):
+        """Arrow schema of a columnar export"""
+        types = {
+            "string": pa.string(), "category": pa.dictionary(pa.int32(), pa.string()),
+            "int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(),
+            "date": pa.date32(), "timestamp": pa.timestamp("s"),
+        }
+        return pa.schema([(name, types[kind]) for name, kind in fields])
+
+    @staticmethod
+    def _record_batch(schema, fields, encoders, rows):
+        """Convert fetched rows to a typed Arrow record batch"""
+        arrays = []
+        for (name, kind), values in zip(fields, zip(*rows)):
+            if kind == "category":
+                arrays.append(encoders[name].encode(_coerce(values, str)))
+            elif kind == "string":
+                arrays.append(pa.array(_coerce(values, str), pa.string()))
+            elif kind == "float":
+                arrays.append(pa.array(_coerce(values, float), pa.float64()))
+            elif kind == "bool":
+                arrays.append(pa.array(_coerce(values, bool), pa.bool_()))
+            elif kind == "date":
+                arrays.append(pa.array(_coerce(values, int), pa.int32()).cast(pa.date32()))
+            elif kind == "timestamp":
+                arrays.append(pa.array(_coerce(values, int), pa.int64()).cast(pa.timestamp("s")))
+            else:
+                arrays.append(pa.array(_coerce(values, int), pa.int64()))
+        return pa.record_batch(arrays, schema=schema)
+
+    @staticmethod
+    def _open_writer(path, schema, fmt, compression):
+        if fmt == "parquet":
+            return pq.ParquetWriter(path, schema, compression=compression)
+        options = pa_ipc.IpcWriteOptions(compression=compression, emit_dictionary_deltas=True)
+        return pa_ipc.new_file(path, schema, options=options)
+
+    def export_columnar(self, data_type, path, progress=None, cancel_event=None,
+                        fmt="parquet", compression="zstd", partition_by=None):
+        """Export a data type to a Parquet or Feather file; returns the number of rows written.
+
+        With ``partition_by`` set to 'month' or 'year', ``path`` is a new
+        directory holding one file per period in Hive-style subdirectories
+        (``month=2025-01/part-0.parquet``). Feather files only support
+        'zstd', 'lz4' or no (None) compression.
+        """
+        if not HAS_PYARROW:
+            raise RuntimeError("Parquet and Feather exports need pyarrow (pip install pyarrow)")
+        if data_type not in COLUMNAR_EXPORTS:
+            raise ValueError(f"No columnar export for: {data_type}")
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if partition_by is not None and partition_by not in PARTITIONS:
+            raise ValueError(f"Unknown partitioning: {partition_by}")
+        if partition_by and os.path.exists(path):
+            raise FileExistsError(f"Export directory already exists: {path}")
+
+        table, parts, fields, partition_column = COLUMNAR_EXPORTS[data_type]
+        schema = self._schema(fields)
+        encoders = {name: _DictionaryEncoder() for name, kind in fields if kind == "category"}
+        partition_index = [name for name, _ in fields].index(partition_column)
+        partial = path + ".part"
+        writer = None
+        current = None
+        written = 0
+        try:
+            if partition_by:
+                os.makedirs(partial)
+            with self._snapshot() as snapshot:
+                for rows in self._chunks(snapshot, table, parts, data_type, progress, cancel_event):
+                    # Rows arrive ordered by date, so a chunk holds runs of partitions
+                    runs = [(None, rows)]
+                    if partition_by:
+                        runs = []
+                        for row in rows:
+                            key = _partition_key(row[partition_index], partition_by)
+                            if not runs or runs[-1][0] != key:
+                                runs.append((key, []))
+                            runs[-1][1].append(row)
+                    for key, run in runs:
+                        if writer is None or key != current:
+                            if writer is not None:
+                                writer.close()
+                            target = partial
+                            if partition_by:
+                                directory = os.path.join(partial, key)
+                                os.makedirs(directory, exist_ok=True)
+                                part = len(os.listdir(directory))
+                                target = os.path.join(directory, f"part-{part}{COLUMNAR_FORMATS[fmt]}")
+                            writer = self._open_writer(target, schema, fmt, compression)
+                            current = key
+                        writer.write_batch(self._record_batch(schema, fields, encoders, run))
+                    written += len(rows)
+            if writer is None and not partition_by:
+                # Empty table: still produce a readable file with the schema
+                writer = self._open_writer(partial, schema, fmt, compression)
+            if writer is not None:
+                writer.close()
+                writer = None
+            os.replace(partial, path)
+            return written
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            self._discard(partial)
+            raise
+
+    def start(self, data_type, filename, fmt="csv", **options):
+        """Run an export on a worker thread; returns its ExportJob"""
+        export = self.export if fmt == "csv" else self.export_columnar
+        if fmt != "csv":
+            options["fmt"] = fmt
+        return ExportJob(export, data_type, filename, **options).start()
@@ -1,14 +1,76 @@
-from datetime import datetime
+from datetime import datetime, timezone
+import os
+import threading
+import time
+import uuid
+import zlib
 import tkinter as tk
 
+
+class IdGenerator:
+    """Thread-safe generator of unique, time-sortable IDs.
+
+    IDs look like ``TXN20250101093015123-042-007``: the prefix, a UTC
+    millisecond timestamp, the terminal node id and a per-millisecond
+    sequence number. All parts are fixed width, so IDs sort in creation
+    order, and the node id keeps terminals sharing a database from
+    colliding. Up to 1000 IDs per millisecond are handed out per node; past
+    that the generator waits for the next millisecond. If the clock goes
+    backwards, the last timestamp is reused so IDs stay monotonic. The
+    timestamp is UTC rather than local time so IDs keep sorting in creation
+    order across daylight saving changes.
+    """
+
+    MAX_SEQUENCE = 999
+
+    def __init__(self, node_id=None):
+        self.node_id = self._default_node_id() if node_id is None else node_id % 1000
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    @staticmethod
+    def _default_node_id():
+        """Derive a node id from the configured value or the host and process"""
+        from config import TERMINAL_NODE_ID
+        if TERMINAL_NODE_ID is not None:
+            return TERMINAL_NODE_ID % 1000
+        return zlib.crc32(f"{uuid.getnode()}-{os.getpid()}".encode()) % 1000
+
+    def _next_tick(self):
+        """Get the timestamp and sequence for the next ID (lock must be held)"""
+        now_ms = max(int(time.time() * 1000), self._last_ms)
+        if now_ms == self._last_ms:
+            self._sequence += 1
+            while self._sequence > self.MAX_SEQUENCE:
+                time.sleep(0.0005)
+                now_ms = max(int(time.time() * 1000), self._last_ms)
+                if now_ms > self._last_ms:
+                    self._sequence = 0
+        else:
+            self._sequence = 0
+        self._last_ms = now_ms
+        return now_ms, self._sequence
+
+    def next_id(self, prefix):
+        """Generate the next ID with the given prefix"""
+        with self._lock:
+            now_ms, sequence = self._next_tick()
+        stamp = datetime.fromtimestamp(now_ms / 1000, timezone.utc).strftime('%Y%m%d%H%M%S')
+        return f"{prefix}{stamp}{now_ms % 1000:03d}-{self.node_id:03d}-{sequence:03d}"
+
+
+_id_generator = IdGenerator()
+
+
 def generate_appointment_id():
     """Generate unique appointment ID"""
-    return f"APT{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return _id_generator.next_id("APT")
 
 
 def generate_transaction_id():
     """Generate unique transaction ID"""
-    return f"TXN{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return _id_generator.next_id("TXN")
 
 
 def validate_number(value: str) -> bool:
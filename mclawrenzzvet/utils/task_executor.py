@@ -0,0 +1,192 @@
+"""Background execution of UI-triggered database work.
+
+Tk widgets may only be touched from the main thread, so modules submit
+the slow part of a screen (queries, report computations, bulk sends) to
+``TaskExecutor`` and render the result in a callback. Workers put finished
+tasks on a queue that the Tk loop drains with ``root.after``; callbacks
+therefore always run on the main thread. Managers use the connection bound
+to the calling thread, so each worker reads through its own pooled handle.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import TASK_WORKERS, TASK_POLL_MS
+
+
+class Task:
+    """One submitted unit of work.
+
+    ``cancel()`` drops a task that has not started yet and, for one that is
+    already running, discards its result so no callback fires. Long tasks
+    can also check ``cancelled`` between steps and stop early.
+    """
+
+    def __init__(self, key, group):
+        self.key = key
+        self.group = group
+        self.future = None
+        self._cancel = threading.Event()
+        self._on_success = []       # (owner, callback)
+        self._on_error = []
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def add_callbacks(self, on_success=None, on_error=None, owner=None):
+        """Add callbacks that are skipped if ``owner`` is destroyed before delivery"""
+        if on_success:
+            self._on_success.append((owner, on_success))
+        if on_error:
+            self._on_error.append((owner, on_error))
+
+
+class TaskExecutor:
+    """Thread pool whose results are delivered on the Tk thread.
+
+    ``key`` de-duplicates requests: submitting a key that is still in
+    flight joins the running task instead of starting another one.
+    ``group`` supersedes requests: a new task cancels the in-flight tasks
+    of its group with a different key, e.g. an older search of the same
+    list. Callbacks whose ``owner`` widget was destroyed in the meantime
+    are skipped; each submitter's callbacks are checked against its own
+    owner, also when it joined a task someone else started. Busy listeners
+    are told when work starts and when the last task finishes.
+    """
+
+    def __init__(self, root, max_workers=TASK_WORKERS, poll_interval=TASK_POLL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ui-task")
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight = {}        # key -> Task
+        self._pending = set()       # tasks submitted and not yet delivered
+        self._busy_listeners = []
+        self._polling = False
+        self._busy = False
+
+    @property
+    def busy(self):
+        return bool(self._pending)
+
+    def add_busy_listener(self, callback):
+        """Call ``callback(busy)`` on the Tk thread whenever the busy state changes"""
+        self._busy_listeners.append(callback)
+
+    def submit(self, func, *args, key=None, group=None, owner=None,
+               on_success=None, on_error=None, **kwargs):
+        """Run ``func(*args, **kwargs)`` on a worker; must be called from the Tk thread.
+
+        ``on_success(result)`` or ``on_error(exception)`` is then called on
+        the Tk thread. Errors without a handler are printed.
+        """
+        with self._lock:
+            existing = self._in_flight.get(key) if key is not None else None
+            if existing is not None and not existing.cancelled:
+                existing.add_callbacks(on_success, on_error, owner)
+                return existing
+            if group is not None:
+                for task in list(self._pending):
+                    if task.group == group and task.key != key:
+                        task.cancel()
+            task = Task(key, group)
+            task.add_callbacks(on_success, on_error, owner)
+            if key is not None:
+                self._in_flight[key] = task
+            self._pending.add(task)
+            task.future = self._pool.submit(self._run, task, func, args, kwargs)
+        self._update_busy()
+        self._schedule_poll()
+        return task
+
+    def cancel(self, key=None, group=None):
+        """Cancel the in-flight tasks with a key or in a group"""
+        with self._lock:
+            for task in list(self._pending):
+                if (key is not None and task.key == key) or (group is not None and task.group == group):
+                    task.cancel()
+        self._schedule_poll()
+
+    def _run(self, task, func, args, kwargs):
+        if task.cancelled:
+            self._results.put((task, False, None))
+            return
+        try:
+            self._results.put((task, True, func(*args, **kwargs)))
+        except Exception as e:
+            self._results.put((task, False, e))
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        """Deliver finished tasks on the Tk thread"""
+        self._polling = False
+        while True:
+            try:
+                task, succeeded, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._finish(task)
+            if not task.cancelled:
+                self._deliver(task, succeeded, value)
+
+        # Tasks cancelled before they started never reach the result queue
+        with self._lock:
+            for task in [t for t in self._pending if t.future is not None and t.future.cancelled()]:
+                self._pending.discard(task)
+                if self._in_flight.get(task.key) is task:
+                    del self._in_flight[task.key]
+            pending = bool(self._pending)
+        self._update_busy()
+        if pending:
+            self._schedule_poll()
+
+    def _finish(self, task):
+        with self._lock:
+            self._pending.discard(task)
+            if task.key is not None and self._in_flight.get(task.key) is task:
+                del self._in_flight[task.key]
+
+    @staticmethod
+    def _alive(owner):
+        if owner is None:
+            return True
+        try:
+            return bool(owner.winfo_exists())
+        except Exception:
+            return False
+
+    def _deliver(self, task, succeeded, value):
+        callbacks = task._on_success if succeeded else task._on_error
+        if not succeeded and not callbacks:
+            print(f"Background task error: {value}")
+        for owner, callback in callbacks:
+            if not self._alive(owner):
+                continue
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"Error in background task callback: {e}")
+
+    def _update_busy(self):
+        busy = self.busy
+        if busy != self._busy:
+            self._busy = busy
+            for listener in self._busy_listeners:
+                listener(busy)
+
+    def shutdown(self):
+        """Cancel queued work and stop the workers"""
+        with self._lock:
+            for task in list(self._pending):
+                task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,51 @@
+"""Shared fixtures: every test works on its own copy of the clinic database"""
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mclawrenzzvet")
+sys.path.insert(0, APP_DIR)
+
+from analytics_engine import analytics_engine
+from caches import inventory_catalog, query_cache
+from database import ConnectionPool, connect, schema_catalog
+from migrations import run_migrations
+
+# The shipped database predates the migrations, so it doubles as the baseline schema
+BASELINE_DB = os.path.join(APP_DIR, "vetclinic.db")
+
+
+def _reset_caches():
+    """Drop process-wide caches so no test sees another test's database"""
+    inventory_catalog.invalidate()
+    query_cache.clear()
+    analytics_engine.invalidate()
+    schema_catalog.invalidate()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Path of a database file that does not exist yet"""
+    return str(tmp_path / "vetclinic.db")
+
+
+@pytest.fixture
+def baseline_db(db_path):
+    """Copy of the shipped, unmigrated database"""
+    shutil.copy(BASELINE_DB, db_path)
+    return db_path
+
+
+@pytest.fixture
+def pool(baseline_db):
+    """Connection pool on a migrated copy of the shipped database"""
+    conn = connect(baseline_db)
+    run_migrations(conn)
+    conn.close()
+    _reset_caches()
+    pool = ConnectionPool(baseline_db)
+    yield pool
+    pool.close_all()
+    _reset_caches()
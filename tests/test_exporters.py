@@ -0,0 +1,65 @@
+import csv
+
+import pytest
+
+import config
+from utils.exporters import EXPORTS, HAS_PYARROW, StreamingExporter
+
+
+@pytest.fixture(autouse=True, params=["safe", "balanced"])
+def journal_profile(request, monkeypatch):
+    """Run each test with a rollback journal (paged reads) and with WAL (one cursor)"""
+    monkeypatch.setattr(config, "DB_PERFORMANCE_PROFILE", request.param)
+    return request.param
+
+
+@pytest.fixture
+def sales_rows(pool):
+    """Add sales sharing timestamps so the export order has ties, and return the table rows"""
+    conn = pool.get_connection()
+    conn.executemany("""
+        INSERT INTO sales (transaction_id, item_id, item_name, quantity, price, subtotal,
+                           total_amount, payment_method, customer_name, sale_date)
+        VALUES (?, ?, 'Item, "quoted"', 1, 2.5, 2.5, 2.5, 'Cash', ?, ?)
+    """, [(f"TXN-EXPORT-{i}", i % 5, f"Owner {i % 4}", f"2024-05-0{1 + i % 3} 10:00:00") for i in range(60)])
+    conn.commit()
+    return conn.execute("""
+        SELECT transaction_id, item_id, item_name, quantity, price, subtotal,
+               total_amount, payment_method, customer_name, sale_date
+        FROM sales ORDER BY sale_epoch DESC, id DESC
+    """).fetchall()
+
+
+def _text(row):
+    return ["" if value is None else str(value) for value in row]
+
+
+def test_csv_round_trip(pool, sales_rows, tmp_path, journal_profile):
+    mode = pool.get_connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert (mode.lower() == "wal") == (journal_profile == "balanced")
+    filename = str(tmp_path / "sales.csv")
+    progress = []
+    written = StreamingExporter(pool, chunk_size=7).export(
+        "sales", filename, progress=lambda done, total: progress.append((done, total)))
+
+    assert written == len(sales_rows)
+    with open(filename, newline='', encoding='utf-8') as csvfile:
+        header, *rows = list(csv.reader(csvfile))
+    assert header == EXPORTS["sales"][0]
+    assert rows == [_text(row) for row in sales_rows]
+    assert progress[-1] == (written, written)
+    assert not (tmp_path / "sales.csv.part").exists()
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="needs pyarrow")
+def test_parquet_round_trip(pool, sales_rows, tmp_path):
+    import pyarrow.parquet as pq
+    path = str(tmp_path / "sales.parquet")
+    written = StreamingExporter(pool, chunk_size=7).export_columnar("sales", path)
+
+    assert written == len(sales_rows)
+    table = pq.read_table(path)
+    assert table.num_rows == written
+    expected = sorted(row[0] for row in sales_rows)
+    assert sorted(table.column("transaction_id").to_pylist()) == expected
+    assert table.column("item_name").to_pylist().count('Item, "quoted"') == 60
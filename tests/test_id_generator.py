@@ -0,0 +1,75 @@
+import threading
+
+from utils import helpers
+from utils.helpers import IdGenerator
+
+
+class FakeClock:
+    """Stands in for time.time/time.sleep; sleeping moves the clock forward"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _fake_clock(monkeypatch, now=1_700_000_000.0):
+    clock = FakeClock(now)
+    monkeypatch.setattr(helpers.time, "time", clock.time)
+    monkeypatch.setattr(helpers.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_ids_sort_in_creation_order():
+    generator = IdGenerator(node_id=7)
+    ids = [generator.next_id("TXN") for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(i.startswith("TXN") and i[-8:-4] == "-007" for i in ids)
+
+
+def test_ids_are_unique_across_threads():
+    generator = IdGenerator(node_id=1)
+    results = [[] for _ in range(8)]
+
+    def generate(out):
+        out.extend(generator.next_id("APT") for _ in range(2000))
+
+    threads = [threading.Thread(target=generate, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [i for out in results for i in out]
+    assert len(set(ids)) == len(ids)
+    # Each thread sees its own IDs in increasing order
+    assert all(out == sorted(out) for out in results)
+
+
+def test_sequence_overflow_waits_for_the_next_millisecond(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    generator = IdGenerator(node_id=0)
+    ids = [generator.next_id("TXN") for _ in range(IdGenerator.MAX_SEQUENCE + 2)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert ids[-1].endswith("-000-000")
+    assert clock.now > 1_700_000_000.0
+
+
+def test_ids_stay_ordered_when_the_clock_goes_back(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    generator = IdGenerator(node_id=0)
+    first = generator.next_id("TXN")
+    clock.now -= 3600
+    second = generator.next_id("TXN")
+    assert second > first
+
+
+def test_node_id_keeps_terminals_apart(monkeypatch):
+    _fake_clock(monkeypatch)
+    assert IdGenerator(node_id=1).next_id("TXN") != IdGenerator(node_id=2).next_id("TXN")
+    assert IdGenerator(node_id=1005).node_id == 5
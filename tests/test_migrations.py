@@ -0,0 +1,53 @@
+import sqlite3
+
+from migrations import LATEST_VERSION, INTEGER_DATE_COLUMNS, get_schema_version, run_migrations
+
+BASELINE_TABLES = ("users", "inventory", "appointments", "appointments_enhanced",
+                   "appointment_services", "communication_log", "sales")
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _counts(conn):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in BASELINE_TABLES}
+
+
+def test_migrates_empty_database(db_path):
+    conn = sqlite3.connect(db_path)
+    assert get_schema_version(conn) == 0
+    assert run_migrations(conn) == LATEST_VERSION
+    assert get_schema_version(conn) == LATEST_VERSION
+    tables = _tables(conn)
+    assert set(BASELINE_TABLES) <= tables
+    assert {"sales_daily_rollup", "appointment_service_daily", "vet_status_daily"} <= tables
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    conn.close()
+
+
+def test_migrates_baseline_database(baseline_db):
+    conn = sqlite3.connect(baseline_db)
+    assert get_schema_version(conn) == 0
+    before = _counts(conn)
+    assert run_migrations(conn) == LATEST_VERSION
+    assert _counts(conn) == before
+    for table, columns in INTEGER_DATE_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        assert set(columns) <= existing
+    # Backfilled day numbers agree with the TEXT dates they were derived from
+    mismatched = conn.execute("""
+        SELECT COUNT(*) FROM sales
+        WHERE sale_day IS NOT julianday(substr(sale_date, 1, 10)) - julianday('1970-01-01')
+    """).fetchone()[0]
+    assert mismatched == 0
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    conn.close()
+
+
+def test_migrations_are_idempotent(baseline_db):
+    conn = sqlite3.connect(baseline_db)
+    run_migrations(conn)
+    assert run_migrations(conn) == 0
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == LATEST_VERSION
+    conn.close()
@@ -0,0 +1,59 @@
+from managers import AnalyticsManager, EnhancedInventoryManager, SalesManager
+from migrations import UNDATED_DAY
+
+
+def _rollup(pool):
+    conn = pool.get_connection()
+    return conn.execute("""
+        SELECT day, payment_method, ROUND(revenue, 6), transactions, items_sold
+        FROM sales_daily_rollup ORDER BY day, payment_method
+    """).fetchall()
+
+
+def _line(item, qty):
+    return {'id': item.id, 'name': item.name, 'qty': qty, 'price': 2.5, 'subtotal': 2.5 * qty}
+
+
+def test_rebuild_matches_incremental_rollup(pool):
+    sales = SalesManager(pool)
+    item = EnhancedInventoryManager(pool).get_all_items()[0]
+    conn = pool.get_connection()
+    conn.execute("UPDATE inventory SET stock = 1000 WHERE id = ?", (item.id,))
+    conn.commit()
+
+    assert sales.record_sale("TXN-ROLLUP-1", [_line(item, 2), _line(item, 1)], 7.5, "Cash", "Ann")
+    assert sales.record_sale("TXN-ROLLUP-2", [_line(item, 1)], 2.5, "Card")
+    batch = [{'transaction_id': f"TXN-ROLLUP-B{i}", 'items': [_line(item, 1 + i % 3)],
+              'total_amount': 2.5 * (1 + i % 3), 'payment_method': ("Cash", "Card", "GCash")[i % 3],
+              'sale_date': f"2024-0{1 + i % 3}-1{i % 10}T09:{i:02d}:00"} for i in range(30)]
+    assert sales.record_sales_batch(batch) == len(batch)
+
+    incremental = _rollup(pool)
+    assert incremental
+    assert AnalyticsManager(pool).rebuild_sales_rollup()
+    assert _rollup(pool) == incremental
+
+
+def test_rebuild_buckets_invalid_sale_dates(pool):
+    conn = pool.get_connection()
+    conn.executemany("""
+        INSERT INTO sales (transaction_id, item_id, item_name, quantity, price, subtotal,
+                           total_amount, payment_method, customer_name, sale_date)
+        VALUES (?, 1, 'Legacy', 1, 4.0, 4.0, 4.0, 'Cash', '', ?)
+    """, [("TXN-BAD-1", None), ("TXN-BAD-2", "not a date"), ("TXN-BAD-3", "2024-02-30 10:00:00")])
+    conn.commit()
+
+    assert AnalyticsManager(pool).rebuild_sales_rollup()
+    undated = conn.execute("SELECT transactions, revenue FROM sales_daily_rollup WHERE day = ?",
+                           (UNDATED_DAY,)).fetchone()
+    assert undated == (3, 12.0)
+
+
+def test_batch_rejects_invalid_sale_date(pool):
+    sales = SalesManager(pool)
+    item = EnhancedInventoryManager(pool).get_all_items()[0]
+    before = _rollup(pool)
+    batch = [{'transaction_id': "TXN-BAD-DATE", 'items': [_line(item, 1)], 'total_amount': 2.5,
+              'payment_method': "Cash", 'sale_date': "31/12/2024"}]
+    assert sales.record_sales_batch(batch) == 0
+    assert _rollup(pool) == before
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from managers import EnhancedAppointmentManager, SchedulingConflictError
+from models import EnhancedAppointment
+from scheduling import DaySchedule, ScheduleIndex
+
+
+def _schedule(*intervals):
+    schedule = DaySchedule()
+    for index, (start, end) in enumerate(intervals):
+        schedule.add(start, end, f"APT-{index}")
+    return schedule
+
+
+def test_conflicts_are_half_open():
+    schedule = _schedule((540, 600))
+    assert schedule.conflicts(600, 630) == []
+    assert schedule.conflicts(480, 540) == []
+    assert schedule.conflicts(599, 630) == [(540, 600, "APT-0")]
+    assert schedule.conflicts(550, 560) == [(540, 600, "APT-0")]
+    assert _schedule().conflicts(0, 1440) == []
+
+
+def test_conflicts_find_long_intervals_starting_earlier():
+    schedule = _schedule((480, 720), (500, 510), (700, 730))
+    assert [iv[2] for iv in schedule.conflicts(600, 610)] == ["APT-0"]
+    assert [iv[2] for iv in schedule.conflicts(705, 725)] == ["APT-0", "APT-2"]
+
+
+def test_remove_drops_only_that_appointment():
+    schedule = _schedule((540, 600), (600, 660))
+    assert schedule.remove("APT-0")
+    assert not schedule.remove("APT-0")
+    assert schedule.starts == [600]
+    assert schedule.conflicts(540, 600) == []
+
+
+def test_next_free_edges():
+    assert _schedule().next_free(60, 540, 1020) == 540
+    # Back-to-back appointments leave no gap between them
+    assert _schedule((540, 600), (600, 660)).next_free(60, 540, 1020) == 660
+    # A gap exactly the size of the appointment fits
+    assert _schedule((540, 600), (660, 720)).next_free(60, 540, 1020) == 600
+    # Nothing fits before closing
+    assert _schedule((540, 990)).next_free(60, 540, 1020) is None
+    assert _schedule().next_free(60, 990, 1020) is None
+
+
+def test_next_free_keeps_the_buffer():
+    assert _schedule((540, 600), (660, 720)).next_free(60, 540, 1020, buffer=10) == 730
+    # An appointment ending just before ``earliest`` still needs its buffer
+    assert _schedule((480, 535)).next_free(30, 540, 1020, buffer=10) == 545
+    # The new appointment's own buffer may run past closing
+    assert _schedule().next_free(30, 990, 1020, buffer=10) == 990
+
+
+def test_index_reloads_days_after_the_ttl():
+    booked = []
+    index = ScheduleIndex(lambda veterinarian, date: list(booked), buffer_minutes=0, ttl=0)
+    assert index.find_conflicts("Dr. Smith", "2030-01-07", 540, 600) == []
+    booked.append(("APT-OTHER", "09:30", 30))
+    assert index.find_conflicts("Dr. Smith", "2030-01-07", 540, 600) == [("APT-OTHER", "09:30", 30)]
+
+
+def _appointment(appointment_id, date, time, duration=60):
+    appointment = EnhancedAppointment(appointment_id, "Rex", "Ann", "Dog", "Checkup",
+                                      veterinarian="Dr. Smith", duration=duration,
+                                      appointment_date=date, appointment_time=time)
+    appointment.add_service("Checkup", 1, 400.0, 400.0)
+    return appointment
+
+
+def test_booking_rechecks_conflicts_from_other_terminals(pool):
+    date = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    here, there = EnhancedAppointmentManager(pool), EnhancedAppointmentManager(pool)
+    # Both terminals load the empty day before either books
+    assert here.schedule.find_conflicts("Dr. Smith", date, 540, 600) == []
+    assert there.schedule.find_conflicts("Dr. Smith", date, 540, 600) == []
+
+    assert there.record_enhanced_appointment(_appointment("APT-THERE", date, "09:00"))
+    with pytest.raises(SchedulingConflictError) as raised:
+        here.record_enhanced_appointment(_appointment("APT-HERE", date, "09:30"))
+    assert [conflict[0] for conflict in raised.value.conflicts] == ["APT-THERE"]
+    # Back-to-back bookings are fine
+    assert here.record_enhanced_appointment(_appointment("APT-NEXT", date, "10:00"))
@@ -0,0 +1,56 @@
+import pytest
+
+from caches import inventory_catalog
+from managers import EnhancedInventoryManager, InsufficientStockError, SalesManager
+
+
+def _line(item, qty):
+    return {'id': item.id, 'name': item.name, 'qty': qty, 'price': 1.0, 'subtotal': float(qty)}
+
+
+@pytest.fixture
+def stocked(pool):
+    """Inventory manager, sales manager and two items with 5 and 2 in stock"""
+    inventory = EnhancedInventoryManager(pool)
+    first, second = inventory.get_all_items()[:2]
+    conn = pool.get_connection()
+    conn.executemany("UPDATE inventory SET stock = ? WHERE id = ?", [(5, first.id), (2, second.id)])
+    conn.commit()
+    inventory_catalog.invalidate()
+    return inventory, SalesManager(pool), first, second
+
+
+def _sales_count(pool, transaction_id):
+    return pool.get_connection().execute(
+        "SELECT COUNT(*) FROM sales WHERE transaction_id = ?", (transaction_id,)).fetchone()[0]
+
+
+def test_oversold_checkout_raises_and_records_nothing(pool, stocked):
+    inventory, sales, first, second = stocked
+    with pytest.raises(InsufficientStockError) as raised:
+        sales.record_sale("TXN-OVERSOLD", [_line(first, 1), _line(second, 3)], 4.0, "Cash")
+    assert [(s['id'], s['requested'], s['available']) for s in raised.value.shortfalls] == [(second.id, 3, 2)]
+    assert _sales_count(pool, "TXN-OVERSOLD") == 0
+    assert inventory.get_item(first.id).stock == 5
+    assert inventory.get_item(second.id).stock == 2
+
+
+def test_repeated_lines_are_summed_before_the_check(pool, stocked):
+    inventory, sales, first, _ = stocked
+    with pytest.raises(InsufficientStockError):
+        sales.record_sale("TXN-SPLIT", [_line(first, 3), _line(first, 3)], 6.0, "Cash")
+    assert inventory.get_item(first.id).stock == 5
+
+    assert sales.record_sale("TXN-EXACT", [_line(first, 3), _line(first, 2)], 5.0, "Cash")
+    assert inventory.get_item(first.id).stock == 0
+    assert _sales_count(pool, "TXN-EXACT") == 2
+
+
+def test_batch_never_drives_stock_negative(pool, stocked):
+    inventory, sales, _, second = stocked
+    batch = [{'transaction_id': f"TXN-OFFLINE-{i}", 'items': [_line(second, 1)],
+              'total_amount': 1.0, 'payment_method': "Cash"} for i in range(4)]
+    assert sales.record_sales_batch(batch) == 4
+    assert inventory.get_item(second.id).stock == 0
+    stored = pool.get_connection().execute("SELECT stock FROM inventory WHERE id = ?", (second.id,)).fetchone()[0]
+    assert stored == 0